@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'users.middleware.SQLInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -118,6 +119,37 @@ else:
         }
     }
 
+# Cache compartido: gunicorn corre varios workers y `procesar_trabajos` va en
+# otro proceso. Con LocMemCache cada uno tendría su copia y las invalidaciones
+# por señal (catálogos, dashboard, usuario del JWT) no llegarían a los demás.
+#   - REDIS_URL definido: Redis (requiere el paquete `redis`).
+#   - Si no: tabla `django_cache` en la base principal; se crea con
+#     `python manage.py createcachetable` (lo corre el Procfile al arrancar).
+#     Es correcto pero cada lectura del cache es una query; para que los
+#     caches ahorren viajes a la base en producción conviene Redis.
+#   - Con DB_ENGINE=sqlite (dev local y tests, un solo proceso): LocMemCache.
+# El check users.W001 avisa si se usa LocMemCache con otra base de datos.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+elif os.getenv('DB_ENGINE', '').lower() == 'sqlite':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': os.getenv('CACHE_TABLE', 'django_cache'),
+        }
+    }
+
 
 AUTH_USER_MODEL = 'users.User'
 
@@ -134,7 +166,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # ------------------------------------------------------------------------------
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -151,6 +183,97 @@ SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
 
+# ------------------------------------------------------------------------------
+# Instrumentación SQL por request (users.middleware.SQLInstrumentationMiddleware)
+# Presupuesto de queries por url_name; al excederlo se loguea un warning con el SQL.
+# ------------------------------------------------------------------------------
+SQL_QUERY_BUDGETS = {
+    'citas-list-create': 10,
+    'cita-detail': 10,
+    'agenda-doctor': 3,
+    'me-dashboard': 10,
+    'pagos-list': 10,
+    'pagos-resumen': 8,
+    'horarios-disponibles': 5,
+    'especialidades-list': 2,
+    'pacientes-list': 5,
+    'reportes-list-create': 10,
+    'recetas-list-create': 10,
+    'procedimientos-list-create': 10,
+}
+SQL_LOG_MAX_CHARS = 500
+
+# Catálogos cacheados (users/utils/catalogos.py): especialidades y horarios
+# semanales. Se invalidan por señales en el cache compartido (CACHES); el TTL
+# solo acota el desfase si alguien configura un cache por proceso.
+CATALOGO_CACHE_TTL = int(os.getenv('CATALOGO_CACHE_TTL', '300'))
+
+# Dashboard del paciente (/me/dashboard/), cacheado por usuario. TTL corto
+# porque "próximas" y "puede cancelar" dependen de la hora actual.
+DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', '60'))
+
+# Usuario autenticado por JWT (users/authentication.py), cacheado por id y
+# rol del token. Se invalida al guardar el User; el TTL acota el desfase en
+# otros workers solo si el cache no es compartido (ver CACHES).
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '30'))
+
+# PDFs de consentimiento ya renderizados (users/utils/pdf_consentimiento.py).
+# Fuera de MEDIA_ROOT: son datos clínicos y no deben servirse como media
+# pública. Es un cache: si el disco es efímero se regeneran al vuelo.
+CONSENTIMIENTO_PDF_CACHE_DIR = os.getenv(
+    'CONSENTIMIENTO_PDF_CACHE_DIR', str(BASE_DIR / 'pdf_cache' / 'consentimientos')
+)
+
+# Archivos generados por la cola de documentos (manage.py procesar_trabajos).
+# Mismo criterio: fuera de MEDIA_ROOT, se descargan por la API con permisos.
+# Solo aplica sin Cloudinary; con Cloudinary el worker los sube ahí para que
+# la web los lea aunque corran en hosts distintos (models.storage_trabajos).
+DOCUMENTOS_TRABAJOS_DIR = os.getenv(
+    'DOCUMENTOS_TRABAJOS_DIR', str(BASE_DIR / 'documentos_trabajos')
+)
+
+# Comprobantes de pago (users/utils/comprobantes.py): tope de subida, tope
+# de memoria para decodificar la imagen, resolución y calidad con que se
+# re-codifican, y miniatura para la lista de revisión del doctor.
+COMPROBANTE_MAX_BYTES = int(os.getenv('COMPROBANTE_MAX_BYTES', str(10 * 1024 * 1024)))
+COMPROBANTE_MAX_MEMORIA = int(os.getenv('COMPROBANTE_MAX_MEMORIA', str(96 * 1024 * 1024)))
+COMPROBANTE_MAX_LADO = int(os.getenv('COMPROBANTE_MAX_LADO', '1600'))
+COMPROBANTE_CALIDAD = int(os.getenv('COMPROBANTE_CALIDAD', '80'))
+COMPROBANTE_MINIATURA_LADO = int(os.getenv('COMPROBANTE_MINIATURA_LADO', '320'))
+COMPROBANTE_MINIATURA_CALIDAD = int(os.getenv('COMPROBANTE_MINIATURA_CALIDAD', '70'))
+
+# Máximo de filas por exportación XLSX (se arma completa en disco antes de
+# enviarse); el CSV va en streaming y no tiene límite.
+EXPORTACION_MAX_FILAS_XLSX = int(os.getenv('EXPORTACION_MAX_FILAS_XLSX', '50000'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # DEBUG: una línea por request; WARNING: presupuestos excedidos
+        'users.sql': {
+            'handlers': ['console'],
+            'level': os.getenv('SQL_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        # Una línea JSON por trabajo de documentos (espera en cola, duración)
+        'users.trabajos': {
+            'handlers': ['console'],
+            'level': os.getenv('TRABAJOS_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        # Throughput y latencias de los stress tests (users/tests.py)
+        'users.bench': {
+            'handlers': ['console'],
+            'level': os.getenv('BENCH_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 # Storage remoto (Cloudinary) si hay credenciales
 if USE_CLOUDINARY:
     CLOUDINARY_STORAGE = {
@@ -11,7 +11,8 @@ import "./TableLayout.css";
  * - Columnas configurables por props (render por fila).
  * - Filtros controlados (chips / select).
  * - Buscador global controlado.
- * - Paginación controlada (lista plana o futura paginación desde backend).
+ * - Paginación controlada (lista plana) o por cursor desde backend
+ *   ("Cargar más" con `hasMore` / `onLoadMore`).
  */
 function TableLayout({
   // Header
@@ -43,6 +44,11 @@ function TableLayout({
   total, // total de registros; si no se pasa, toma data.length
   onPageChange, // (nextPage: number) => void
 
+  // Paginación por cursor (backend): agrega filas al final
+  hasMore = false, // hay `next` en la última respuesta
+  loadingMore = false,
+  onLoadMore, // () => void
+
   // Estilo
   dense = false, // tabla compacta
   striped = true,
@@ -279,6 +285,20 @@ function TableLayout({
         )}
       </div>
 
+      {/* FOOTER: cargar más (cursor del backend) */}
+      {hasMore && !loading && typeof onLoadMore === "function" && (
+        <div className="card-footer d-flex justify-content-center">
+          <button
+            type="button"
+            className="btn btn-sm btn-outline-primary"
+            disabled={loadingMore}
+            onClick={onLoadMore}
+          >
+            {loadingMore ? "Cargando..." : "Cargar más"}
+          </button>
+        </div>
+      )}
+
       {/* FOOTER: paginación */}
       {showPagination && (
         <div className="card-footer d-flex flex-column flex-md-row align-items-md-center justify-content-between gap-2">
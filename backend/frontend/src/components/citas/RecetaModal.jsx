@@ -77,6 +77,8 @@ const RecetaModal = ({
       ) {
         setMedicamentos(
           initialReceta.medicamentos.map((m) => ({
+            // El id permite al backend actualizar solo las filas que cambian
+            id: m.id,
             nombre: m.nombre || "",
             dosis: m.dosis || "",
             frecuencia: m.frecuencia || "",
@@ -13,7 +13,7 @@ import {
 import { getCurrentUser } from "../../services/authService";
 import {
   getCitasByPaciente,
-  getPagosByPaciente,
+  getMiDashboard,
   reprogramarCitaPaciente,
   cancelarCitaPaciente,
 } from "../../services/pacientesService";
@@ -93,14 +93,16 @@ const PacienteDashboard = ({ cardAnimation }) => {
         setLoading(true);
         setError("");
 
-        const [citasData, pagosData] = await Promise.all([
-          getCitasByPaciente(user.id, controller.signal),
-          getPagosByPaciente(user.id, controller.signal),
-        ]);
+        // Una sola petición: citas (con sus pagos anidados), pagos, etc.
+        const dashboard = await getMiDashboard(controller.signal);
 
         if (!isMounted) return;
-        setCitas(citasData || []);
-        setPagos(pagosData || []);
+        const citasData = [
+          ...dashboard.citas_proximas,
+          ...dashboard.citas_pasadas,
+        ];
+        setCitas(citasData);
+        setPagos(citasData.flatMap((cita) => cita.pagos || []));
         setCurrentPage(1);
       } catch (err) {
         if (!isMounted || controller.signal.aborted) return;
@@ -11,6 +11,7 @@ import {
   confirmarCita,
   cancelarCitaAdmin,
   reprogramarCita,
+  transicionarCitas,
 } from "../../services/adminCitasService";
 import TableLayout from "../../components/TableLayout";
 
@@ -46,6 +47,8 @@ const AdminCitasPage = () => {
 
   const [cargando, setCargando] = useState(false);
   const [citas, setCitas] = useState([]);
+  const [siguiente, setSiguiente] = useState(null); // `next` del backend
+  const [cargandoMas, setCargandoMas] = useState(false);
   const [especialidades, setEspecialidades] = useState([]);
 
   const [filtros, setFiltros] = useState({
@@ -146,8 +149,12 @@ const AdminCitasPage = () => {
           params.fecha_hasta = filtros.fechaHasta;
         }
 
-        const data = await getCitasAdmin(params, controller.signal);
-        setCitas(Array.isArray(data) ? data : data.results || []);
+        const { results, next } = await getCitasAdmin(
+          params,
+          controller.signal
+        );
+        setCitas(results);
+        setSiguiente(next);
       } catch (error) {
         if (error.name === "CanceledError") return;
         console.error("Error cargando citas:", error);
@@ -162,6 +169,21 @@ const AdminCitasPage = () => {
     return () => controller.abort();
   }, [isAdmin, filtros]);
 
+  const handleCargarMas = async () => {
+    if (!siguiente) return;
+    setCargandoMas(true);
+    try {
+      const { results, next } = await getCitasAdmin({}, undefined, siguiente);
+      setCitas((prev) => [...prev, ...results]);
+      setSiguiente(next);
+    } catch (error) {
+      console.error("Error cargando más citas:", error);
+      toast.error("Error al cargar más citas");
+    } finally {
+      setCargandoMas(false);
+    }
+  };
+
   // ========================
   //  Handlers de filtros
   // ========================
@@ -212,6 +234,29 @@ const AdminCitasPage = () => {
     }
   };
 
+  const pendientesVisibles = useMemo(
+    () => citas.filter((c) => c.estado_codigo === "P").map((c) => c.id),
+    [citas]
+  );
+
+  const handleConfirmarPendientes = async () => {
+    if (pendientesVisibles.length === 0) return;
+    try {
+      const data = await transicionarCitas(pendientesVisibles, "confirmar");
+      if (data.omitidas > 0) {
+        toast.warn(
+          `${data.procesadas} citas confirmadas, ${data.omitidas} omitidas`
+        );
+      } else {
+        toast.success(`${data.procesadas} citas confirmadas correctamente`);
+      }
+      setFiltros((prev) => ({ ...prev }));
+    } catch (error) {
+      console.error("Error confirmando citas:", error);
+      toast.error("No se pudieron confirmar las citas");
+    }
+  };
+
   const handleOpenReprogramar = (cita) => {
     setReprogramandoId(cita.id);
     setNuevaFechaHora("");
@@ -440,6 +485,15 @@ const AdminCitasPage = () => {
       >
         Limpiar filtros
       </button>
+
+      <button
+        type="button"
+        className="btn btn-sm btn-primary"
+        disabled={pendientesVisibles.length === 0}
+        onClick={handleConfirmarPendientes}
+      >
+        Confirmar pendientes ({pendientesVisibles.length})
+      </button>
     </div>
   );
 
@@ -466,6 +520,9 @@ const AdminCitasPage = () => {
           columns={columns}
           toolbarRight={toolbarRight}
           emptyMessage="No hay citas con los filtros seleccionados."
+          hasMore={Boolean(siguiente)}
+          loadingMore={cargandoMas}
+          onLoadMore={handleCargarMas}
         />
 
         {/* Modal simple para reprogramar */}
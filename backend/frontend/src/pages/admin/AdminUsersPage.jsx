@@ -1,5 +1,5 @@
 // src/pages/admin/AdminUsersPage.jsx
-import React, { useEffect, useMemo, useState } from "react";
+import React, { useEffect, useState } from "react";
 import { Navigate, useNavigate } from "react-router-dom";
 import { FiUserPlus, FiEdit2, FiToggleLeft, FiToggleRight, FiX } from "react-icons/fi";
 
@@ -13,8 +13,6 @@ import {
 
 import "./AdminUsersPage.css";
 
-const ROLES_ESPECIALISTAS = ["DERMATOLOGO", "PODOLOGO", "TAMIZ"];
-
 const roleLabel = (role) => {
   if (!role) return "Sin rol";
   const r = role.toString().toUpperCase();
@@ -41,6 +39,8 @@ const AdminUsersPage = () => {
   const [checkingAuth, setCheckingAuth] = useState(true);
 
   const [users, setUsers] = useState([]);
+  const [siguiente, setSiguiente] = useState(null); // `next` del backend
+  const [cargandoMas, setCargandoMas] = useState(false);
   const [loading, setLoading] = useState(true);
   const [fetchError, setFetchError] = useState("");
   const [successMessage, setSuccessMessage] = useState("");
@@ -100,8 +100,9 @@ const AdminUsersPage = () => {
       setFetchError("");
       setSuccessMessage("");
 
-      const data = await getAdminUsers({}, signal);
-      setUsers(Array.isArray(data) ? data : []);
+      const { results, next } = await getAdminUsers(filtrosBackend(), signal);
+      setUsers(results);
+      setSiguiente(next);
     } catch (err) {
       if (signal?.aborted) return;
 
@@ -130,33 +131,35 @@ const AdminUsersPage = () => {
     }
   };
 
+  // Tipo y búsqueda se filtran en el backend: el listado llega por páginas.
+  const filtrosBackend = () => {
+    const params = {};
+    if (filterTipo !== "TODOS") params.tipo = filterTipo;
+    if (search.trim()) params.search = search.trim();
+    return params;
+  };
+
+  const handleCargarMas = async () => {
+    if (!siguiente) return;
+    try {
+      setCargandoMas(true);
+      const { results, next } = await getAdminUsers({}, undefined, siguiente);
+      setUsers((prev) => [...prev, ...results]);
+      setSiguiente(next);
+    } catch (err) {
+      console.error("Error cargando más usuarios (admin):", err);
+      setFetchError("No se pudieron cargar más usuarios.");
+    } finally {
+      setCargandoMas(false);
+    }
+  };
+
   useEffect(() => {
     const controller = new AbortController();
     fetchUsers(controller.signal);
 
     return () => controller.abort();
-  }, []);
-
-  const filteredUsers = useMemo(() => {
-    let list = [...users];
-
-    if (filterTipo === "PACIENTES") {
-      list = list.filter((u) => u.role === "PACIENTE");
-    } else if (filterTipo === "ESPECIALISTAS") {
-      list = list.filter((u) => ROLES_ESPECIALISTAS.includes(u.role));
-    }
-
-    const q = search.trim().toLowerCase();
-    if (q) {
-      list = list.filter((u) => {
-        const nombre = `${u.nombre || ""} ${u.apellidos || ""}`.toLowerCase();
-        const tel = (u.telefono || "").toLowerCase();
-        return nombre.includes(q) || tel.includes(q);
-      });
-    }
-
-    return list;
-  }, [users, filterTipo, search]);
+  }, [filterTipo, search]);
 
   const openCreateModal = () => {
     setModalMode("create");
@@ -399,7 +402,7 @@ const AdminUsersPage = () => {
             <div className="loading-spinner"></div>
             <p className="loading-text">Cargando usuarios...</p>
           </div>
-        ) : filteredUsers.length === 0 ? (
+        ) : users.length === 0 ? (
           <div className="empty-state">
             <p>No hay usuarios que coincidan con los filtros.</p>
           </div>
@@ -419,7 +422,7 @@ const AdminUsersPage = () => {
                 </tr>
               </thead>
               <tbody>
-                {filteredUsers.map((u) => (
+                {users.map((u) => (
                   <tr key={u.id}>
                     <td>
                       {u.nombre || u.apellidos
@@ -464,6 +467,18 @@ const AdminUsersPage = () => {
                 ))}
               </tbody>
             </table>
+            {siguiente && (
+              <div className="text-center my-3">
+                <button
+                  type="button"
+                  className="btn btn-outline-primary btn-sm"
+                  disabled={cargandoMas}
+                  onClick={handleCargarMas}
+                >
+                  {cargandoMas ? "Cargando..." : "Cargar más"}
+                </button>
+              </div>
+            )}
           </div>
         )}
 
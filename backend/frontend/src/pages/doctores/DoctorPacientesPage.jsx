@@ -18,6 +18,8 @@ const DoctorPacientesPage = () => {
   const [error, setError] = useState("");
 
   const [searchTerm, setSearchTerm] = useState("");
+  const [siguiente, setSiguiente] = useState(null); // `next` del backend
+  const [cargandoMas, setCargandoMas] = useState(false);
 
   if (!user) {
     return <Navigate to="/login" replace />;
@@ -48,9 +50,12 @@ const DoctorPacientesPage = () => {
           return;
         }
 
-        const data = await getPacientes(controller.signal);
+        const { results, next } = await getPacientes(controller.signal, {
+          search: searchTerm.trim(),
+        });
         if (!isMounted) return;
-        setPacientes(data || []);
+        setPacientes(results);
+        setSiguiente(next);
       } catch (err) {
         if (!controller.signal.aborted && isMounted) {
           console.error("Error al cargar pacientes:", err);
@@ -73,7 +78,24 @@ const DoctorPacientesPage = () => {
       isMounted = false;
       controller.abort();
     };
-  }, [isDoctorOrAdmin, navigate]);
+  }, [isDoctorOrAdmin, navigate, searchTerm]);
+
+  const handleCargarMas = async () => {
+    if (!siguiente) return;
+    try {
+      setCargandoMas(true);
+      const { results, next } = await getPacientes(undefined, {
+        next: siguiente,
+      });
+      setPacientes((prev) => [...prev, ...results]);
+      setSiguiente(next);
+    } catch (err) {
+      console.error("Error al cargar más pacientes:", err);
+      setError("No se pudieron cargar más pacientes.");
+    } finally {
+      setCargandoMas(false);
+    }
+  };
 
   const handleSearchChange = (e) => {
     setSearchTerm(e.target.value);
@@ -89,34 +111,15 @@ const DoctorPacientesPage = () => {
     });
   };
 
-  // 🔍 Búsqueda en memoria
-  const filteredPacientes = useMemo(() => {
-    if (!searchTerm.trim()) return pacientes;
-
-    const term = searchTerm.toLowerCase();
-    return pacientes.filter((p) => {
-      const nombreCompleto = `${p.nombre || ""} ${
-        p.apellidos || ""
-      }`.toLowerCase();
-      const telefono = (p.telefono || "").toLowerCase();
-      const edad = (p.edad ?? "").toString().toLowerCase();
-
-      return (
-        nombreCompleto.includes(term) ||
-        telefono.includes(term) ||
-        edad.includes(term)
-      );
-    });
-  }, [pacientes, searchTerm]);
-
+  // 🔍 La búsqueda la aplica el backend (listado por páginas)
   // Para mantener la columna "#"
   const tableRows = useMemo(
     () =>
-      filteredPacientes.map((p, index) => ({
+      pacientes.map((p, index) => ({
         ...p,
         __rowIndex: index + 1,
       })),
-    [filteredPacientes]
+    [pacientes]
   );
 
   const columns = [
@@ -201,7 +204,10 @@ const DoctorPacientesPage = () => {
                 loading={loading}
                 emptyMessage="No se encontraron pacientes para mostrar."
                 enableSearch={false}     // búsqueda ya se maneja en el header
-                enablePagination={false} // todo en memoria por ahora
+                enablePagination={false} // paginación por cursor del backend
+                hasMore={Boolean(siguiente)}
+                loadingMore={cargandoMas}
+                onLoadMore={handleCargarMas}
                 dense={false}
                 striped={true}
                 hover={true}
@@ -1,5 +1,5 @@
 // src/pages/doctores/DoctorPagosPage.jsx
-import React, { useEffect, useState, useMemo } from "react";
+import React, { useEffect, useState } from "react";
 import { Navigate, useNavigate } from "react-router-dom";
 
 import Navbar from "../../components/Navbar";
@@ -9,6 +9,13 @@ import { getPagosByDoctor } from "../../services/doctorService";
 import TableLayout from "../../components/TableLayout";
 import "./DoctorPagosPage.css";
 
+// Filtro rápido -> parámetro `verificado` del backend
+const VERIFICADO_PARAM = {
+  TODOS: undefined,
+  VERIFICADOS: true,
+  PENDIENTES: false,
+};
+
 const DoctorPagosPage = () => {
   const navigate = useNavigate();
   const user = getCurrentUser();
@@ -19,6 +26,8 @@ const DoctorPagosPage = () => {
   }
 
   const [pagos, setPagos] = useState([]);
+  const [siguiente, setSiguiente] = useState(null); // `next` del backend
+  const [cargandoMas, setCargandoMas] = useState(false);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState("");
 
@@ -63,10 +72,15 @@ const DoctorPagosPage = () => {
         setLoading(true);
         setError("");
 
-        const data = await getPagosByDoctor(user.id, controller.signal);
+        const { results, next } = await getPagosByDoctor(
+          user.id,
+          controller.signal,
+          { verificado: VERIFICADO_PARAM[filtroVerificado] }
+        );
 
         if (!isMounted) return;
-        setPagos(data || []);
+        setPagos(results);
+        setSiguiente(next);
       } catch (err) {
         if (!isMounted || controller.signal.aborted) return;
 
@@ -94,7 +108,24 @@ const DoctorPagosPage = () => {
       isMounted = false;
       controller.abort();
     };
-  }, [user.id, navigate]);
+  }, [user.id, navigate, filtroVerificado]);
+
+  const handleCargarMas = async () => {
+    if (!siguiente) return;
+    try {
+      setCargandoMas(true);
+      const { results, next } = await getPagosByDoctor(user.id, undefined, {
+        next: siguiente,
+      });
+      setPagos((prev) => [...prev, ...results]);
+      setSiguiente(next);
+    } catch (err) {
+      console.error("Error cargando más pagos del doctor:", err);
+      setError("No se pudieron cargar más pagos.");
+    } finally {
+      setCargandoMas(false);
+    }
+  };
 
   const parseFecha = (valor) => {
     if (!valor) return null;
@@ -145,17 +176,8 @@ const DoctorPagosPage = () => {
     });
   };
 
-  // 🎯 Filtro en memoria por verificado / pendiente
-  const pagosFiltrados = useMemo(
-    () =>
-      pagos.filter((pago) => {
-        if (filtroVerificado === "TODOS") return true;
-        if (filtroVerificado === "VERIFICADOS") return !!pago.verificado;
-        if (filtroVerificado === "PENDIENTES") return !pago.verificado;
-        return true;
-      }),
-    [pagos, filtroVerificado]
-  );
+  // 🎯 El filtro verificado / pendiente lo aplica el backend (listado por páginas)
+  const pagosFiltrados = pagos;
 
   const totalPagos = pagosFiltrados.length;
 
@@ -234,9 +256,22 @@ const DoctorPagosPage = () => {
             href={pago.comprobante}
             target="_blank"
             rel="noopener noreferrer"
-            className="btn btn-sm btn-outline-primary"
+            className={
+              pago.comprobante_miniatura ? "d-inline-block" : "btn btn-sm btn-outline-primary"
+            }
+            title="Ver comprobante"
           >
-            Ver comprobante
+            {pago.comprobante_miniatura ? (
+              <img
+                src={pago.comprobante_miniatura}
+                alt="Comprobante"
+                loading="lazy"
+                className="img-thumbnail"
+                style={{ maxWidth: 80, maxHeight: 80 }}
+              />
+            ) : (
+              "Ver comprobante"
+            )}
           </a>
         ) : (
           <span className="text-muted small">Sin comprobante</span>
@@ -267,7 +302,7 @@ const DoctorPagosPage = () => {
             </div>
             <div className="doctor-pagos-header-right">
               <span className="doctor-pagos-badge-count">
-                Registros: <strong>{totalPagos}</strong> pago
+                Registros: <strong>{totalPagos}{siguiente ? "+" : ""}</strong> pago
                 {totalPagos === 1 ? "" : "s"}
               </span>
             </div>
@@ -310,6 +345,9 @@ const DoctorPagosPage = () => {
                 data={pagosFiltrados}
                 loading={loading}
                 emptyMessage="No hay pagos registrados con este filtro."
+                hasMore={Boolean(siguiente)}
+                loadingMore={cargandoMas}
+                onLoadMore={handleCargarMas}
                 enableSearch={false}
                 enablePagination={false}
                 dense={false}
@@ -4,7 +4,7 @@ import { Navigate, useNavigate } from "react-router-dom";
 
 import Navbar from "../../components/Navbar";
 import { getCurrentUser, verifyAuth } from "../../services/authService";
-import { getRecetas } from "../../services/recetasService";
+import { getRecetasPagina } from "../../services/recetasService";
 import RecetaModal from "../../components/citas/RecetaModal";
 
 // 👉 Importamos el formateador centralizado
@@ -94,6 +94,8 @@ const DoctorRecetasPage = () => {
   const [user] = useState(() => getCurrentUser());
 
   const [recetas, setRecetas] = useState([]);
+  const [siguiente, setSiguiente] = useState(null); // `next` del backend
+  const [cargandoMas, setCargandoMas] = useState(false);
   const [loading, setLoading] = useState(true);
   const [loadingFiltro, setLoadingFiltro] = useState(false);
   const [error, setError] = useState("");
@@ -143,10 +145,13 @@ const DoctorRecetasPage = () => {
           params.doctor = user.id;
         }
 
-        const data = await getRecetas(params, controller.signal);
+        const { results, next } = await getRecetasPagina(params, {
+          signal: controller.signal,
+        });
         if (!isMounted) return;
 
-        setRecetas(Array.isArray(data) ? data : []);
+        setRecetas(results);
+        setSiguiente(next);
       } catch (err) {
         if (!controller.signal.aborted && isMounted) {
           console.error("Error al cargar recetas médicas:", err);
@@ -172,6 +177,21 @@ const DoctorRecetasPage = () => {
     };
   }, [isDoctorOrAdmin, navigate, user.id, user.role]);
 
+  const handleCargarMas = async () => {
+    if (!siguiente) return;
+    try {
+      setCargandoMas(true);
+      const { results, next } = await getRecetasPagina({}, { next: siguiente });
+      setRecetas((prev) => [...prev, ...results]);
+      setSiguiente(next);
+    } catch (err) {
+      console.error("Error al cargar más recetas:", err);
+      setError("No se pudieron cargar más recetas.");
+    } finally {
+      setCargandoMas(false);
+    }
+  };
+
   // pequeño efecto para mostrar "Actualizando resultados..." al tipear
   useEffect(() => {
     if (!loading) {
@@ -301,7 +321,10 @@ const DoctorRecetasPage = () => {
 
             <div className="doctor-recetas-header-right">
               <span className="doctor-recetas-badge-count">
-                <span className="doctor-recetas-count">{totalRecetas}</span>
+                <span className="doctor-recetas-count">
+                  {totalRecetas}
+                  {siguiente ? "+" : ""}
+                </span>
                 <span className="doctor-recetas-label">
                   Receta{totalRecetas === 1 ? "" : "s"}
                 </span>
@@ -328,7 +351,7 @@ const DoctorRecetasPage = () => {
             <div className="row g-2 align-items-end">
               <div className="col-12 col-md-6">
                 <label className="doctor-recetas-filters-label">
-                  Buscar (paciente / cita / detalles)
+                  Buscar en las recetas cargadas (paciente / cita / detalles)
                 </label>
                 <input
                   type="text"
@@ -358,7 +381,10 @@ const DoctorRecetasPage = () => {
               loading={loading}
               emptyMessage="No se encontraron recetas con los filtros actuales."
               enableSearch={false}      // búsqueda ya se maneja arriba
-              enablePagination={false}  // todo en memoria por ahora
+              enablePagination={false}  // paginación por cursor del backend
+              hasMore={Boolean(siguiente)}
+              loadingMore={cargandoMas}
+              onLoadMore={handleCargarMas}
               dense={false}
               striped={true}
               hover={true}
@@ -7,7 +7,7 @@ import TableLayout from "../../components/TableLayout";
 import RecetaModal from "../../components/citas/RecetaModal";
 import { getCurrentUser, verifyAuth } from "../../services/authService";
 import { 
-  getReportes, 
+  getReportesPagina, 
   getReportesByPaciente 
 } from "../../services/reportesService";
 import { getCitasByPaciente } from "../../services/pacientesService";
@@ -68,6 +68,8 @@ const DoctorReportePage = () => {
 
   // Estados para lista de reportes
   const [reportes, setReportes] = useState([]);
+  const [siguiente, setSiguiente] = useState(null); // `next` del backend (modo lista)
+  const [cargandoMas, setCargandoMas] = useState(false);
   const [loading, setLoading] = useState(true);
   const [loadingFiltro, setLoadingFiltro] = useState(false);
   const [error, setError] = useState("");
@@ -205,7 +207,7 @@ const DoctorReportePage = () => {
           }
 
         } else {
-          // MODO LISTA: Cargar todos los reportes
+          // MODO LISTA: primera página; el resto con "Cargar más"
           setLoading(true);
 
           const params = {};
@@ -216,10 +218,13 @@ const DoctorReportePage = () => {
             params.estado = estadoFilter;
           }
 
-          const data = await getReportes(params, controller.signal);
+          const { results, next } = await getReportesPagina(params, {
+            signal: controller.signal,
+          });
           if (!isMounted) return;
 
-          setReportes(Array.isArray(data) ? data : []);
+          setReportes(results);
+          setSiguiente(next);
           setLoading(false);
         }
 
@@ -253,6 +258,21 @@ const DoctorReportePage = () => {
     };
   }, [isDoctorOrAdmin, pacienteId, estadoFilter, navigate, user.id, user.role]);
 
+  const handleCargarMas = async () => {
+    if (!siguiente) return;
+    try {
+      setCargandoMas(true);
+      const { results, next } = await getReportesPagina({}, { next: siguiente });
+      setReportes((prev) => [...prev, ...results]);
+      setSiguiente(next);
+    } catch (err) {
+      console.error("Error al cargar más reportes:", err);
+      setError("No se pudieron cargar más reportes.");
+    } finally {
+      setCargandoMas(false);
+    }
+  };
+
   // Efecto para "Actualizando resultados..." al escribir en búsqueda (solo en modo lista)
   useEffect(() => {
     if (!loading && !pacienteId) {
@@ -888,7 +908,7 @@ const DoctorReportePage = () => {
 
             <div className="doctor-reporte-header-right">
               <span className="doctor-reporte-badge-count">
-                Registros: <strong>{totalReportes}</strong> reporte
+                Registros: <strong>{totalReportes}{siguiente ? "+" : ""}</strong> reporte
                 {totalReportes === 1 ? "" : "s"}
               </span>
               <button
@@ -928,7 +948,7 @@ const DoctorReportePage = () => {
 
               <div className="col-12 col-md-5">
                 <label className="doctor-reporte-filters-label">
-                  Buscar (paciente / resumen / diagnóstico)
+                  Buscar en los reportes cargados (paciente / resumen / diagnóstico)
                 </label>
                 <input
                   type="text"
@@ -959,6 +979,9 @@ const DoctorReportePage = () => {
               emptyMessage="No se encontraron reportes clínicos con los filtros actuales."
               enableSearch={false}
               enablePagination={false}
+              hasMore={Boolean(siguiente)}
+              loadingMore={cargandoMas}
+              onLoadMore={handleCargarMas}
               striped={true}
               hover={true}
               rowKey="id"
@@ -4,7 +4,7 @@ import { useNavigate, Navigate } from "react-router-dom";
 
 import Navbar from "../../components/Navbar";
 import { getCurrentUser, verifyAuth } from "../../services/authService";
-import { getPagos } from "../../services/pagosService";
+import { getPagosPagina } from "../../services/pagosService";
 import TableLayout from "../../components/TableLayout";
 import { formatearFechaHora } from "../../components/clinicFormatters";
 import "./PacientePagosPage.css";
@@ -76,6 +76,8 @@ const PacientePagosPage = () => {
   const userId = user?.id;
 
   const [pagos, setPagos] = useState([]);
+  const [siguiente, setSiguiente] = useState(null); // `next` del backend
+  const [cargandoMas, setCargandoMas] = useState(false);
   const [loading, setLoading] = useState(true);
   const [loadingFiltro, setLoadingFiltro] = useState(false);
   const [error, setError] = useState("");
@@ -132,15 +134,13 @@ const PacientePagosPage = () => {
         if (estadoFilter) params.estado_pago = estadoFilter;
         if (metodoFilter) params.metodo_pago = metodoFilter;
 
-        const data = await getPagos(params, controller.signal);
+        const { results, next } = await getPagosPagina(params, {
+          signal: controller.signal,
+        });
         if (!isMounted) return;
 
-        const list = Array.isArray(data)
-          ? data
-          : Array.isArray(data?.results)
-          ? data.results
-          : [];
-        setPagos(list);
+        setPagos(results);
+        setSiguiente(next);
       } catch (err) {
         if (!controller.signal.aborted && isMounted) {
           console.error("Error al cargar pagos del paciente:", err);
@@ -166,6 +166,21 @@ const PacientePagosPage = () => {
     };
   }, [userId, estadoFilter, metodoFilter]);
 
+  const handleCargarMas = async () => {
+    if (!siguiente) return;
+    try {
+      setCargandoMas(true);
+      const { results, next } = await getPagosPagina({}, { next: siguiente });
+      setPagos((prev) => [...prev, ...results]);
+      setSiguiente(next);
+    } catch (err) {
+      console.error("Error al cargar más pagos del paciente:", err);
+      setError("No se pudieron cargar más pagos.");
+    } finally {
+      setCargandoMas(false);
+    }
+  };
+
   // 🎯 Micro-feedback visual al escribir búsqueda
   useEffect(() => {
     if (!loading) {
@@ -277,7 +292,10 @@ const PacientePagosPage = () => {
                 </div>
                 <div className="paciente-pagos-header-right">
                   <div className="pagos-summary-card">
-                    <div className="pagos-count">{totalPagos}</div>
+                    <div className="pagos-count">
+                      {totalPagos}
+                      {siguiente ? "+" : ""}
+                    </div>
                     <div className="pagos-label">Registros</div>
                   </div>
                 </div>
@@ -329,7 +347,7 @@ const PacientePagosPage = () => {
 
                   <div className="filter-group">
                     <label className="filter-label">
-                      Buscar (cita / método / estado / monto)
+                      Buscar en los pagos cargados (cita / método / estado / monto)
                     </label>
                     <input
                       type="text"
@@ -360,6 +378,9 @@ const PacientePagosPage = () => {
                   emptyMessage="No se encontraron pagos con los filtros actuales."
                   enableSearch={false}
                   enablePagination={false}
+                  hasMore={Boolean(siguiente)}
+                  loadingMore={cargandoMas}
+                  onLoadMore={handleCargarMas}
                   striped={true}
                   hover={true}
                   rowKey="id"
@@ -164,6 +164,9 @@ const PaymentPage = () => {
           backendError = data.cita[0];
         } else if (Array.isArray(data.comprobante) && data.comprobante[0]) {
           backendError = data.comprobante[0];
+        } else if (typeof data.comprobante === "string") {
+          // Tipo, tamaño o resolución rechazados por el backend
+          backendError = data.comprobante;
         } else if (Array.isArray(data.total) && data.total[0]) {
           backendError = data.total[0];
         } else if (data.error) {
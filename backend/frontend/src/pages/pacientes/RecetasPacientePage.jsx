@@ -4,7 +4,7 @@ import { Navigate, useNavigate } from "react-router-dom";
 
 import Navbar from "../../components/Navbar";
 import { getCurrentUser, verifyAuth } from "../../services/authService";
-import { getRecetasByPaciente } from "../../services/recetasService";
+import { getRecetasPagina } from "../../services/recetasService";
 import "./RecetasPacientePage.css";
 
 const formatearFechaHora = (fechaStr) => {
@@ -71,6 +71,8 @@ const RecetasPacientePage = () => {
   const [user] = useState(() => getCurrentUser());
 
   const [recetas, setRecetas] = useState([]);
+  const [siguiente, setSiguiente] = useState(null); // `next` del backend
+  const [cargandoMas, setCargandoMas] = useState(false);
   const [loading, setLoading] = useState(true);
   const [loadingFiltro, setLoadingFiltro] = useState(false);
   const [error, setError] = useState("");
@@ -109,10 +111,14 @@ const RecetasPacientePage = () => {
           return;
         }
 
-        const data = await getRecetasByPaciente(user.id, controller.signal);
+        const { results, next } = await getRecetasPagina(
+          { paciente: user.id },
+          { signal: controller.signal }
+        );
         if (!isMounted) return;
 
-        setRecetas(Array.isArray(data) ? data : []);
+        setRecetas(results);
+        setSiguiente(next);
       } catch (err) {
         if (!controller.signal.aborted && isMounted) {
           console.error("Error al cargar recetas del paciente:", err);
@@ -138,6 +144,21 @@ const RecetasPacientePage = () => {
     };
   }, [isPaciente, navigate, user.id]);
 
+  const handleCargarMas = async () => {
+    if (!siguiente) return;
+    try {
+      setCargandoMas(true);
+      const { results, next } = await getRecetasPagina({}, { next: siguiente });
+      setRecetas((prev) => [...prev, ...results]);
+      setSiguiente(next);
+    } catch (err) {
+      console.error("Error al cargar más recetas del paciente:", err);
+      setError("No se pudieron cargar más recetas.");
+    } finally {
+      setCargandoMas(false);
+    }
+  };
+
   const recetasFiltradas = useMemo(() => {
     if (!Array.isArray(recetas)) return [];
 
@@ -212,7 +233,10 @@ const RecetasPacientePage = () => {
                 
                 <div className="paciente-recetas-header-right">
                   <div className="recetas-summary-card">
-                    <div className="recetas-count">{recetasFiltradas.length}</div>
+                    <div className="recetas-count">
+                      {recetasFiltradas.length}
+                      {siguiente ? "+" : ""}
+                    </div>
                     <div className="recetas-label">Recetas</div>
                   </div>
                 </div>
@@ -315,6 +339,18 @@ const RecetasPacientePage = () => {
                         })}
                       </tbody>
                     </table>
+                    {siguiente && (
+                      <div className="text-center my-3">
+                        <button
+                          type="button"
+                          className="btn btn-outline-primary btn-sm"
+                          disabled={cargandoMas}
+                          onClick={handleCargarMas}
+                        >
+                          {cargandoMas ? "Cargando..." : "Cargar más"}
+                        </button>
+                      </div>
+                    )}
                   </div>
                 )}
               </div>
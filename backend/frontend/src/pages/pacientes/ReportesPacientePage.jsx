@@ -4,7 +4,7 @@ import { Navigate, useNavigate } from "react-router-dom";
 
 import Navbar from "../../components/Navbar";
 import { getCurrentUser, verifyAuth } from "../../services/authService";
-import { getReportesByPaciente } from "../../services/reportesService";
+import { getReportesPagina } from "../../services/reportesService";
 import {
   formatearFechaHora,
   mapEstadoReporte,
@@ -28,6 +28,8 @@ const ReportesPacientePage = () => {
   const [user] = useState(() => getCurrentUser());
 
   const [reportes, setReportes] = useState([]);
+  const [siguiente, setSiguiente] = useState(null); // `next` del backend
+  const [cargandoMas, setCargandoMas] = useState(false);
   const [loading, setLoading] = useState(true);
   const [loadingFiltro, setLoadingFiltro] = useState(false);
   const [error, setError] = useState("");
@@ -66,10 +68,15 @@ const ReportesPacientePage = () => {
           return;
         }
 
-        const data = await getReportesByPaciente(user.id, controller.signal);
+        // Solo FINAL: el filtro va al backend para que cada página venga llena
+        const { results, next } = await getReportesPagina(
+          { paciente: user.id, estado: "FINAL" },
+          { signal: controller.signal }
+        );
         if (!isMounted) return;
 
-        setReportes(Array.isArray(data) ? data : []);
+        setReportes(results);
+        setSiguiente(next);
       } catch (err) {
         if (!controller.signal.aborted && isMounted) {
           console.error("Error al cargar reportes del paciente:", err);
@@ -95,6 +102,21 @@ const ReportesPacientePage = () => {
     };
   }, [isPaciente, navigate, user.id]);
 
+  const handleCargarMas = async () => {
+    if (!siguiente) return;
+    try {
+      setCargandoMas(true);
+      const { results, next } = await getReportesPagina({}, { next: siguiente });
+      setReportes((prev) => [...prev, ...results]);
+      setSiguiente(next);
+    } catch (err) {
+      console.error("Error al cargar más reportes del paciente:", err);
+      setError("No se pudieron cargar más consultas.");
+    } finally {
+      setCargandoMas(false);
+    }
+  };
+
   const reportesFiltrados = useMemo(() => {
     if (!Array.isArray(reportes)) return [];
 
@@ -173,7 +195,10 @@ const ReportesPacientePage = () => {
                 
                 <div className="paciente-reportes-header-right">
                   <div className="reportes-summary-card">
-                    <div className="reportes-count">{reportesFiltrados.length}</div>
+                    <div className="reportes-count">
+                      {reportesFiltrados.length}
+                      {siguiente ? "+" : ""}
+                    </div>
                     <div className="reportes-label">Consultas</div>
                   </div>
                 </div>
@@ -281,6 +306,18 @@ const ReportesPacientePage = () => {
                         })}
                       </tbody>
                     </table>
+                    {siguiente && (
+                      <div className="text-center my-3">
+                        <button
+                          type="button"
+                          className="btn btn-outline-primary btn-sm"
+                          disabled={cargandoMas}
+                          onClick={handleCargarMas}
+                        >
+                          {cargandoMas ? "Cargando..." : "Cargar más"}
+                        </button>
+                      </div>
+                    )}
                   </div>
                 )}
               </div>
@@ -1,5 +1,5 @@
 // src/services/adminCitasService.js
-import api from "./api";
+import api, { getPagina } from "./api";
 
 /**
  * Listar citas para el panel de ADMIN.
@@ -12,14 +12,12 @@ import api from "./api";
  *  - fecha_desde: "YYYY-MM-DD"
  *  - fecha_hasta: "YYYY-MM-DD"
  *
+ * Devuelve una página: { results, next }. Para la siguiente, pasar `next`.
+ *
  * Endpoint backend: GET /citas/
  */
-export const getCitasAdmin = async (params = {}, signal) => {
-  const response = await api.get("citas/", {
-    params,
-    signal,
-  });
-  return response.data;
+export const getCitasAdmin = async (params = {}, signal, next) => {
+  return getPagina("citas/", { params, next, signal });
 };
 
 /**
@@ -55,6 +53,22 @@ export const confirmarCita = async (citaId, accion = "confirmar", signal) => {
   return response.data;
 };
 
+/**
+ * Confirmar / cancelar varias citas en una sola petición.
+ *
+ * Endpoint backend: POST /citas/transicion/
+ * Payload: { ids: [1, 2, ...], accion: "confirmar" | "cancelar" }
+ * Respuesta: { procesadas, omitidas, resultados: [{ id, ok, estado, detail }] }
+ */
+export const transicionarCitas = async (ids, accion, signal) => {
+  const response = await api.post(
+    "citas/transicion/",
+    { ids, accion },
+    { signal }
+  );
+  return response.data;
+};
+
 /**
  * Cancelación vía endpoint de paciente/admin:
  *
@@ -80,3 +94,103 @@ export const getEspecialidades = async (signal) => {
   const response = await api.get("especialidades/", { signal });
   return response.data;
 };
+
+/**
+ * Analítica de ocupación por doctor (solo ADMIN): slots ofrecidos,
+ * ocupación, cancelaciones, atendidas y anticipación de reserva.
+ *
+ * Endpoint backend: GET /analitica/ocupacion/?desde=&hasta=&doctor=
+ */
+export const getAnaliticaOcupacion = async (
+  { desde, hasta, doctorId } = {},
+  signal
+) => {
+  const params = {};
+  if (desde) params.desde = desde;
+  if (hasta) params.hasta = hasta;
+  if (doctorId) params.doctor = doctorId;
+
+  const response = await api.get("analitica/ocupacion/", { params, signal });
+  return response.data;
+};
+
+/**
+ * Descarga la exportación (CSV/XLSX) de citas, pagos o pacientes con los
+ * mismos filtros del listado correspondiente (solo ADMIN).
+ *
+ * recurso: "citas" | "pagos" | "pacientes"
+ * Endpoint backend: GET /<recurso>/exportar/?formato=csv|xlsx&...
+ */
+export const descargarExportacion = async (
+  recurso,
+  { formato = "csv", ...filtros } = {},
+  signal
+) => {
+  const response = await api.get(`${recurso}/exportar/`, {
+    params: { ...filtros, formato },
+    responseType: "blob",
+    signal,
+  });
+
+  const url = window.URL.createObjectURL(response.data);
+  const link = document.createElement("a");
+  link.href = url;
+  link.download = `${recurso}.${formato}`;
+  document.body.appendChild(link);
+  link.click();
+  link.remove();
+  window.URL.revokeObjectURL(url);
+};
+
+/**
+ * Encola un ZIP con los consentimientos de un paciente y/o rango de fechas.
+ * Devuelve el trabajo (estado PENDIENTE); consultar con getTrabajo.
+ *
+ * Endpoint backend: POST /trabajos/consentimientos-zip/
+ */
+export const encolarConsentimientosZip = async (
+  { pacienteId, desde, hasta } = {},
+  signal
+) => {
+  const payload = {};
+  if (pacienteId) payload.paciente = pacienteId;
+  if (desde) payload.desde = desde;
+  if (hasta) payload.hasta = hasta;
+
+  const response = await api.post("trabajos/consentimientos-zip/", payload, {
+    signal,
+  });
+  return response.data;
+};
+
+/**
+ * Estado de un trabajo de documentos. Cuando `estado === "COMPLETADO"`
+ * trae `descarga_url`.
+ *
+ * Endpoint backend: GET /trabajos/<id>/
+ */
+export const getTrabajo = async (trabajoId, signal) => {
+  const response = await api.get(`trabajos/${trabajoId}/`, { signal });
+  return response.data;
+};
+
+/**
+ * Descarga el archivo de un trabajo completado.
+ *
+ * Endpoint backend: GET /trabajos/<id>/descargar/
+ */
+export const descargarTrabajo = async (trabajoId, signal) => {
+  const response = await api.get(`trabajos/${trabajoId}/descargar/`, {
+    responseType: "blob",
+    signal,
+  });
+
+  const url = window.URL.createObjectURL(response.data);
+  const link = document.createElement("a");
+  link.href = url;
+  link.download = `trabajo_${trabajoId}.zip`;
+  document.body.appendChild(link);
+  link.click();
+  link.remove();
+  window.URL.revokeObjectURL(url);
+};
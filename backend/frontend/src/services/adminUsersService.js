@@ -1,5 +1,5 @@
 // src/services/adminUsersService.js
-import api from "./api";
+import api, { getPagina } from "./api";
 
 /**
  * Listar usuarios administrables (pacientes + especialistas).
@@ -23,16 +23,13 @@ const BASE_PATH = "admin-users/";
 /**
  * Obtener lista de usuarios (con filtros opcionales).
  *
- * @param {Object} params - filtros opcionales (role, search, etc. si el backend los soporta)
+ * @param {Object} params - filtros opcionales (tipo, search)
  * @param {AbortSignal} signal - para cancelar la petición (opcional)
- * @returns {Promise<Array>}
+ * @param {string} [next] - URL `next` de la página anterior
+ * @returns {Promise<{results: Array, next: string|null}>}
  */
-export const getAdminUsers = async (params = {}, signal) => {
-  const response = await api.get(BASE_PATH, {
-    params,
-    signal,
-  });
-  return response.data;
+export const getAdminUsers = async (params = {}, signal, next) => {
+  return getPagina(BASE_PATH, { params, next, signal });
 };
 
 /**
@@ -64,4 +64,39 @@ api.interceptors.response.use(
   }
 );
 
+/**
+ * Una página de un listado paginado por cursor.
+ *
+ * Sin `next` pide la primera página de `url` con `params`; con `next` pide la
+ * URL absoluta que devolvió el backend (ya trae filtros y cursor).
+ *
+ * @returns {Promise<{results: Array, next: string|null}>}
+ */
+export const getPagina = async (url, { params, next, signal } = {}) => {
+  const response = next
+    ? await api.get(next, { signal })
+    : await api.get(url, { params, signal });
+
+  const data = response.data;
+  if (Array.isArray(data)) {
+    return { results: data, next: null };
+  }
+  return { results: data?.results || [], next: data?.next || null };
+};
+
+/**
+ * Listado completo en una sola respuesta (?paginar=0).
+ *
+ * Solo para vistas que necesitan todas las filas a la vez (dashboards,
+ * historial de un paciente, cruces entre listados); las pantallas de listado
+ * usan getPagina y cargan más con `next`.
+ */
+export const getListaCompleta = async (url, { params, signal } = {}) => {
+  const response = await api.get(url, {
+    params: { ...(params || {}), paginar: 0 },
+    signal,
+  });
+  return Array.isArray(response.data) ? response.data : [];
+};
+
 export default api;
@@ -1,5 +1,5 @@
 // src/services/citasService.js
-import api from "./api";
+import api, { getListaCompleta } from "./api";
 
 /**
  * Normalizador de Cita a nivel frontend.
@@ -7,7 +7,7 @@ import api from "./api";
  * - Mantiene todos los campos originales (`...raw`).
  * - Garantiza que `requiere_consentimiento` llegue como boolean.
  */
-const mapCita = (raw) => {
+export const mapCita = (raw) => {
   if (!raw) return raw;
 
   return {
@@ -58,6 +58,37 @@ export const getHorariosDisponibles = async (
   return response.data.horas_disponibles || [];
 };
 
+/**
+ * Obtener la rejilla de horas libres para un rango de días (un solo request).
+ *
+ * desdeISO / hastaISO: "YYYY-MM-DD" (máximo 62 días)
+ * Endpoint: GET /horarios/disponibles/?especialidad=<id>&fecha_desde=<>&fecha_hasta=<>[&doctor=<id>]
+ *
+ * El backend devuelve:
+ *  { dias: { "2025-01-06": ["09:00", ...], "2025-01-07": [], ... } }
+ */
+export const getDisponibilidadRango = async (
+  especialidadId,
+  desdeISO,
+  hastaISO,
+  { doctorId, signal } = {}
+) => {
+  const params = {
+    especialidad: especialidadId,
+    fecha_desde: desdeISO,
+    fecha_hasta: hastaISO,
+  };
+
+  if (doctorId) params.doctor = doctorId;
+
+  const response = await api.get("horarios/disponibles/", {
+    params,
+    signal,
+  });
+
+  return response.data.dias || {};
+};
+
 /**
  * Crear una cita (flujo PACIENTE).
  *
@@ -127,12 +158,7 @@ export const getCitas = async ({
   if (doctorId) params.doctor = doctorId;
   if (estado) params.estado = estado;
 
-  const response = await api.get("citas/", {
-    params,
-    signal,
-  });
-
-  const data = response.data;
+  const data = await getListaCompleta("citas/", { params, signal });
 
   // Si el backend devuelve lista, la mapeamos; si devuelve otra cosa, la regresamos tal cual.
   if (Array.isArray(data)) {
@@ -154,12 +180,7 @@ export const getCitasByPaciente = async (pacienteId, signal) => {
     params.paciente = pacienteId;
   }
 
-  const response = await api.get("citas/", {
-    params,
-    signal,
-  });
-
-  const data = response.data;
+  const data = await getListaCompleta("citas/", { params, signal });
   return Array.isArray(data) ? data.map(mapCita) : data;
 };
 
@@ -182,13 +203,36 @@ export const getCitasByDoctor = async (doctorId, { estado, signal } = {}) => {
     params.estado = estado;
   }
 
-  const response = await api.get("citas/", {
+  const data = await getListaCompleta("citas/", { params, signal });
+  return Array.isArray(data) ? data.map(mapCita) : data;
+};
+
+/**
+ * Agenda del doctor en un día o rango (una sola petición).
+ * Cada cita trae resumen de pagos, procedimientos, consentimiento,
+ * reporte FINAL, receta y tratamiento.
+ *
+ * Endpoint: GET /agenda/?doctor=<id>&desde=YYYY-MM-DD&hasta=YYYY-MM-DD
+ */
+export const getAgendaDoctor = async ({ doctorId, desde, hasta, signal } = {}) => {
+  const params = {};
+
+  if (doctorId) {
+    params.doctor = doctorId;
+  }
+  if (desde) {
+    params.desde = desde;
+  }
+  if (hasta) {
+    params.hasta = hasta;
+  }
+
+  const response = await api.get("agenda/", {
     params,
     signal,
   });
 
-  const data = response.data;
-  return Array.isArray(data) ? data.map(mapCita) : data;
+  return response.data;
 };
 
 /**
@@ -352,6 +396,7 @@ const citasService = {
   getCitas,
   getCitasByPaciente,
   getCitasByDoctor,
+  getAgendaDoctor,
   getCitaById,
   confirmarCita,
   crearCitaSubsecuente,
@@ -1,5 +1,5 @@
 // src/services/doctorService.js
-import api from "./api";
+import api, { getPagina } from "./api";
 
 /**
  * Obtener pagos relacionados con el doctor.
@@ -8,11 +8,20 @@ import api from "./api";
  * - Si el backend ya filtra por request.user (rol doctor), no pasa nada si no mandas params.
  * - Si también soporta filtro por doctor, usamos doctorId como query param.
  *
+ * Devuelve una página: { results, next }. Para la siguiente, pasar `next`.
+ *
  * @param {number|string} [doctorId]
  * @param {AbortSignal} [signal]
- * @returns {Promise<Array>}
+ * @param {Object} [opciones]
+ * @param {boolean} [opciones.verificado] - filtra verificados / pendientes
+ * @param {string} [opciones.next] - URL `next` de la página anterior
+ * @returns {Promise<{results: Array, next: string|null}>}
  */
-export const getPagosByDoctor = async (doctorId, signal) => {
+export const getPagosByDoctor = async (
+  doctorId,
+  signal,
+  { verificado, next } = {}
+) => {
   const params = {};
 
   // En caso de que el backend tenga filtro por doctor,
@@ -20,11 +29,36 @@ export const getPagosByDoctor = async (doctorId, signal) => {
   if (doctorId) {
     params.doctor = doctorId;
   }
+  if (typeof verificado === "boolean") {
+    params.verificado = verificado;
+  }
 
-  const res = await api.get("pagos/", {
-    params,
-    signal,
-  });
+  return getPagina("pagos/", { params, next, signal });
+};
 
-  return res.data || [];
+/**
+ * Semana de horarios del doctor (o de `doctorId` si quien llama es ADMIN).
+ *
+ * Endpoint backend: GET /horarios/semana/[?doctor=<id>]
+ */
+export const getHorarioSemana = async (doctorId, signal) => {
+  const params = doctorId ? { doctor: doctorId } : {};
+  const res = await api.get("horarios/semana/", { params, signal });
+  return res.data;
+};
+
+/**
+ * Reemplaza la semana completa de horarios en una sola petición.
+ * `horarios`: [{ dia_semana, hora_inicio: "HH:MM", hora_fin: "HH:MM" }, ...]
+ * El backend rechaza (400) bloques traslapados en el mismo día.
+ *
+ * Endpoint backend: PUT /horarios/semana/
+ */
+export const guardarHorarioSemana = async (horarios, doctorId) => {
+  const payload = { horarios };
+  if (doctorId) {
+    payload.doctor = doctorId;
+  }
+  const res = await api.put("horarios/semana/", payload);
+  return res.data;
 };
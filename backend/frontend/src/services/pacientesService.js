@@ -1,8 +1,9 @@
 // src/services/pacientesService.js
-import api from "./api";
+import api, { getListaCompleta, getPagina } from "./api";
 import {
   getCitasByPaciente as getCitasByPacienteCore,
   reprogramarCita as reprogramarCitaCore,
+  mapCita,
 } from "./citasService";
 
 /**
@@ -13,11 +14,14 @@ import {
  *  - DOCTOR: solo pacientes con citas con él
  *  - ADMIN: todos
  *
- * Endpoint: GET /pacientes/
+ * Devuelve una página: { results, next }. Para la siguiente, pasar `next`.
+ * `search` filtra en el backend por nombre, apellidos, teléfono o edad.
+ *
+ * Endpoint: GET /pacientes/[?search=<texto>]
  */
-export const getPacientes = async (signal) => {
-  const response = await api.get("pacientes/", { signal });
-  return response.data;
+export const getPacientes = async (signal, { search, next } = {}) => {
+  const params = search ? { search } : {};
+  return getPagina("pacientes/", { params, next, signal });
 };
 
 /**
@@ -34,6 +38,28 @@ export const getPacienteById = async (pacienteId, signal) => {
   return response.data;
 };
 
+/**
+ * Dashboard del paciente autenticado en una sola petición.
+ *
+ * Endpoint: GET /me/dashboard/
+ *
+ * Devuelve:
+ *  - citas_proximas / citas_pasadas (con sus pagos anidados)
+ *  - pagos_pendientes (en revisión)
+ *  - tratamiento (activo, con proxima_cita) o null
+ *  - recetas (las más recientes)
+ */
+export const getMiDashboard = async (signal) => {
+  const response = await api.get("me/dashboard/", { signal });
+  const data = response.data || {};
+
+  return {
+    ...data,
+    citas_proximas: (data.citas_proximas || []).map(mapCita),
+    citas_pasadas: (data.citas_pasadas || []).map(mapCita),
+  };
+};
+
 /**
  * Obtener pagos de un paciente específico.
  *
@@ -47,12 +73,10 @@ export const getPagosByPaciente = async (pacienteId, signal) => {
     throw new Error("ID de paciente requerido.");
   }
 
-  const response = await api.get("pagos/", {
+  return getListaCompleta("pagos/", {
     params: { paciente: pacienteId },
     signal,
   });
-
-  return response.data;
 };
 
 /**
@@ -1,5 +1,5 @@
 // src/services/pagosService.js
-import api from "./api";
+import api, { getListaCompleta, getPagina } from "./api";
 
 /**
  * Crear pago por TRANSFERENCIA (uso PACIENTE).
@@ -102,7 +102,32 @@ export const crearPagoConsultorio = async ({ citaId, monto, total }) => {
  * Endpoint: GET pagos/
  */
 export const getPagos = async (params = {}, signal) => {
-  const response = await api.get("pagos/", {
+  return getListaCompleta("pagos/", { params, signal });
+};
+
+/**
+ * Igual que getPagos, pero por páginas para las pantallas de listado:
+ * devuelve { results, next }; la siguiente página se pide pasando `next`.
+ */
+export const getPagosPagina = async (params = {}, { next, signal } = {}) => {
+  return getPagina("pagos/", { params, next, signal });
+};
+
+/**
+ * Resumen de ingresos calculado en el backend (DOCTOR/ADMIN).
+ *
+ * Endpoint: GET pagos/resumen/
+ *
+ * Params (todos opcionales):
+ *  - fecha_desde / fecha_hasta (YYYY-MM-DD)
+ *  - periodo: "dia" | "semana" | "mes"
+ *  - doctor (solo ADMIN), especialidad
+ *
+ * Devuelve totales y agrupaciones por método, estado, especialidad,
+ * periodo y procedimientos por estado de pago.
+ */
+export const getResumenIngresos = async (params = {}, signal) => {
+  const response = await api.get("pagos/resumen/", {
     params,
     signal,
   });
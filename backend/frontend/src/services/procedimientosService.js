@@ -1,5 +1,5 @@
 // src/services/procedimientosService.js
-import api from "./api";
+import api, { getListaCompleta } from "./api";
 
 /**
  * Listar procedimientos clínicos.
@@ -17,12 +17,7 @@ import api from "./api";
  *  getProcedimientos({ paciente: 5 });
  */
 export const getProcedimientos = async (params = {}, signal) => {
-  const response = await api.get("procedimientos/", {
-    params,
-    signal,
-  });
-
-  return response.data;
+  return getListaCompleta("procedimientos/", { params, signal });
 };
 
 /**
@@ -1,5 +1,5 @@
 // src/services/recetasService.js
-import api from "./api";
+import api, { getListaCompleta, getPagina } from "./api";
 
 /**
  * Listar recetas.
@@ -17,12 +17,15 @@ import api from "./api";
  *  getRecetas({ doctor: 3, cita: 42 });
  */
 export const getRecetas = async (params = {}, signal) => {
-  const response = await api.get("recetas/", {
-    params,
-    signal,
-  });
+  return getListaCompleta("recetas/", { params, signal });
+};
 
-  return response.data;
+/**
+ * Igual que getRecetas, pero por páginas para las pantallas de listado:
+ * devuelve { results, next }; la siguiente página se pide pasando `next`.
+ */
+export const getRecetasPagina = async (params = {}, { next, signal } = {}) => {
+  return getPagina("recetas/", { params, next, signal });
 };
 
 /**
@@ -1,5 +1,5 @@
 // src/services/reportesService.js
-import api from "./api";
+import api, { getListaCompleta, getPagina } from "./api";
 
 /**
  * Listar reportes clínicos (ReportePaciente).
@@ -18,12 +18,15 @@ import api from "./api";
  *  getReportes({ doctor: 5, estado: "FINAL" });
  */
 export const getReportes = async (params = {}, signal) => {
-  const response = await api.get("reportes/", {
-    params,
-    signal,
-  });
+  return getListaCompleta("reportes/", { params, signal });
+};
 
-  return response.data;
+/**
+ * Igual que getReportes, pero por páginas para las pantallas de listado:
+ * devuelve { results, next }; la siguiente página se pide pasando `next`.
+ */
+export const getReportesPagina = async (params = {}, { next, signal } = {}) => {
+  return getPagina("reportes/", { params, next, signal });
 };
 
 /**
@@ -129,6 +132,7 @@ export const getReporteUnicoPorCita = async ({ citaId, signal } = {}) => {
  */
 const reportesService = {
   getReportes,
+  getReportesPagina,
   getReportesByPaciente,
   getReporteById,
   crearReporte,
@@ -0,0 +1,130 @@
+# backend/users/authentication.py
+"""
+Autenticación JWT sin query de usuario en cada petición.
+
+`JWTAuthentication` de simplejwt hace un SELECT del usuario por request. Aquí
+el usuario (con su especialidad ya cargada) se guarda en cache por un TTL
+corto, bajo una clave con la versión del usuario, su id y el `role` que
+viaja en el token:
+
+- La versión cambia en cada post_save / post_delete de User (ver
+  users/signals.py), así que editar, desactivar o borrar un usuario
+  invalida su entrada al momento en todos los workers que comparten el
+  cache (CACHES en settings). Con un cache por proceso, en los demás
+  workers a más tardar en AUTH_USER_CACHE_TTL (misma política que
+  CatalogoCacheado).
+- El `role` lo agrega `RefreshTokenConRol` al iniciar sesión y se copia al
+  access token (también en /auth/refresh/). Si ya no coincide con el de la
+  base, el token se rechaza y el usuario vuelve a iniciar sesión con su
+  rol nuevo. Tokens emitidos antes de este claim siguen funcionando.
+
+Solo las lecturas (GET/HEAD/OPTIONS) usan el cache. En POST/PUT/PATCH/DELETE
+el usuario se lee de la base: ahí la vista puede hacer `request.user.save()`
+y una copia de hasta AUTH_USER_CACHE_TTL segundos pisaría cambios más
+recientes (p. ej. que un admin lo haya desactivado).
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .utils.catalogos import CatalogoCacheado
+
+CLAIM_ROLE = "role"
+
+
+class RefreshTokenConRol(RefreshToken):
+    """RefreshToken con el `role` del usuario (se hereda al access token)."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[CLAIM_ROLE] = user.role
+        return token
+
+
+class UsuariosAutenticados(CatalogoCacheado):
+    """
+    Variante de CatalogoCacheado para instancias de User: la versión es por
+    usuario y la entrada además lleva los claims del token en la clave. Se
+    guarda la instancia tal cual (sin ETag): el cache la entrega como copia
+    nueva en cada lectura.
+    """
+
+    def __init__(self, nombre, cargar, ttl=None):
+        super().__init__(nombre, cargar, ttl=ttl, version_por_args=True)
+
+    def _clave_version(self, user_id, *claims):
+        return super()._clave_version(user_id)
+
+    def obtener(self, user_id, *claims):
+        clave = ":".join(
+            ["catalogo", self.nombre, self.version(user_id), str(user_id)]
+            + [str(c) for c in claims]
+        )
+        user = cache.get(clave)
+        if user is None:
+            user = self.cargar(user_id, *claims)
+            cache.set(clave, user, self.ttl)
+        return user
+
+
+def _cargar_usuario(user_id, role):
+    from .models import User
+
+    try:
+        user = User.objects.select_related("especialidad").get(
+            **{api_settings.USER_ID_FIELD: user_id}
+        )
+    except User.DoesNotExist:
+        raise AuthenticationFailed("Usuario no encontrado.", code="user_not_found")
+
+    if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise AuthenticationFailed("El usuario está inactivo.", code="user_inactive")
+
+    if role is not None and user.role != role:
+        raise AuthenticationFailed(
+            "Tu rol cambió; vuelve a iniciar sesión.", code="role_changed"
+        )
+    return user
+
+
+usuarios_autenticados = UsuariosAutenticados(
+    "auth_usuario",
+    _cargar_usuario,
+    ttl=getattr(settings, "AUTH_USER_CACHE_TTL", 30),
+)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication que resuelve el usuario desde `usuarios_autenticados`
+    en las lecturas. DRF crea una instancia por petición, así que el método
+    se puede guardar en `self`.
+    """
+
+    desde_cache = False
+
+    def authenticate(self, request):
+        self.desde_cache = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # La revocación compara contra el hash vigente del password
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("El token no identifica a ningún usuario.")
+
+        role = validated_token.get(CLAIM_ROLE)
+        if not self.desde_cache:
+            return _cargar_usuario(user_id, role)
+        return usuarios_autenticados.obtener(user_id, role)
@@ -0,0 +1,25 @@
+# backend/users/checks.py
+from django.conf import settings
+from django.core.checks import Warning, register
+from django.db import connections
+
+
+@register()
+def cache_compartido(app_configs, **kwargs):
+    """
+    Los caches de catálogos, dashboard y usuario del JWT se invalidan por
+    señales; con LocMemCache la invalidación no sale del proceso que hizo el
+    cambio. Solo se acepta con SQLite (dev local / tests, un proceso).
+    """
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if backend.endswith("LocMemCache") and connections["default"].vendor != "sqlite":
+        return [
+            Warning(
+                "El cache por defecto es LocMemCache (uno por proceso) y la "
+                "base no es SQLite: las invalidaciones no llegan a los demás "
+                "workers.",
+                hint="Define REDIS_URL o usa DatabaseCache (createcachetable).",
+                id="users.W001",
+            )
+        ]
+    return []
@@ -0,0 +1,36 @@
+# backend/users/management/commands/analitica_ocupacion.py
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from users.utils.analitica import calcular_ocupacion
+from users.utils.fechas import parse_fecha
+
+
+class Command(BaseCommand):
+    help = (
+        "Ocupación, cancelaciones, atendidas y anticipación por doctor "
+        "(mismo cálculo que GET /analitica/ocupacion/), en JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", help="YYYY-MM-DD (default: hasta - 89 días)")
+        parser.add_argument("--hasta", help="YYYY-MM-DD (default: hoy)")
+        parser.add_argument(
+            "--doctor", type=int, action="append", dest="doctores", default=None
+        )
+
+    def handle(self, *args, desde=None, hasta=None, doctores=None, **options):
+        fecha_hasta = parse_fecha(hasta) if hasta else timezone.localdate()
+        if fecha_hasta is None:
+            raise CommandError("--hasta inválido (YYYY-MM-DD)")
+        fecha_desde = parse_fecha(desde) if desde else fecha_hasta - timedelta(days=89)
+        if fecha_desde is None:
+            raise CommandError("--desde inválido (YYYY-MM-DD)")
+        if fecha_hasta < fecha_desde:
+            raise CommandError("--hasta no puede ser anterior a --desde")
+
+        resultado = calcular_ocupacion(fecha_desde, fecha_hasta, doctor_ids=doctores)
+        self.stdout.write(json.dumps(resultado, ensure_ascii=False, indent=2))
@@ -0,0 +1,160 @@
+# backend/users/management/commands/bench_analitica.py
+import random
+import statistics
+import time as time_mod
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import User, Especialidad, Cita, Horario
+from users.utils.analitica import calcular_ocupacion
+
+
+def _ocupacion_por_filas(fecha_desde, fecha_hasta):
+    """
+    Referencia ingenua: recorre cada cita y cada día de la ventana en Python
+    (lo que haría un reporte hecho con el ORM fila por fila).
+    """
+    ahora = timezone.now()
+    dias = [
+        fecha_desde + timedelta(days=i)
+        for i in range((fecha_hasta - fecha_desde).days + 1)
+    ]
+    slots = {}
+    for horario in Horario.objects.all():
+        slots[horario.doctor_id] = slots.get(horario.doctor_id, 0) + sum(
+            1 for dia in dias if dia.isoweekday() == horario.dia_semana
+        )
+
+    metricas = {}
+    for cita in Cita.objects.filter(
+        fecha_hora__date__gte=fecha_desde, fecha_hora__date__lte=fecha_hasta
+    ):
+        m = metricas.setdefault(
+            cita.doctor_id, {"citas": 0, "canceladas": 0, "atendidas": 0, "dias": []}
+        )
+        m["citas"] += 1
+        if cita.estado == "X":
+            m["canceladas"] += 1
+        elif cita.atendida and cita.fecha_hora < ahora:
+            m["atendidas"] += 1
+        m["dias"].append(
+            max((cita.fecha_hora - cita.creado_en).total_seconds() / 86400, 0)
+        )
+    for m in metricas.values():
+        m["p50"] = statistics.median(m["dias"]) if m["dias"] else None
+    return slots, metricas
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el motor vectorizado de analítica de ocupación contra un "
+        "recorrido fila por fila, sobre un histórico sintético de varios años. "
+        "Siembra las filas dentro de una transacción que se revierte al final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--anios", type=int, default=3)
+        parser.add_argument("--doctores", type=int, default=20)
+        parser.add_argument("--citas-por-dia", type=int, default=8)
+        parser.add_argument("--repeticiones", type=int, default=3)
+        parser.add_argument("--lote", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._run(**options)
+            transaction.set_rollback(True)
+        self.stdout.write("Datos de benchmark revertidos.")
+
+    def _run(self, anios, doctores, citas_por_dia, repeticiones, lote, **_):
+        rnd = random.Random(42)
+        especialidad, _ = Especialidad.objects.get_or_create(nombre="PODOLOGIA")
+        paciente = User.objects.create_user(
+            "9100000000", "bench12345", nombre="Bench", apellidos="Paciente", edad=30
+        )
+        medicos = [
+            User.objects.create_user(
+                f"91000{i:05d}",
+                "bench12345",
+                nombre="Bench",
+                apellidos=f"Doctor {i}",
+                edad=40,
+                role="PODOLOGO",
+                especialidad=especialidad,
+            )
+            for i in range(1, doctores + 1)
+        ]
+
+        # Lunes a viernes, 8 slots de 30 min (09:00-13:00)
+        Horario.objects.bulk_create(
+            Horario(
+                doctor=medico,
+                especialidad=especialidad,
+                dia_semana=dia,
+                hora_inicio=time(9 + h // 2, 30 * (h % 2)),
+                hora_fin=time(9 + (h + 1) // 2, 30 * ((h + 1) % 2)),
+            )
+            for medico in medicos
+            for dia in range(1, 6)
+            for h in range(8)
+        )
+
+        hasta = timezone.localdate()
+        desde = hasta - timedelta(days=365 * anios - 1)
+        filas = []
+        dia = desde
+        while dia <= hasta:
+            if dia.isoweekday() <= 5:
+                for medico in medicos:
+                    for slot in rnd.sample(range(8), min(citas_por_dia, 8)):
+                        fecha_hora = timezone.make_aware(
+                            datetime.combine(dia, time(9 + slot // 2, 30 * (slot % 2)))
+                        )
+                        filas.append(
+                            (
+                                medico,
+                                fecha_hora,
+                                fecha_hora - timedelta(hours=rnd.randint(1, 24 * 60)),
+                                "X" if rnd.random() < 0.1 else "C",
+                                rnd.random() < 0.8,
+                            )
+                        )
+            dia += timedelta(days=1)
+
+        inicio = time_mod.perf_counter()
+        for offset in range(0, len(filas), lote):
+            creadas = Cita.objects.bulk_create(
+                Cita(
+                    paciente=paciente,
+                    doctor=medico,
+                    especialidad=especialidad,
+                    fecha_hora=fecha_hora,
+                    estado=estado,
+                    atendida=atendida,
+                )
+                for medico, fecha_hora, _, estado, atendida in filas[offset:offset + lote]
+            )
+            # creado_en es auto_now_add: se ajusta después para simular anticipación
+            for cita, fila in zip(creadas, filas[offset:offset + lote]):
+                cita.creado_en = fila[2]
+            Cita.objects.bulk_update(creadas, ["creado_en"], batch_size=lote)
+        self.stdout.write(
+            f"Sembradas {len(filas)} citas ({anios} años, {doctores} doctores) "
+            f"en {time_mod.perf_counter() - inicio:.1f}s"
+        )
+
+        motores = {
+            "vectorizado (numpy/pandas)": lambda: calcular_ocupacion(desde, hasta),
+            "fila por fila (ORM)": lambda: _ocupacion_por_filas(desde, hasta),
+        }
+        for nombre, ejecutar in motores.items():
+            tiempos = []
+            for _ in range(repeticiones):
+                t0 = time_mod.perf_counter()
+                ejecutar()
+                tiempos.append(time_mod.perf_counter() - t0)
+            self.stdout.write(
+                f"{nombre:28s} mediana={statistics.median(tiempos) * 1000:10.1f} ms"
+            )
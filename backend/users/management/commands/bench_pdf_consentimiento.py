@@ -0,0 +1,123 @@
+# backend/users/management/commands/bench_pdf_consentimiento.py
+import random
+import re
+import statistics
+import textwrap
+import time as time_mod
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import mm
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from users.models import User, Especialidad, Cita, Consentimiento
+from users.utils.pdf_consentimiento import build_consentimiento_pdf
+from users.utils.pdf_layout import metricas, partir_lineas
+
+PALABRAS = (
+    "paciente presenta lesión eritematosa descamativa en región plantar con "
+    "evolución crónica prurito intermitente hiperqueratosis onicomicosis "
+    "distrófica total tratamiento tópico sistémico riesgo de irritación "
+    "local dermatitis de contacto infección secundaria cicatrización "
+    "hipertrófica hiperpigmentación postinflamatoria recurrencia dolor "
+    "sangrado mínimo reacción alérgica anestésico electrocoagulación "
+    "crioterapia curetaje biopsia incisional escisional anatomopatológico"
+).split()
+
+_PAGINA = re.compile(rb"/Type /Page\b(?!s)")
+
+
+def _texto(rnd, palabras, por_parrafo=80):
+    bloques = []
+    for inicio in range(0, palabras, por_parrafo):
+        n = min(por_parrafo, palabras - inicio)
+        bloques.append(" ".join(rnd.choice(PALABRAS) for _ in range(n)))
+    return "\n".join(bloques)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide páginas por segundo de build_consentimiento_pdf con diagnósticos "
+        "y riesgos largos, y compara el ajuste de línea por métricas reales "
+        "(pdf_layout.partir_lineas) contra la estimación anterior con textwrap. "
+        "No toca la base de datos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--palabras", type=int, default=3000)
+        parser.add_argument("--repeticiones", type=int, default=20)
+
+    def handle(self, *args, palabras, repeticiones, **options):
+        rnd = random.Random(7)
+        especialidad = Especialidad(nombre="DERMATOLOGIA")
+        cita = Cita(
+            paciente=User(
+                nombre="María Fernanda",
+                apellidos="López Hernández",
+                edad=41,
+                sexo="Femenino",
+                telefono="7550000000",
+            ),
+            doctor=User(nombre="Jorge", apellidos="Ramírez Soto"),
+            especialidad=especialidad,
+            fecha_hora=timezone.make_aware(datetime(2025, 3, 3, 10)),
+        )
+        consentimiento = Consentimiento(
+            cita=cita,
+            diagnostico_principal=_texto(rnd, palabras),
+            procedimiento_propuesto=_texto(rnd, palabras // 10),
+            beneficios=_texto(rnd, palabras // 10),
+            riesgos=_texto(rnd, palabras),
+            alternativas=_texto(rnd, palabras // 10),
+            fecha=datetime(2025, 3, 3).date(),
+            hora=time(10),
+        )
+
+        # --- PDF completo ---
+        tiempos = []
+        paginas = 0
+        for _ in range(repeticiones):
+            t0 = time_mod.perf_counter()
+            pdf = build_consentimiento_pdf(cita, consentimiento)
+            tiempos.append(time_mod.perf_counter() - t0)
+            paginas = len(_PAGINA.findall(pdf))
+        mediana = statistics.median(tiempos)
+        self.stdout.write(
+            f"PDF: {paginas} páginas, mediana {mediana * 1000:.1f} ms "
+            f"-> {paginas / mediana:.1f} páginas/s"
+        )
+
+        # --- Solo ajuste de línea ---
+        ancho_max = letter[0] - 50 * mm
+        texto = consentimiento.diagnostico_principal + "\n" + consentimiento.riesgos
+
+        def estimado():
+            por_linea = max(40, int(ancho_max / (10 * 0.55)))
+            return [
+                linea
+                for parrafo in texto.split("\n")
+                for linea in textwrap.wrap(parrafo, width=por_linea)
+            ]
+
+        def con_metricas():
+            return partir_lineas(texto, metricas("Helvetica", 10), ancho_max)
+
+        for nombre, partir in (("textwrap (estimado)", estimado), ("métricas reales", con_metricas)):
+            tiempos = []
+            for _ in range(repeticiones):
+                t0 = time_mod.perf_counter()
+                lineas = partir()
+                tiempos.append(time_mod.perf_counter() - t0)
+            desbordadas = sum(
+                1 for linea in lineas if stringWidth(linea, "Helvetica", 10) > ancho_max
+            )
+            llenado = statistics.mean(
+                stringWidth(linea, "Helvetica", 10) / ancho_max for linea in lineas
+            )
+            self.stdout.write(
+                f"{nombre:22s} líneas={len(lineas):5d} desbordadas={desbordadas:4d} "
+                f"llenado medio={llenado:.0%} "
+                f"mediana={statistics.median(tiempos) * 1000:7.2f} ms"
+            )
@@ -0,0 +1,107 @@
+# backend/users/management/commands/bench_rango_fechas.py
+import statistics
+import time as time_mod
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import User, Especialidad, Cita
+from users.utils.fechas import filtrar_rango_fechas
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el filtro por rango de fechas de citas: fecha_hora__date "
+        "(función sobre la columna) vs límites aware (usa el índice). "
+        "Siembra las filas dentro de una transacción que se revierte al final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--filas", type=int, default=1_000_000)
+        parser.add_argument("--doctores", type=int, default=50)
+        parser.add_argument("--repeticiones", type=int, default=5)
+        parser.add_argument("--lote", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._run(**options)
+            transaction.set_rollback(True)
+        self.stdout.write("Datos de benchmark revertidos.")
+
+    def _run(self, filas, doctores, repeticiones, lote, **_):
+        especialidad, _ = Especialidad.objects.get_or_create(nombre="PODOLOGIA")
+        paciente = User.objects.create_user(
+            "9000000000", "bench12345", nombre="Bench", apellidos="Paciente", edad=30
+        )
+        medicos = [
+            User.objects.create_user(
+                f"90000{i:05d}",
+                "bench12345",
+                nombre="Bench",
+                apellidos="Doctor",
+                edad=40,
+                role="PODOLOGO",
+                especialidad=especialidad,
+            )
+            for i in range(1, doctores + 1)
+        ]
+
+        base = timezone.make_aware(datetime(2020, 1, 1, 9))
+        inicio = time_mod.perf_counter()
+        for offset in range(0, filas, lote):
+            Cita.objects.bulk_create(
+                Cita(
+                    paciente=paciente,
+                    doctor=medicos[i % doctores],
+                    especialidad=especialidad,
+                    fecha_hora=base + timedelta(minutes=30 * (i // doctores)),
+                )
+                for i in range(offset, min(offset + lote, filas))
+            )
+        self.stdout.write(
+            f"Sembradas {filas} citas en {time_mod.perf_counter() - inicio:.1f}s"
+        )
+
+        # Una semana a mitad del histórico, para un doctor (agenda semanal)
+        ultima = base + timedelta(minutes=30 * (filas // doctores))
+        mitad = timezone.localtime(base + (ultima - base) / 2).date()
+        desde, hasta = mitad, mitad + timedelta(days=6)
+        doctor = medicos[0]
+
+        consultas = {
+            "fecha_hora__date": lambda: Cita.objects.filter(
+                doctor=doctor,
+                fecha_hora__date__gte=desde,
+                fecha_hora__date__lte=hasta,
+            ),
+            "rango aware": lambda: filtrar_rango_fechas(
+                Cita.objects.filter(doctor=doctor),
+                "fecha_hora",
+                desde.isoformat(),
+                hasta.isoformat(),
+            ),
+            "fecha_hora__date (sin doctor)": lambda: Cita.objects.filter(
+                fecha_hora__date__gte=desde,
+                fecha_hora__date__lte=hasta,
+            ),
+            "rango aware (sin doctor)": lambda: filtrar_rango_fechas(
+                Cita.objects.all(),
+                "fecha_hora",
+                desde.isoformat(),
+                hasta.isoformat(),
+            ),
+        }
+
+        for nombre, build in consultas.items():
+            tiempos = []
+            for _ in range(repeticiones):
+                t0 = time_mod.perf_counter()
+                n = len(build().values_list("id", flat=True))
+                tiempos.append(time_mod.perf_counter() - t0)
+            self.stdout.write(
+                f"{nombre:32s} filas={n:6d} "
+                f"mediana={statistics.median(tiempos) * 1000:9.2f} ms"
+            )
+            self.stdout.write("    " + build().explain().replace("\n", "\n    "))
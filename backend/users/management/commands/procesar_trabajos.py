@@ -0,0 +1,179 @@
+# backend/users/management/commands/procesar_trabajos.py
+import multiprocessing
+import time as time_mod
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from users.utils.trabajos import (
+    LATIDO_VENCIDO,
+    Latido,
+    ejecutar_trabajo,
+    marcar_error,
+    reclamar_siguiente,
+    reencolar_huerfanos,
+)
+
+# Cada cuánto se buscan EN_PROCESO sin latido (p. ej. de otro worker que
+# murió) sin esperar a reiniciar este
+REVISION_HUERFANOS_SEGUNDOS = min(60.0, LATIDO_VENCIDO.total_seconds())
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker de la cola de documentos (TrabajoDocumento): toma trabajos "
+        "PENDIENTE y los ejecuta en un pool de procesos, fuera de los workers "
+        "de gunicorn. Cada trabajo deja una línea JSON en el logger "
+        "`users.trabajos` con espera en cola y duración."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--procesos",
+            type=int,
+            default=2,
+            help="Tamaño del pool; 0 ejecuta en este mismo proceso (depuración).",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=2.0,
+            help="Segundos entre sondeos cuando la cola está vacía.",
+        )
+        parser.add_argument(
+            "--una-vez",
+            action="store_true",
+            help="Vacía la cola y termina (cron / pruebas).",
+        )
+
+    def handle(self, *args, procesos, intervalo, una_vez, **options):
+        inicio = time_mod.perf_counter()
+        # Contadores en vez de guardar cada resultado: en modo daemon el
+        # worker vive indefinidamente
+        self.trabajos = 0
+        self.documentos = 0
+        self._ultima_revision = None
+        self._revisar_huerfanos()
+
+        if procesos <= 0:
+            self._en_linea(intervalo, una_vez)
+        else:
+            self._con_pool(procesos, intervalo, una_vez)
+
+        transcurrido = time_mod.perf_counter() - inicio
+        self.stdout.write(
+            f"{self.trabajos} trabajos ({self.documentos} documentos) en "
+            f"{transcurrido:.2f}s -> "
+            f"{self.trabajos / transcurrido if transcurrido else 0:.2f} trabajos/s"
+        )
+
+    def _revisar_huerfanos(self):
+        ahora = time_mod.monotonic()
+        if (
+            self._ultima_revision is not None
+            and ahora - self._ultima_revision < REVISION_HUERFANOS_SEGUNDOS
+        ):
+            return
+        self._ultima_revision = ahora
+        reencolados = reencolar_huerfanos()
+        if reencolados:
+            self.stdout.write(f"Reencolados {reencolados} trabajos huérfanos.")
+
+    def _en_linea(self, intervalo, una_vez):
+        while True:
+            self._revisar_huerfanos()
+            trabajo_id = reclamar_siguiente()
+            if trabajo_id is None:
+                if una_vez:
+                    return
+                time_mod.sleep(intervalo)
+                continue
+            self._reportar(ejecutar_trabajo(trabajo_id))
+
+    def _con_pool(self, procesos, intervalo, una_vez):
+        # spawn: cada proceso abre sus propias conexiones a la base en vez de
+        # heredar (y compartir) el socket del padre como haría fork.
+        connections.close_all()
+        en_curso = {}
+        # El padre late por los trabajos del pool: mientras este proceso
+        # viva, ningún otro worker los reclama
+        latido = Latido()
+        pool = self._nuevo_pool(procesos)
+        try:
+            while True:
+                self._revisar_huerfanos()
+                latido(en_curso.values())
+
+                roto = False
+                while not roto and len(en_curso) < procesos:
+                    trabajo_id = reclamar_siguiente()
+                    if trabajo_id is None:
+                        break
+                    try:
+                        futuro = pool.submit(ejecutar_trabajo, trabajo_id)
+                    except BrokenProcessPool as exc:
+                        self._fallido(trabajo_id, exc)
+                        roto = True
+                    else:
+                        en_curso[futuro] = trabajo_id
+                if roto:
+                    pool = self._reconstruir(pool, en_curso, procesos)
+                    continue
+
+                if not en_curso:
+                    if una_vez:
+                        return
+                    time_mod.sleep(intervalo)
+                    continue
+
+                hechos, _ = wait(en_curso, timeout=intervalo, return_when=FIRST_COMPLETED)
+                for futuro in hechos:
+                    trabajo_id = en_curso.pop(futuro)
+                    try:
+                        self._reportar(futuro.result())
+                    except Exception as exc:
+                        # El proceso murió antes de registrar el resultado
+                        self._fallido(trabajo_id, exc)
+                        roto = roto or isinstance(exc, BrokenProcessPool)
+                if roto:
+                    pool = self._reconstruir(pool, en_curso, procesos)
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def _nuevo_pool(procesos):
+        return ProcessPoolExecutor(
+            max_workers=procesos,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        )
+
+    def _reconstruir(self, pool, en_curso, procesos):
+        """
+        Un proceso hijo murió (OOM, segfault) y el pool ya no acepta
+        trabajos: los que seguían en él fallan y se abre un pool nuevo en
+        lugar de tumbar el worker.
+        """
+        for trabajo_id in en_curso.values():
+            self._fallido(trabajo_id, BrokenProcessPool("El pool de procesos se rompió"))
+        en_curso.clear()
+        pool.shutdown(wait=False, cancel_futures=True)
+        self.stderr.write("Pool de procesos roto; se crea uno nuevo.")
+        return self._nuevo_pool(procesos)
+
+    def _fallido(self, trabajo_id, exc):
+        marcar_error(trabajo_id, f"{type(exc).__name__}: {exc}")
+        self.stderr.write(f"Trabajo {trabajo_id}: {exc}")
+
+    def _reportar(self, resultado):
+        self.trabajos += 1
+        self.documentos += resultado["documentos"]
+        self.stdout.write(
+            f"Trabajo {resultado['trabajo']} {resultado['estado']}: "
+            f"{resultado['documentos']} documentos, "
+            f"espera {resultado['espera_ms']} ms, "
+            f"duración {resultado['duracion_ms']} ms"
+        )
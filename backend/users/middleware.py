@@ -0,0 +1,164 @@
+# backend/users/middleware.py
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger("users.sql")
+
+
+class _RegistroSQL:
+    """execute_wrapper que acumula conteo, tiempo total y la query más lenta."""
+
+    def __init__(self, guardar_sql):
+        self.guardar_sql = guardar_sql
+        self.total = 0
+        self.duracion = 0.0
+        self.mas_lenta = (0.0, "")
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.total += 1
+            self.duracion += duracion
+            if duracion >= self.mas_lenta[0]:
+                self.mas_lenta = (duracion, sql)
+            if self.guardar_sql:
+                self.statements.append((duracion, sql))
+
+
+class _StreamMedido:
+    """
+    Envuelve el cuerpo de una respuesta streaming y cierra la medición al
+    agotarlo o cuando el servidor cierra la respuesta (cliente desconectado,
+    HEAD). Django registra `close()` en los closers de la respuesta.
+    """
+
+    def __init__(self, contenido, cerrar):
+        self.contenido = iter(contenido)
+        self.cerrar = cerrar
+        self.abierto = True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.contenido)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        if self.abierto:
+            self.abierto = False
+            self.cerrar()
+
+
+class SQLInstrumentationMiddleware:
+    """
+    Mide por request: número de queries, tiempo total en SQL y la query más
+    lenta, sin depender de DEBUG.
+
+    - Agrega `Server-Timing: db;dur=..;desc="N queries", db-slowest;dur=..`
+    - Emite una línea de log estructurada (JSON) en el logger `users.sql`
+      con nivel DEBUG (SQL_LOG_LEVEL=DEBUG para verla).
+    - Si el url_name tiene presupuesto en settings.SQL_QUERY_BUDGETS
+      (p. ej. {"citas-list-create": 10}) y se excede, loguea un warning con
+      las sentencias ejecutadas.
+
+    En StreamingHttpResponse / FileResponse las queries siguen ocurriendo
+    mientras se envía el cuerpo (p. ej. los lotes de iterar_keyset en las
+    exportaciones). Ahí el conteo se cierra al agotar o cerrar el stream y
+    no va en Server-Timing, porque los headers ya se enviaron.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        budgets = getattr(settings, "SQL_QUERY_BUDGETS", {})
+        registro = _RegistroSQL(guardar_sql=bool(budgets))
+        inicio = time.perf_counter()
+
+        wrappers = [conn.execute_wrapper(registro) for conn in connections.all()]
+        for wrapper in wrappers:
+            wrapper.__enter__()
+
+        def cerrar():
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+            self._registrar(request, response, registro, inicio, budgets)
+
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+            raise
+
+        if response.streaming and not response.is_async:
+            response.streaming_content = _StreamMedido(
+                response.streaming_content, cerrar
+            )
+            return response
+
+        cerrar()
+        total_ms = (time.perf_counter() - inicio) * 1000
+        response["Server-Timing"] = (
+            f'db;dur={registro.duracion * 1000:.1f};desc="{registro.total} queries", '
+            f"db-slowest;dur={registro.mas_lenta[0] * 1000:.1f}, "
+            f"app;dur={total_ms:.1f}"
+        )
+        return response
+
+    @staticmethod
+    def _registrar(request, response, registro, inicio, budgets):
+        max_chars = getattr(settings, "SQL_LOG_MAX_CHARS", 500)
+        total_ms = (time.perf_counter() - inicio) * 1000
+        match = getattr(request, "resolver_match", None)
+        url_name = match.url_name if match else None
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                json.dumps(
+                    {
+                        "evento": "sql_request",
+                        "metodo": request.method,
+                        "ruta": request.path,
+                        "url_name": url_name,
+                        "status": response.status_code,
+                        "queries": registro.total,
+                        "sql_ms": round(registro.duracion * 1000, 2),
+                        "total_ms": round(total_ms, 2),
+                        "slowest_ms": round(registro.mas_lenta[0] * 1000, 2),
+                        "slowest_sql": registro.mas_lenta[1][:max_chars],
+                    },
+                    ensure_ascii=False,
+                )
+            )
+
+        presupuesto = budgets.get(url_name)
+        if presupuesto is not None and registro.total > presupuesto:
+            logger.warning(
+                json.dumps(
+                    {
+                        "evento": "sql_budget_excedido",
+                        "url_name": url_name,
+                        "ruta": request.path,
+                        "presupuesto": presupuesto,
+                        "queries": registro.total,
+                        "sql": [
+                            {"ms": round(d * 1000, 2), "sql": sql[:max_chars]}
+                            for d, sql in registro.statements
+                        ],
+                    },
+                    ensure_ascii=False,
+                )
+            )
@@ -1,4 +1,8 @@
+import os
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from django.core.files.storage import FileSystemStorage
 from django.db import models
 from django.core.exceptions import ValidationError
 from datetime import timedelta
@@ -59,6 +63,15 @@ class AuditMixin(models.Model):
     class Meta:
         abstract = True
 
+    def save(self, *args, **kwargs):
+        # auto_now solo se escribe si va en update_fields; sin esto un
+        # save(update_fields=[...]) dejaría actualizado_en (y los ETag que
+        # salen de él) sin cambiar.
+        update_fields = kwargs.get("update_fields")
+        if update_fields and "actualizado_en" not in update_fields:
+            kwargs["update_fields"] = [*update_fields, "actualizado_en"]
+        super().save(*args, **kwargs)
+
 
 # =========================
 #  User y catálogos
@@ -181,6 +194,13 @@ class Horario(models.Model):
 
     class Meta:
         unique_together = ("doctor", "dia_semana", "hora_inicio")
+        indexes = [
+            # Disponibilidad y alta de citas: horarios de una especialidad por día
+            models.Index(
+                fields=["especialidad", "dia_semana"],
+                name="horario_esp_dia_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.doctor.nombre} - {dict(self.DIAS_SEMANA)[self.dia_semana]} {self.hora_inicio} - {self.hora_fin}"
@@ -245,6 +265,35 @@ class Cita(AuditMixin, models.Model):
     class Meta:
         indexes = [
             models.Index(fields=["fecha_hora"]),
+            # Agenda del doctor / historial del paciente ordenados por fecha
+            models.Index(
+                fields=["doctor", "fecha_hora"],
+                name="cita_doctor_fecha_idx",
+            ),
+            models.Index(
+                fields=["paciente", "fecha_hora"],
+                name="cita_paciente_fecha_idx",
+            ),
+            # Subsecuentes activas / cita inicial de un tratamiento
+            models.Index(
+                fields=["tratamiento", "tipo", "estado"],
+                name="cita_trat_tipo_estado_idx",
+            ),
+        ]
+        constraints = [
+            # Un doctor no puede tener dos citas activas en el mismo slot.
+            # Las canceladas proyectan NULL y no cuentan para la unicidad.
+            # Se usa expresión (y no `condition`) porque MySQL no soporta
+            # índices parciales pero sí índices funcionales (8.0.13+).
+            models.UniqueConstraint(
+                models.F("doctor"),
+                models.Case(
+                    models.When(estado="X", then=models.Value(None)),
+                    default=models.F("fecha_hora"),
+                    output_field=models.DateTimeField(),
+                ),
+                name="unique_cita_doctor_slot_activo",
+            )
         ]
 
     def __str__(self):
@@ -267,23 +316,32 @@ class Cita(AuditMixin, models.Model):
 
         return False
 
-    def actualizar_atendida(self):
-        """
-        Recalcula el flag `atendida` en función de:
-        - Si existe al menos un reporte clínico en estado FINAL para esta cita.
-        - Si existe una receta asociada a esta cita.
-        Por diseño clínico estricto, consideramos "atendida" cuando hay
-        consulta (reporte FINAL) + receta.
+    def actualizar_atendida(self, usuario=None, reporte_final=None, receta=None):
         """
-        has_reporte_final = self.reportes.filter(estado="FINAL").exists()
-        has_receta = hasattr(self, "receta") and self.receta is not None
+        Recalcula el flag `atendida`: consulta (reporte FINAL) + receta.
 
-        nueva_val = has_reporte_final and has_receta
+        Quien acaba de escribir o borrar el reporte o la receta pasa la
+        mitad que ya conoce (`reporte_final` / `receta`). Como ambos son
+        únicos por cita (constraint y OneToOne), esa fila decide su mitad:
+        solo se consulta la otra, y nada si la conocida ya es False.
+        """
+        if reporte_final is False or receta is False:
+            nueva_val = False
+        else:
+            if reporte_final is None:
+                reporte_final = self.reportes.filter(estado="FINAL").exists()
+            if reporte_final and receta is None:
+                receta = Receta.objects.filter(cita_id=self.pk).exists()
+            nueva_val = bool(reporte_final and receta)
 
         if self.atendida != nueva_val:
             self.atendida = nueva_val
             # actualizado_en viene de AuditMixin
-            self.save(update_fields=["atendida", "actualizado_en"])
+            campos = ["atendida", "actualizado_en"]
+            if usuario is not None:
+                self.actualizado_por = usuario
+                campos.append("actualizado_por")
+            self.save(update_fields=campos)
 
 
 class Pago(AuditMixin, models.Model):
@@ -323,11 +381,25 @@ class Pago(AuditMixin, models.Model):
         null=True,
         blank=True,
     )
+    comprobante_miniatura = models.ImageField(
+        upload_to="users/comprobantes/miniaturas/",
+        null=True,
+        blank=True,
+    )
 
     revertido = models.BooleanField(default=False)
     motivo_reverso = models.TextField(blank=True)
     fecha_reverso = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Chequeo de pago duplicado por cita/método al registrar pagos
+            models.Index(
+                fields=["cita", "metodo_pago", "estado_pago", "revertido"],
+                name="pago_cita_metodo_estado_idx",
+            ),
+        ]
+
     def saldo_pendiente(self):
         return self.total - self.pagado
 
@@ -423,18 +495,21 @@ class Tratamiento(AuditMixin, models.Model):
 
         from django.utils import timezone
 
-        ultima_cita_atendida = None
-        ultima_cita = None
-
-        if hasattr(self, "citas_tratamiento"):
+        if hasattr(self, "ultima_atendida_fecha"):
+            # Fechas ya anotadas en el queryset (ver utils/dashboard.py)
+            ultima_atendida_fecha = self.ultima_atendida_fecha
+            ultima_cita_fecha = self.ultima_cita_fecha
+        else:
             qs = self.citas_tratamiento.order_by("-fecha_hora")
-            ultima_cita_atendida = qs.filter(atendida=True).first()
-            ultima_cita = qs.first()
+            ultima_atendida_fecha = (
+                qs.filter(atendida=True).values_list("fecha_hora", flat=True).first()
+            )
+            ultima_cita_fecha = qs.values_list("fecha_hora", flat=True).first()
 
-        if ultima_cita_atendida:
-            base_fecha = ultima_cita_atendida.fecha_hora
-        elif ultima_cita:
-            base_fecha = ultima_cita.fecha_hora
+        if ultima_atendida_fecha:
+            base_fecha = ultima_atendida_fecha
+        elif ultima_cita_fecha:
+            base_fecha = ultima_cita_fecha
         else:
             base_fecha = self.fecha_inicio or timezone.now()
 
@@ -608,3 +683,104 @@ class RecetaMedicamento(models.Model):
 
     def __str__(self):
         return f"{self.nombre} ({self.receta_id})"
+
+
+# =========================
+#  Trabajos de documentos en segundo plano
+# =========================
+
+class TrabajosStorage(FileSystemStorage):
+    """
+    Disco local en settings.DOCUMENTOS_TRABAJOS_DIR, fuera de MEDIA_ROOT (no
+    se sirve como media; se descarga por la API con permisos). La ruta se
+    lee en cada uso para respetar cambios de settings.
+    """
+
+    @property
+    def base_location(self):
+        return settings.DOCUMENTOS_TRABAJOS_DIR
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+
+def storage_trabajos():
+    """
+    Storage de los archivos generados por el worker. El worker y la web
+    pueden correr en hosts distintos, así que con Cloudinary configurado se
+    usa su storage de archivos "raw" (un ZIP no es imagen); sin él, disco
+    local (un solo host o volumen compartido).
+    """
+    if getattr(settings, "USE_CLOUDINARY", False):
+        from cloudinary_storage.storage import RawMediaCloudinaryStorage
+
+        return RawMediaCloudinaryStorage()
+    return TrabajosStorage()
+
+
+class TrabajoDocumento(AuditMixin, models.Model):
+    """
+    Cola en base de datos para documentos pesados (p. ej. ZIP de
+    consentimientos). La API solo encola; el worker
+    `manage.py procesar_trabajos` los ejecuta en un pool de procesos
+    (ver users/utils/trabajos.py). creado_por = quien lo solicitó.
+    """
+
+    TIPOS = [
+        ("CONSENTIMIENTOS_ZIP", "Consentimientos en ZIP"),
+    ]
+    ESTADOS = [
+        ("PENDIENTE", "Pendiente"),
+        ("EN_PROCESO", "En proceso"),
+        ("COMPLETADO", "Completado"),
+        ("ERROR", "Error"),
+    ]
+
+    tipo = models.CharField(max_length=30, choices=TIPOS)
+    estado = models.CharField(max_length=15, choices=ESTADOS, default="PENDIENTE")
+    parametros = models.JSONField(default=dict, blank=True)
+
+    # Resultado del trabajo, guardado por el worker (ver storage_trabajos)
+    archivo = models.FileField(
+        upload_to="trabajos/",
+        storage=storage_trabajos,
+        max_length=255,
+        blank=True,
+    )
+    documentos = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+
+    # creado_en (encolado) -> iniciado_en = espera en cola;
+    # iniciado_en -> terminado_en = duración
+    iniciado_en = models.DateTimeField(null=True, blank=True)
+    terminado_en = models.DateTimeField(null=True, blank=True)
+    # Lo renueva el worker mientras el trabajo corre; sin latido reciente
+    # el trabajo se considera huérfano (ver reencolar_huerfanos)
+    latido_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-creado_en"]
+        indexes = [
+            # El worker toma el PENDIENTE más antiguo
+            models.Index(
+                fields=["estado", "creado_en"],
+                name="trabajo_estado_creado_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Trabajo {self.id} - {self.tipo} ({self.estado})"
+
+    @property
+    def espera(self):
+        if self.creado_en and self.iniciado_en:
+            return self.iniciado_en - self.creado_en
+        return None
+
+    @property
+    def duracion(self):
+        if self.iniciado_en and self.terminado_en:
+            return self.terminado_en - self.iniciado_en
+        return None
@@ -0,0 +1,213 @@
+# backend/users/pagination.py
+import base64
+import json
+from collections import OrderedDict
+from functools import reduce
+from operator import or_
+
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) sobre el orden propio de cada endpoint.
+
+    La vista declara `keyset_ordering`, p. ej. ("fecha_hora", "id") o
+    ("-fecha", "-id"); el último campo debe ser único para desempatar.
+    El cursor guarda los valores de esos campos en la última fila de la página
+    y la siguiente página se pide con `WHERE (campos) > (valores)`, así que el
+    costo no crece con la profundidad (no hay OFFSET).
+
+    Parámetros:
+      - ?cursor=<opaco>    siguiente página (viene en `next`)
+      - ?page_size=<n>     tamaño de página (máx. `max_page_size`)
+      - ?paginar=0         desactiva la paginación: respuesta como lista plana
+                           (compatibilidad con clientes anteriores)
+
+    Respuesta paginada:
+      { "results": [...], "next": <url|null>, "page_size": n }
+    """
+
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    opt_out_query_param = "paginar"
+    default_ordering = ("-id",)
+
+    def consulta_pagina(self, queryset, request, view=None):
+        """
+        Queryset (sin evaluar) de la página pedida más una fila extra, o None
+        si el cliente desactivó la paginación. Lo usan paginate_queryset y el
+        ETag de ListadoCondicionalMixin, que solo mira las filas de la página.
+        """
+        if request.query_params.get(self.opt_out_query_param, "").lower() in (
+            "0",
+            "false",
+            "no",
+        ):
+            return None
+
+        self.request = request
+        self.ordering = tuple(getattr(view, "keyset_ordering", self.default_ordering))
+        self.page_size = self.get_page_size(request)
+        model = queryset.model
+
+        queryset = queryset.order_by(*self._order_by(model))
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            valores = self._decode_cursor(cursor, model)
+            queryset = queryset.filter(self._after(model, valores))
+
+        # Una fila extra para saber si hay página siguiente
+        return queryset[: self.page_size + 1]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        pagina = self.consulta_pagina(queryset, request, view)
+        if pagina is None:
+            return None
+
+        rows = list(pagina)
+        self.has_next = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        self.last_row = rows[-1] if rows else None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("results", data),
+                    ("next", self.get_next_link()),
+                    ("page_size", self.page_size),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "results": schema,
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "page_size": {"type": "integer"},
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.has_next or self.last_row is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            self._encode_cursor(self.last_row),
+        )
+
+    # -------------------------
+    #  Helpers de keyset
+    # -------------------------
+
+    def _campos(self):
+        for campo in self.ordering:
+            yield campo.lstrip("-"), campo.startswith("-")
+
+    def _order_by(self, model):
+        orden = []
+        for nombre, desc in self._campos():
+            # Nulos siempre al final para que el keyset sea consistente entre
+            # motores; solo en columnas nullables para no estorbar al índice.
+            nulls_last = True if model._meta.get_field(nombre).null else None
+            expr = F(nombre)
+            expr = expr.desc(nulls_last=nulls_last) if desc else expr.asc(nulls_last=nulls_last)
+            orden.append(expr)
+        return orden
+
+    def _after(self, model, valores):
+        """
+        Condición lexicográfica "fila > cursor" respetando la dirección de
+        cada campo: (a > va) OR (a = va AND b > vb) OR ...
+        """
+        ramas = []
+        iguales = Q()
+        for (nombre, desc), valor in zip(self._campos(), valores):
+            if valor is None:
+                # Con nulos al final, nada no-nulo va después de un nulo
+                iguales &= Q(**{f"{nombre}__isnull": True})
+                continue
+
+            lookup = "lt" if desc else "gt"
+            despues = Q(**{f"{nombre}__{lookup}": valor})
+            if model._meta.get_field(nombre).null:
+                despues |= Q(**{f"{nombre}__isnull": True})
+            ramas.append(iguales & despues)
+            iguales &= Q(**{nombre: valor})
+
+        if not ramas:
+            return Q(pk__in=[])
+        return reduce(or_, ramas)
+
+    def _encode_cursor(self, row):
+        valores = []
+        for nombre, _desc in self._campos():
+            valor = getattr(row, row._meta.get_field(nombre).attname)
+            valores.append(valor.isoformat() if hasattr(valor, "isoformat") else valor)
+        payload = json.dumps(valores, separators=(",", ":"), default=str)
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def _decode_cursor(self, cursor, model):
+        try:
+            valores = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            if not isinstance(valores, list) or len(valores) != len(self.ordering):
+                raise ValueError
+            return [
+                None if valor is None else model._meta.get_field(nombre).to_python(valor)
+                for (nombre, _desc), valor in zip(self._campos(), valores)
+            ]
+        except Exception:
+            raise NotFound("Cursor inválido.")
+
+
+def iterar_keyset(queryset, ordering, campos, tamano_lote=2000):
+    """
+    Recorre `queryset` completo como tuplas de `campos` en lotes de
+    `tamano_lote` filas, avanzando por keyset sobre `ordering` (mismas reglas
+    que KeysetPagination). Cada lote es una query acotada, así que la memoria
+    no crece con el total de filas aunque el driver (mysqlclient) cargue en
+    memoria el resultado completo de cada query.
+    """
+    paginador = KeysetPagination()
+    paginador.ordering = tuple(ordering)
+    model = queryset.model
+    claves = [nombre for nombre, _desc in paginador._campos()]
+
+    queryset = (
+        queryset.prefetch_related(None)
+        .order_by(*paginador._order_by(model))
+        .values_list(*campos, *claves)
+    )
+    n = len(campos)
+    valores = None
+    while True:
+        lote = queryset if valores is None else queryset.filter(
+            paginador._after(model, valores)
+        )
+        filas = list(lote[:tamano_lote])
+        for fila in filas:
+            yield fila[:n]
+        if len(filas) < tamano_lote:
+            return
+        valores = list(filas[-1][n:])
@@ -1,6 +1,22 @@
+from decimal import Decimal
+from functools import partial
+
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth import authenticate, get_user_model
+from django.db import transaction
+from django.db.models import (
+    Count,
+    DecimalField,
+    Exists,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from django.urls import reverse
 from django.utils import timezone
 
 from .models import(
@@ -15,7 +31,12 @@ from .models import(
     Receta,
     RecetaMedicamento,
     ProcedimientoConsulta,
+    TrabajoDocumento,
 )
+from .utils.dashboard import dashboard_paciente
+from .utils.firmas import normalizar_firma
+from .utils.horarios import buscar_traslapes
+from .utils.transiciones import ACCIONES, MAX_CITAS_TRANSICION
 
 # Obtenemos el modelo de usuario actual (users_user en tu DB)
 UserModel = get_user_model()
@@ -294,6 +315,36 @@ class HorarioSerializer(serializers.ModelSerializer):
         }
 
 
+class HorarioBloqueSerializer(serializers.Serializer):
+    dia_semana = serializers.ChoiceField(choices=Horario.DIAS_SEMANA)
+    hora_inicio = serializers.TimeField()
+    hora_fin = serializers.TimeField()
+
+    def validate(self, data):
+        if data["hora_inicio"] >= data["hora_fin"]:
+            raise serializers.ValidationError(
+                "La hora de fin debe ser posterior a la de inicio."
+            )
+        return data
+
+
+class HorarioSemanaSerializer(serializers.Serializer):
+    """Semana completa de un doctor: reemplaza todos sus horarios."""
+
+    horarios = HorarioBloqueSerializer(many=True, allow_empty=True)
+
+    def validate_horarios(self, bloques):
+        dias = dict(Horario.DIAS_SEMANA)
+        errores = [
+            f"{dias[a['dia_semana']]}: {a['hora_inicio']:%H:%M}-{a['hora_fin']:%H:%M} "
+            f"se traslapa con {b['hora_inicio']:%H:%M}-{b['hora_fin']:%H:%M}."
+            for a, b in buscar_traslapes(bloques)
+        ]
+        if errores:
+            raise serializers.ValidationError(errores)
+        return bloques
+
+
 class PacienteSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -309,11 +360,91 @@ class PacienteSerializer(serializers.ModelSerializer):
         ]
 
 
+# =========================
+#  Proyección de campos / formato normalizado
+# =========================
+
+class CamposDinamicosMixin:
+    """
+    Permite recortar y normalizar la salida de un ModelSerializer:
+
+    - fields=[...]      proyección (sparse fieldset): solo esos campos.
+    - normalizado=True  las relaciones de `relaciones_normalizables` se
+                        emiten con la misma clave pero como id (leído de
+                        `<campo>_id`, sin query) en vez de objeto anidado,
+                        p. ej. "doctor": 5; la vista manda los objetos una
+                        sola vez en `included`.
+
+    Los campos descartados ni siquiera se evalúan, así que también se ahorra
+    el trabajo (y queries) de los SerializerMethodField que no se piden.
+    """
+
+    relaciones_normalizables = ()
+
+    def __init__(self, *args, **kwargs):
+        campos = kwargs.pop("fields", None)
+        self.normalizado = kwargs.pop("normalizado", False)
+        super().__init__(*args, **kwargs)
+
+        if campos is not None:
+            for nombre in set(self.fields) - set(campos):
+                self.fields.pop(nombre)
+
+        if self.normalizado:
+            for nombre in self.relaciones_normalizables:
+                if nombre in self.fields:
+                    self.fields[nombre] = serializers.IntegerField(
+                        source=f"{nombre}_id",
+                        read_only=True,
+                    )
+
+
+def construir_included(objetos, campos=None):
+    """
+    Mapas `included` (por id) para una página de Cita o Pago serializada en
+    formato normalizado. Usa solo relaciones ya cargadas por select_related /
+    prefetch, por lo que no agrega queries.
+    """
+    pacientes, doctores, especialidades, citas = {}, {}, {}, {}
+
+    def registrar_cita(cita):
+        pacientes[cita.paciente_id] = cita.paciente
+        doctores[cita.doctor_id] = cita.doctor
+        especialidades[cita.especialidad_id] = cita.especialidad
+
+    for obj in objetos:
+        if isinstance(obj, Cita):
+            if campos is None or {"paciente", "doctor", "especialidad"} & set(campos):
+                registrar_cita(obj)
+            if campos is None or "pagos" in campos:
+                for pago in obj.pagos.all():
+                    pacientes[pago.paciente_id] = pago.paciente
+        elif isinstance(obj, Pago):
+            pacientes[obj.paciente_id] = obj.paciente
+            citas[obj.cita_id] = obj.cita
+            registrar_cita(obj.cita)
+
+    def mapa(serializer_class, instancias, **kwargs):
+        return {
+            str(pk): serializer_class(instancia, **kwargs).data
+            for pk, instancia in instancias.items()
+        }
+
+    included = {
+        "pacientes": mapa(PacienteSerializer, pacientes),
+        "doctores": mapa(DoctorSerializer, doctores),
+        "especialidades": mapa(EspecialidadSerializer, especialidades),
+    }
+    if citas:
+        included["citas"] = mapa(PagoCitaSerializer, citas, normalizado=True)
+    return included
+
+
 # =========================
 #  Pagos / Citas / Tratamientos / Procedimientos
 # =========================
 
-class PagoCitaSerializer(serializers.ModelSerializer):
+class PagoCitaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     paciente = PacienteSerializer(read_only=True)
     doctor = DoctorSerializer(read_only=True)
     especialidad = EspecialidadSerializer(read_only=True)
@@ -336,8 +467,10 @@ class PagoCitaSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = fields
 
+    relaciones_normalizables = ("paciente", "doctor", "especialidad")
 
-class PagoSerializer(serializers.ModelSerializer):
+
+class PagoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     paciente = PacienteSerializer(read_only=True)
     cita = PagoCitaSerializer(read_only=True)
     comprobante = serializers.ImageField(
@@ -365,6 +498,7 @@ class PagoSerializer(serializers.ModelSerializer):
             "total",
             "metodo_pago",
             "estado_pago",
+            "comprobante_miniatura",
             "revertido",
             "motivo_reverso",
             "fecha_reverso",
@@ -374,6 +508,8 @@ class PagoSerializer(serializers.ModelSerializer):
             "actualizado_por",
         ]
 
+    relaciones_normalizables = ("paciente", "cita")
+
 
 class ProcedimientoConsultaSerializer(serializers.ModelSerializer):
     paciente = PacienteSerializer(read_only=True)
@@ -421,7 +557,19 @@ class TratamientoLiteSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
-class CitaSerializer(serializers.ModelSerializer):
+class TratamientoDashboardSerializer(TratamientoLiteSerializer):
+    """Tratamiento activo del dashboard del paciente, con la próxima cita sugerida."""
+
+    doctor = DoctorSerializer(read_only=True)
+    # Tratamiento.proxima_cita() usa las fechas anotadas si vienen en el queryset
+    proxima_cita = serializers.DateTimeField(read_only=True)
+
+    class Meta(TratamientoLiteSerializer.Meta):
+        fields = TratamientoLiteSerializer.Meta.fields + ("doctor", "proxima_cita")
+        read_only_fields = fields
+
+
+class CitaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     doctor = DoctorSerializer(read_only=True)
     especialidad = EspecialidadSerializer(read_only=True)
     # Texto legible: "Pendiente", "Confirmada", "Cancelada"
@@ -477,17 +625,56 @@ class CitaSerializer(serializers.ModelSerializer):
             "paciente_puede_cancelar",
         )
 
-    def get_pagos(self, obj):
-        pagos = obj.pagos.select_related(
+    relaciones_normalizables = ("paciente", "doctor", "especialidad")
+
+    @staticmethod
+    def optimizar_queryset(queryset, campos=None, prefetch=True):
+        """
+        Carga todo lo que este serializer lee con un número fijo de queries
+        (citas + pagos + procedimientos), sin importar cuántas filas haya.
+        Con una proyección (`campos`) se omiten los prefetch que no se usan.
+        Con prefetch=False solo aplica select_related; los prefetch se cargan
+        después con prefetch_related_objects(..., *CitaSerializer.prefetches()).
+
+        Los pagos se prefetchean por la FK inversa, así que `pago.cita` queda
+        apuntando a la misma instancia de Cita (con paciente/doctor/especialidad
+        ya cargados) y PagoCitaSerializer no dispara queries extra.
+        """
+        queryset = queryset.select_related(
             "paciente",
-            "cita",
-            "cita__doctor",
-            "cita__especialidad",
+            "doctor",
+            "especialidad",
+            "tratamiento",
         )
+        if prefetch:
+            queryset = queryset.prefetch_related(*CitaSerializer.prefetches(campos))
+        return queryset
+
+    @staticmethod
+    def prefetches(campos=None):
+        lookups = []
+        if campos is None or "pagos" in campos:
+            lookups.append(
+                Prefetch("pagos", queryset=Pago.objects.select_related("paciente"))
+            )
+        if campos is None or "procedimientos" in campos:
+            lookups.append(
+                Prefetch(
+                    "procedimientos",
+                    queryset=ProcedimientoConsulta.objects.select_related(
+                        "paciente", "doctor"
+                    ),
+                )
+            )
+        return lookups
+
+    def get_pagos(self, obj):
+        # .all() respeta el prefetch de optimizar_queryset()
         return PagoSerializer(
-            pagos,
+            obj.pagos.all(),
             many=True,
             context=self.context,
+            normalizado=self.normalizado,
         ).data
 
     # 👇 NUEVO
@@ -555,6 +742,131 @@ class CitaSerializer(serializers.ModelSerializer):
 
 
 
+class CitaTransicionSerializer(serializers.Serializer):
+    """Confirmar o cancelar varias citas de una vez (ver CitaTransicionAPI)."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_CITAS_TRANSICION,
+    )
+    accion = serializers.ChoiceField(choices=ACCIONES)
+
+
+class ProcedimientoAgendaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProcedimientoConsulta
+        fields = ["id", "nombre", "costo", "estado_pago"]
+        read_only_fields = fields
+
+
+class AgendaCitaSerializer(serializers.ModelSerializer):
+    """
+    Una fila de la agenda del doctor: la cita con todo lo que el dashboard
+    antes pedía por separado (pagos, procedimientos, consentimiento, reporte,
+    receta y tratamiento). Lee solo anotaciones y el prefetch de
+    `optimizar_queryset()`; no dispara queries por fila.
+    """
+
+    paciente = PacienteSerializer(read_only=True)
+    especialidad = serializers.CharField(source="especialidad.nombre", read_only=True)
+    tratamiento = TratamientoLiteSerializer(read_only=True)
+    procedimientos = ProcedimientoAgendaSerializer(many=True, read_only=True)
+    pagos = serializers.SerializerMethodField()
+    consentimiento = serializers.SerializerMethodField()
+    reporte_final = serializers.BooleanField(read_only=True)
+    tiene_receta = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = Cita
+        fields = [
+            "id",
+            "fecha_hora",
+            "tipo",
+            "estado",
+            "atendida",
+            "paciente",
+            "especialidad",
+            "tratamiento",
+            "pagos",
+            "procedimientos",
+            "consentimiento",
+            "reporte_final",
+            "tiene_receta",
+        ]
+        read_only_fields = fields
+
+    @staticmethod
+    def optimizar_queryset(queryset):
+        """
+        Dos queries en total: citas (con resumen de pagos y banderas vía
+        subqueries/Exists) + prefetch de procedimientos.
+        """
+        pagos_vigentes = (
+            Pago.objects.filter(cita=OuterRef("pk"), revertido=False)
+            .order_by()
+            .values("cita")
+        )
+        monto = DecimalField(max_digits=12, decimal_places=2)
+
+        return (
+            queryset.select_related("paciente", "especialidad", "tratamiento")
+            .annotate(
+                pagos_num=Coalesce(
+                    Subquery(pagos_vigentes.annotate(n=Count("pk")).values("n")),
+                    0,
+                ),
+                pagos_aprobado=Coalesce(
+                    Subquery(
+                        pagos_vigentes.filter(estado_pago="APROBADO")
+                        .annotate(s=Sum("pagado"))
+                        .values("s"),
+                        output_field=monto,
+                    ),
+                    Value(Decimal("0.00")),
+                    output_field=monto,
+                ),
+                pagos_en_revision=Exists(
+                    Pago.objects.filter(
+                        cita=OuterRef("pk"), revertido=False, estado_pago="PENDIENTE"
+                    )
+                ),
+                reporte_final=Exists(
+                    ReportePaciente.objects.filter(cita=OuterRef("pk"), estado="FINAL")
+                ),
+                tiene_receta=Exists(Receta.objects.filter(cita=OuterRef("pk"))),
+            )
+            .prefetch_related(
+                Prefetch(
+                    "procedimientos",
+                    queryset=ProcedimientoConsulta.objects.only(
+                        "id", "cita_id", "nombre", "costo", "estado_pago"
+                    ).order_by("id"),
+                )
+            )
+        )
+
+    def get_pagos(self, obj):
+        if obj.pagos_aprobado > 0:
+            estado = "APROBADO"
+        elif obj.pagos_en_revision:
+            estado = "PENDIENTE"
+        else:
+            estado = "SIN_PAGO"
+        return {
+            "estado": estado,
+            "aprobado": f"{obj.pagos_aprobado:.2f}",
+            "en_revision": obj.pagos_en_revision,
+            "num_pagos": obj.pagos_num,
+        }
+
+    def get_consentimiento(self, obj):
+        return {
+            "requerido": obj.requiere_consentimiento(),
+            "completado": obj.consentimiento_completado,
+        }
+
+
 class TratamientoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tratamiento
@@ -734,25 +1046,38 @@ class ReportePacienteSerializer(serializers.ModelSerializer):
                 )
         return data
 
-    def _actualizar_cita_atendida(self, reporte):
-        cita = reporte.cita
-        if not cita:
-            return
-        if hasattr(cita, "actualizar_atendida"):
-            cita.actualizar_atendida()
+    def _actualizar_cita_atendida(self, reporte, usuario, cita_anterior=None):
+        # Única ruta de recálculo de `atendida` al escribir un reporte: el
+        # reporte es único por cita, así que su estado decide esa mitad.
+        if cita_anterior is not None and cita_anterior.pk != reporte.cita_id:
+            cita_anterior.actualizar_atendida(usuario, reporte_final=False)
+        if reporte.cita:
+            reporte.cita.actualizar_atendida(
+                usuario, reporte_final=reporte.estado == "FINAL"
+            )
 
     def create(self, validated_data):
-        reporte = super().create(validated_data)
-        self._actualizar_cita_atendida(reporte)
+        with transaction.atomic():
+            reporte = super().create(validated_data)
+            self._actualizar_cita_atendida(
+                reporte, validated_data.get("actualizado_por")
+            )
         return reporte
 
     def update(self, instance, validated_data):
-        instance = super().update(instance, validated_data)
-        self._actualizar_cita_atendida(instance)
+        cita_anterior = instance.cita
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            self._actualizar_cita_atendida(
+                instance, validated_data.get("actualizado_por"), cita_anterior
+            )
         return instance
 
 
 class RecetaMedicamentoSerializer(serializers.ModelSerializer):
+    # Escribible: al editar una receta, el id identifica la fila a actualizar
+    id = serializers.IntegerField(required=False)
+
     class Meta:
         model = RecetaMedicamento
         fields = [
@@ -808,34 +1133,119 @@ class RecetaSerializer(serializers.ModelSerializer):
                 )
         return data
 
-    def _actualizar_cita_atendida(self, receta):
-        cita = receta.cita
-        if not cita:
-            return
-        if hasattr(cita, "actualizar_atendida"):
-            cita.actualizar_atendida()
+    def _actualizar_cita_atendida(self, receta, usuario, cita_anterior=None):
+        # Única ruta de recálculo de `atendida` al escribir una receta (una
+        # por cita): su existencia ya es la mitad "receta" del flag.
+        if cita_anterior is not None and cita_anterior.pk != receta.cita_id:
+            cita_anterior.actualizar_atendida(usuario, receta=False)
+        if receta.cita:
+            receta.cita.actualizar_atendida(usuario, receta=True)
+
+    CAMPOS_MEDICAMENTO = (
+        "nombre",
+        "dosis",
+        "frecuencia",
+        "duracion",
+        "via_administracion",
+        "notas",
+    )
+
+    def _guardar_medicamentos(self, receta, meds_data, existentes=()):
+        """
+        Escribe los medicamentos como diff contra `existentes`: un
+        bulk_create para los nuevos, un bulk_update para los que cambiaron
+        y un delete para los que ya no vienen. Número de queries constante
+        sin importar cuántos medicamentos tenga la receta.
+
+        Se emparejan por `id`. Si el cliente no manda ningún id (versiones
+        anteriores del frontend), se emparejan en orden con las filas
+        existentes, así que guardar una receta sin cambios no toca la base.
+        """
+        por_id = {med.pk: med for med in existentes}
+        ajenos = [
+            med["id"] for med in meds_data if med.get("id") and med["id"] not in por_id
+        ]
+        if ajenos:
+            raise serializers.ValidationError(
+                {"medicamentos": f"Medicamentos que no pertenecen a esta receta: {ajenos}."}
+            )
+
+        ids = [med["id"] for med in meds_data if med.get("id")]
+        con_id = set(ids)
+        if len(con_id) != len(ids):
+            raise serializers.ValidationError(
+                {"medicamentos": "Un medicamento viene repetido en la receta."}
+            )
+        libres = [med for med in existentes if med.pk not in con_id]
+        reutilizables = [] if con_id else libres
+
+        nuevos, cambiados = [], []
+        for datos in meds_data:
+            datos = dict(datos)
+            med_id = datos.pop("id", None)
+            if med_id:
+                actual = por_id[med_id]
+            elif reutilizables:
+                actual = reutilizables.pop(0)
+            else:
+                nuevos.append(RecetaMedicamento(receta=receta, **datos))
+                continue
+
+            # Solo los campos enviados: lo que falta en un PATCH se conserva
+            cambio = False
+            for campo in self.CAMPOS_MEDICAMENTO:
+                if campo not in datos:
+                    continue
+                valor = datos[campo]
+                if getattr(actual, campo) != valor:
+                    setattr(actual, campo, valor)
+                    cambio = True
+            if cambio:
+                cambiados.append(actual)
+
+        if nuevos:
+            RecetaMedicamento.objects.bulk_create(nuevos)
+        if cambiados:
+            RecetaMedicamento.objects.bulk_update(cambiados, self.CAMPOS_MEDICAMENTO)
+        if libres:
+            # Vía el related manager: las filas traen la receta en cache y
+            # la señal post_delete no consulta nada por cada una.
+            receta.medicamentos.filter(pk__in=[med.pk for med in libres]).delete()
+
+        if nuevos or cambiados:
+            # bulk_create/bulk_update no emiten señales
+            transaction.on_commit(
+                partial(dashboard_paciente.invalidar, receta.paciente_id)
+            )
 
     def create(self, validated_data):
         meds_data = validated_data.pop("medicamentos", [])
-        receta = Receta.objects.create(**validated_data)
-        for med in meds_data:
-            RecetaMedicamento.objects.create(receta=receta, **med)
-        self._actualizar_cita_atendida(receta)
+        with transaction.atomic():
+            receta = Receta.objects.create(**validated_data)
+            self._guardar_medicamentos(receta, meds_data)
+            self._actualizar_cita_atendida(
+                receta, validated_data.get("actualizado_por")
+            )
         return receta
 
     def update(self, instance, validated_data):
         meds_data = validated_data.pop("medicamentos", None)
+        cita_anterior = instance.cita
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+        with transaction.atomic():
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
 
-        if meds_data is not None:
-            instance.medicamentos.all().delete()
-            for med in meds_data:
-                RecetaMedicamento.objects.create(receta=instance, **med)
+            if meds_data is not None:
+                # Si la vista los precargó (RecetaDetailAPI), no hay query
+                self._guardar_medicamentos(
+                    instance, meds_data, list(instance.medicamentos.all())
+                )
 
-        self._actualizar_cita_atendida(instance)
+            self._actualizar_cita_atendida(
+                instance, validated_data.get("actualizado_por"), cita_anterior
+            )
         return instance
 
 
@@ -939,6 +1349,12 @@ class ConsentimientoSerializer(serializers.ModelSerializer):
             "actualizado_en",
         ]
 
+    def validate_firma_paciente(self, value):
+        # Se guarda ya recortada y reducida al tamaño de impresión del PDF
+        if not value:
+            return value
+        return normalizar_firma(value)
+
     def get_firma_paciente_url(self, obj):
         if not obj.firma_paciente:
             return None
@@ -952,3 +1368,47 @@ class ConsentimientoSerializer(serializers.ModelSerializer):
         if request is not None:
             return request.build_absolute_uri(url)
         return url
+
+
+# =========================
+#  Trabajos de documentos
+# =========================
+
+class TrabajoDocumentoSerializer(serializers.ModelSerializer):
+    espera_segundos = serializers.SerializerMethodField()
+    duracion_segundos = serializers.SerializerMethodField()
+    descarga_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TrabajoDocumento
+        fields = [
+            "id",
+            "tipo",
+            "estado",
+            "parametros",
+            "documentos",
+            "error",
+            "intentos",
+            "creado_en",
+            "iniciado_en",
+            "terminado_en",
+            "espera_segundos",
+            "duracion_segundos",
+            "descarga_url",
+        ]
+        read_only_fields = fields
+
+    def get_espera_segundos(self, obj):
+        return round(obj.espera.total_seconds(), 3) if obj.espera else None
+
+    def get_duracion_segundos(self, obj):
+        return round(obj.duracion.total_seconds(), 3) if obj.duracion else None
+
+    def get_descarga_url(self, obj):
+        if obj.estado != "COMPLETADO":
+            return None
+        url = reverse("trabajo-descargar", args=[obj.pk])
+        request = self.context.get("request")
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
@@ -0,0 +1,77 @@
+# backend/users/signals.py
+"""
+Invalidación de caches al cambiar los modelos.
+
+Todas se difieren con `transaction.on_commit`: invalidar antes del commit
+deja una ventana en la que otra petición lee la base vieja y la vuelve a
+guardar en cache bajo la versión nueva. Fuera de una transacción el
+callback corre de inmediato.
+"""
+
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import (
+    User,
+    Especialidad,
+    Horario,
+    Cita,
+    Consentimiento,
+    Pago,
+    Tratamiento,
+    ProcedimientoConsulta,
+    Receta,
+    RecetaMedicamento,
+)
+from .authentication import usuarios_autenticados
+from .utils.catalogos import catalogo_especialidades, horarios_semanales
+from .utils.dashboard import dashboard_paciente
+from .utils.pdf_consentimiento import invalidar_consentimiento_pdf
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidar_usuario_autenticado(sender, instance, **kwargs):
+    transaction.on_commit(partial(usuarios_autenticados.invalidar, instance.pk))
+
+
+@receiver([post_save, post_delete], sender=Especialidad)
+def invalidar_catalogo_especialidades(sender, **kwargs):
+    transaction.on_commit(catalogo_especialidades.invalidar)
+
+
+@receiver([post_save, post_delete], sender=Horario)
+def invalidar_horarios_semanales(sender, **kwargs):
+    transaction.on_commit(horarios_semanales.invalidar)
+
+
+@receiver([post_save, post_delete], sender=Cita)
+@receiver([post_save, post_delete], sender=Pago)
+@receiver([post_save, post_delete], sender=Tratamiento)
+@receiver([post_save, post_delete], sender=ProcedimientoConsulta)
+@receiver([post_save, post_delete], sender=Receta)
+def invalidar_dashboard_paciente(sender, instance, **kwargs):
+    transaction.on_commit(partial(dashboard_paciente.invalidar, instance.paciente_id))
+
+
+@receiver([post_save, post_delete], sender=RecetaMedicamento)
+def invalidar_dashboard_por_medicamento(sender, instance, **kwargs):
+    # Al crear medicamentos desde RecetaSerializer la receta ya viene en cache
+    if sender._meta.get_field("receta").is_cached(instance):
+        paciente_id = instance.receta.paciente_id
+    else:
+        paciente_id = (
+            Receta.objects.filter(pk=instance.receta_id)
+            .values_list("paciente_id", flat=True)
+            .first()
+        )
+    if paciente_id:
+        transaction.on_commit(partial(dashboard_paciente.invalidar, paciente_id))
+
+
+@receiver([post_save, post_delete], sender=Consentimiento)
+def invalidar_pdf_consentimiento(sender, instance, **kwargs):
+    # La versión nueva tiene otra huella; aquí solo se liberan las viejas
+    transaction.on_commit(partial(invalidar_consentimiento_pdf, instance.pk))
@@ -1,3 +1,2341 @@
-from django.test import TestCase
+import csv
+import io
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import zipfile
+import time as time_mod
+from concurrent.futures import Future
+from contextlib import contextmanager
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, connections
+from django.db.models import F
+from django.db.models.fields.files import FieldFile
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+from PIL import Image, ImageDraw
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+from rest_framework import serializers
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .checks import cache_compartido
+from .models import (
+    User,
+    Especialidad,
+    Horario,
+    Cita,
+    Consentimiento,
+    Pago,
+    Tratamiento,
+    ProcedimientoConsulta,
+    ReportePaciente,
+    Receta,
+    RecetaMedicamento,
+    TrabajoDocumento,
+)
+from .pagination import iterar_keyset
+from .utils.analitica import calcular_ocupacion
+from .utils.catalogos import consulta_horarios_semanales
+from .utils.comprobantes import memoria_pico_estimada
+from .utils.dashboard import dashboard_paciente
+from .utils.disponibilidad import (
+    MAX_DIAS_RANGO,
+    calcular_disponibilidad,
+    consulta_ocupadas,
+)
+from .utils.fechas import filtrar_rango_fechas
+from .utils.firmas import FIRMA_ALTO_PX, FIRMA_ANCHO_PX, normalizar_firma
+from .utils.ingresos import pagos_vigentes
+from .utils.pdf_consentimiento import build_consentimiento_pdf
+from .utils.pdf_layout import Maquetador, metricas, partir_lineas
+from .utils.reservas import reservar_slot, subsecuentes_activas, SlotOcupado
+from .utils.trabajos import (
+    EJECUTORES,
+    LATIDO_VENCIDO,
+    ejecutar_trabajo,
+    encolar,
+    reclamar_siguiente,
+    reencolar_huerfanos,
+)
+from .views import CitaListCreateAPI
+
+# Métricas de los stress tests; se ven con BENCH_LOG_LEVEL=INFO
+logger_bench = logging.getLogger("users.bench")
+
+
+def crear_usuario(telefono, role="PACIENTE", **extra):
+    return User.objects.create_user(
+        telefono,
+        "clave12345",
+        nombre="Nombre",
+        apellidos="Apellido",
+        edad=30,
+        role=role,
+        **extra,
+    )
+
+
+def proximo_lunes(hora=9):
+    hoy = timezone.localdate()
+    lunes = hoy + timedelta(days=7 - hoy.weekday())
+    return timezone.make_aware(datetime.combine(lunes, time(hora)))
+
+
+class ReservaCitaTests(TestCase):
+    def setUp(self):
+        self.especialidad = Especialidad.objects.create(nombre="PODOLOGIA")
+        self.doctor = crear_usuario(
+            "5550000001", role="PODOLOGO", especialidad=self.especialidad
+        )
+        self.paciente = crear_usuario("5550000002")
+        self.otro_paciente = crear_usuario("5550000003")
+        Horario.objects.create(
+            doctor=self.doctor,
+            especialidad=self.especialidad,
+            dia_semana=1,
+            hora_inicio=time(9),
+            hora_fin=time(10),
+        )
+        self.fecha_hora = proximo_lunes(9)
+
+    def _reservar(self, paciente):
+        client = APIClient()
+        client.force_authenticate(paciente)
+        return client.post(
+            reverse("citas-list-create"),
+            {
+                "especialidad_id": self.especialidad.id,
+                "fecha_hora": timezone.localtime(self.fecha_hora)
+                .replace(tzinfo=None)
+                .isoformat(),
+            },
+        )
+
+    def test_slot_ocupado_devuelve_error(self):
+        self.assertEqual(self._reservar(self.paciente).status_code, 201)
+        self.assertEqual(self._reservar(self.otro_paciente).status_code, 400)
+        self.assertEqual(Cita.objects.count(), 1)
+
+    def test_constraint_rechaza_doble_reserva(self):
+        Cita.objects.create(
+            paciente=self.paciente,
+            doctor=self.doctor,
+            especialidad=self.especialidad,
+            fecha_hora=self.fecha_hora,
+        )
+        with self.assertRaises(SlotOcupado):
+            with reservar_slot():
+                Cita.objects.create(
+                    paciente=self.otro_paciente,
+                    doctor=self.doctor,
+                    especialidad=self.especialidad,
+                    fecha_hora=self.fecha_hora,
+                )
+
+    def test_otros_integrity_error_no_son_slot_ocupado(self):
+        with self.assertRaises(IntegrityError):
+            with reservar_slot():
+                Cita.objects.create(
+                    paciente=self.paciente,
+                    doctor=self.doctor,
+                    especialidad_id=None,
+                    fecha_hora=self.fecha_hora,
+                )
+
+    def test_subsecuente_en_slot_ocupado_no_deja_escrituras(self):
+        inicial = Cita.objects.create(
+            paciente=self.paciente,
+            doctor=self.doctor,
+            especialidad=self.especialidad,
+            fecha_hora=self.fecha_hora,
+            estado="C",
+        )
+        ocupado = self.fecha_hora + timedelta(days=7)
+        Cita.objects.create(
+            paciente=self.otro_paciente,
+            doctor=self.doctor,
+            especialidad=self.especialidad,
+            fecha_hora=ocupado,
+        )
+        client = APIClient()
+        client.force_authenticate(self.doctor)
+        response = client.post(
+            reverse("cita-programar-subsecuente", args=[inicial.pk]),
+            {"fecha_hora": ocupado.isoformat()},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 409)
+        inicial.refresh_from_db()
+        self.assertIsNone(inicial.tratamiento_id)
+        self.assertFalse(Tratamiento.objects.exists())
+
+    def test_cita_cancelada_libera_slot(self):
+        Cita.objects.create(
+            paciente=self.paciente,
+            doctor=self.doctor,
+            especialidad=self.especialidad,
+            fecha_hora=self.fecha_hora,
+            estado="X",
+        )
+        self.assertEqual(self._reservar(self.otro_paciente).status_code, 201)
+
+
+class ReservaConcurrenteTests(TransactionTestCase):
+    """
+    Stress test: varios hilos compiten por los mismos slots. La constraint de
+    Cita debe dejar exactamente una reserva por (doctor, fecha_hora).
+    """
+
+    HILOS = 8
+    SLOTS = 10
+    # SQLite en memoria bloquea la tabla entera en escrituras concurrentes
+    REINTENTOS_BLOQUEO = 100
+
+    def setUp(self):
+        self.especialidad = Especialidad.objects.create(nombre="PODOLOGIA")
+        self.doctor = crear_usuario(
+            "5550000001", role="PODOLOGO", especialidad=self.especialidad
+        )
+        self.pacientes = [
+            crear_usuario(f"55510000{i:02d}") for i in range(self.HILOS)
+        ]
+        base = proximo_lunes(9)
+        self.slots = [base + timedelta(minutes=30 * i) for i in range(self.SLOTS)]
+
+    def _reservar(self, paciente, slot):
+        """Devuelve "ok" o "conflicto"; solo reintenta los bloqueos de SQLite."""
+        for _ in range(self.REINTENTOS_BLOQUEO):
+            try:
+                with reservar_slot():
+                    Cita.objects.create(
+                        paciente=paciente,
+                        doctor=self.doctor,
+                        especialidad=self.especialidad,
+                        fecha_hora=slot,
+                    )
+                return "ok"
+            except SlotOcupado:
+                return "conflicto"
+            except OperationalError:
+                time_mod.sleep(0.005)
+        raise AssertionError(
+            f"Slot {slot} sin resolver tras {self.REINTENTOS_BLOQUEO} reintentos"
+        )
+
+    def _correr(self, worker):
+        """Un hilo por paciente; devuelve los segundos de pared de la ronda."""
+        hilos = [
+            threading.Thread(target=worker, args=(p,)) for p in self.pacientes
+        ]
+        inicio = time_mod.perf_counter()
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        return time_mod.perf_counter() - inicio
+
+    def _reportar(self, ronda, latencias, segundos, resultados):
+        latencias = sorted(latencias)
+
+        def percentil(p):
+            return latencias[min(len(latencias) - 1, int(p * len(latencias)))]
+
+        logger_bench.info(
+            "reservas[%s]: %d intentos en %.2fs (%.0f/s), p50 %.1f ms, "
+            "p95 %.1f ms, %s",
+            ronda,
+            len(latencias),
+            segundos,
+            len(latencias) / segundos,
+            percentil(0.50) * 1000,
+            percentil(0.95) * 1000,
+            resultados,
+        )
+
+    def test_sin_dobles_reservas(self):
+        resultados = {"ok": 0, "conflicto": 0}
+        latencias = []
+        errores = []
+        lock = threading.Lock()
+        barrera = threading.Barrier(self.HILOS)
+
+        def worker(paciente):
+            barrera.wait()
+            try:
+                for slot in self.slots:
+                    inicio = time_mod.perf_counter()
+                    clave = self._reservar(paciente, slot)
+                    with lock:
+                        resultados[clave] += 1
+                        latencias.append(time_mod.perf_counter() - inicio)
+            except Exception as exc:
+                # Una excepción en un hilo no falla el test por sí sola
+                with lock:
+                    errores.append(exc)
+            finally:
+                connection.close()
+
+        segundos = self._correr(worker)
+        self._reportar("reservar_slot", latencias, segundos, resultados)
+
+        self.assertEqual(errores, [])
+        intentos = self.HILOS * self.SLOTS
+        self.assertEqual(resultados["ok"], self.SLOTS)
+        self.assertEqual(resultados["ok"] + resultados["conflicto"], intentos)
+        self.assertEqual(
+            Cita.objects.filter(doctor=self.doctor).count(), self.SLOTS
+        )
+
+    def test_ronda_concurrente_por_api(self):
+        """
+        Todos los POST pasan la validación (lectura de slots ocupados) antes
+        de que alguno inserte, así que solo la constraint decide: uno gana y
+        el resto recibe el 409 de perform_create.
+        """
+        slot = self.slots[0]
+        Horario.objects.create(
+            doctor=self.doctor,
+            especialidad=self.especialidad,
+            dia_semana=slot.isoweekday(),
+            hora_inicio=time(9),
+            hora_fin=time(10),
+        )
+        codigos, latencias, errores = [], [], []
+        lock = threading.Lock()
+        barrera = threading.Barrier(self.HILOS, timeout=30)
+        # SQLite en memoria no admite un escritor con lectores a la vez: del
+        # INSERT al final de la respuesta las peticiones pasan de una en una.
+        turno = threading.Lock()
+        estado_hilo = threading.local()
+
+        @contextmanager
+        def reservar_tras_validar():
+            barrera.wait()
+            turno.acquire()
+            estado_hilo.con_turno = True
+            with reservar_slot():
+                yield
+
+        def worker(paciente):
+            client = APIClient()
+            client.force_authenticate(paciente)
+            inicio = time_mod.perf_counter()
+            try:
+                response = client.post(
+                    reverse("citas-list-create"),
+                    {
+                        "especialidad_id": self.especialidad.id,
+                        "fecha_hora": timezone.localtime(slot)
+                        .replace(tzinfo=None)
+                        .isoformat(),
+                    },
+                )
+                with lock:
+                    codigos.append(response.status_code)
+                    latencias.append(time_mod.perf_counter() - inicio)
+            except Exception as exc:
+                with lock:
+                    errores.append(exc)
+            finally:
+                if getattr(estado_hilo, "con_turno", False):
+                    turno.release()
+                connection.close()
+
+        with mock.patch("users.views.reservar_slot", reservar_tras_validar):
+            segundos = self._correr(worker)
+        self._reportar(
+            "api", latencias, segundos, {c: codigos.count(c) for c in set(codigos)}
+        )
+
+        self.assertEqual(errores, [])
+        self.assertEqual(sorted(codigos), [201] + [409] * (self.HILOS - 1))
+        self.assertEqual(
+            Cita.objects.filter(doctor=self.doctor, fecha_hora=slot).count(), 1
+        )
+
+
+class PlanesDeConsultaTests(TestCase):
+    """
+    Regresión de planes: corre EXPLAIN sobre la query principal de cada
+    endpoint caliente con un dataset sembrado y falla si alguna tabla se
+    recorre completa (full scan) en lugar de usar un índice. Los querysets
+    salen de la propia vista o de las funciones que usa el endpoint, no de
+    copias.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidad = Especialidad.objects.create(nombre="PODOLOGIA")
+        cls.doctor = crear_usuario(
+            "5550000001", role="PODOLOGO", especialidad=cls.especialidad
+        )
+        cls.paciente = crear_usuario("5550000002")
+        for dia in range(1, 7):
+            for hora in range(9, 14):
+                Horario.objects.create(
+                    doctor=cls.doctor,
+                    especialidad=cls.especialidad,
+                    dia_semana=dia,
+                    hora_inicio=time(hora),
+                    hora_fin=time(hora, 30),
+                )
+        base = proximo_lunes(9)
+        citas = Cita.objects.bulk_create(
+            Cita(
+                paciente=cls.paciente,
+                doctor=cls.doctor,
+                especialidad=cls.especialidad,
+                fecha_hora=base + timedelta(hours=i),
+                estado="XCP"[i % 3],
+            )
+            for i in range(200)
+        )
+        cls.cita = citas[0]
+        Pago.objects.bulk_create(
+            Pago(
+                paciente=cls.paciente,
+                cita=c,
+                total=Decimal("900.00"),
+                pagado=Decimal("0.00"),
+                metodo_pago="TRANSFERENCIA",
+            )
+            for c in citas
+        )
+
+    def _listado(self, vista, usuario, **params):
+        """Queryset que la vista pagina para `usuario`, con su mismo orden."""
+        request = APIRequestFactory().get("/", params)
+        force_authenticate(request, user=usuario)
+        view = vista()
+        view.setup(request)
+        view.request = view.initialize_request(request)
+        view.format_kwarg = None
+        queryset = view.filter_queryset(view.get_queryset())
+        return queryset.order_by(*view.keyset_ordering)
+
+    def _consultas(self):
+        inicio = proximo_lunes(0)
+        return {
+            "citas-list-create (doctor)": self._listado(CitaListCreateAPI, self.doctor),
+            "citas-list-create (paciente)": self._listado(
+                CitaListCreateAPI, self.paciente
+            ),
+            "horarios-disponibles (horarios)": consulta_horarios_semanales(
+                self.especialidad.id
+            ),
+            "horarios-disponibles (ocupadas)": consulta_ocupadas(
+                [self.doctor.id], inicio, inicio + timedelta(days=31)
+            ),
+            "cita-subsecuente (activa)": subsecuentes_activas(1),
+            "pagos-create (duplicado)": pagos_vigentes(self.cita, "TRANSFERENCIA"),
+        }
+
+    def _full_scans(self, plan):
+        if connection.vendor == "sqlite":
+            # "SCAN tabla" sin índice = full scan; "SEARCH ... USING INDEX" = ok
+            return [
+                line
+                for line in plan.splitlines()
+                if "SCAN " in line and "USING" not in line
+            ]
+        if connection.vendor == "mysql":
+            # En EXPLAIN tradicional de MySQL, type=ALL es full scan
+            return [line for line in plan.splitlines() if "\tALL\t" in line]
+        return [line for line in plan.splitlines() if "Seq Scan" in line]
+
+    def test_sin_full_scans(self):
+        planes = {nombre: qs.explain() for nombre, qs in self._consultas().items()}
+        regresiones = {
+            nombre: plan for nombre, plan in planes.items() if self._full_scans(plan)
+        }
+        self.assertFalse(
+            regresiones,
+            "Planes con full scan:\n"
+            + "\n".join(f"- {n}:\n{p}" for n, p in regresiones.items()),
+        )
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidad = Especialidad.objects.create(nombre="PODOLOGIA")
+        cls.doctor = crear_usuario(
+            "5550000001", role="PODOLOGO", especialidad=cls.especialidad
+        )
+        cls.paciente = crear_usuario("5550000002")
+        base = proximo_lunes(9)
+        Cita.objects.bulk_create(
+            Cita(
+                paciente=cls.paciente,
+                doctor=cls.doctor,
+                especialidad=cls.especialidad,
+                # Horas repetidas (canceladas) para forzar empates en fecha_hora
+                fecha_hora=base + timedelta(hours=i // 2),
+                estado="X" if i % 2 else "P",
+            )
+            for i in range(25)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+
+    def test_recorre_todas_las_paginas_sin_duplicados(self):
+        url = reverse("citas-list-create")
+        params = {"page_size": 10}
+        ids, paginas = [], 0
+        while url:
+            data = self.client.get(url, params).json()
+            params = None
+            paginas += 1
+            self.assertLessEqual(len(data["results"]), 10)
+            ids.extend(c["id"] for c in data["results"])
+            url = data["next"]
+
+        esperados = list(
+            Cita.objects.order_by("fecha_hora", "id").values_list("id", flat=True)
+        )
+        self.assertEqual(ids, esperados)
+        self.assertEqual(paginas, 3)
+
+    def test_paginar_0_devuelve_lista_plana(self):
+        data = self.client.get(reverse("citas-list-create"), {"paginar": 0}).json()
+        self.assertIsInstance(data, list)
+        self.assertEqual(len(data), 25)
+
+    def test_cursor_invalido(self):
+        response = self.client.get(reverse("citas-list-create"), {"cursor": "xx"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_reportes_filtra_estado_en_el_servidor(self):
+        for estado in ("BORRADOR", "FINAL", "BORRADOR"):
+            ReportePaciente.objects.create(
+                paciente=self.paciente,
+                doctor=self.doctor,
+                resumen="Consulta",
+                estado=estado,
+            )
+        self.client.force_authenticate(self.paciente)
+        data = self.client.get(
+            reverse("reportes-list-create"), {"estado": "final", "page_size": 1}
+        ).json()
+        self.assertEqual([r["estado"] for r in data["results"]], ["FINAL"])
+        self.assertIsNone(data["next"])
+
+    def test_admin_users_filtra_en_el_servidor_y_next_conserva_filtros(self):
+        admin = crear_usuario("5550000099", role="ADMIN")
+        for i in range(3):
+            crear_usuario(f"555111000{i}")
+        crear_usuario("5551110009", role="TAMIZ")
+        User.objects.filter(telefono__startswith="555111").update(
+            nombre="María", apellidos="López"
+        )
+        self.client.force_authenticate(admin)
+
+        data = self.client.get(
+            reverse("admin-user-list"),
+            {"tipo": "PACIENTES", "search": "maría lóp", "page_size": 2},
+        ).json()
+        self.assertEqual(len(data["results"]), 2)
+        self.assertIn("search=", data["next"])
+
+        resto = self.client.get(data["next"]).json()
+        self.assertEqual(len(resto["results"]), 1)
+        self.assertIsNone(resto["next"])
+        self.assertTrue(
+            all(u["role"] == "PACIENTE" for u in data["results"] + resto["results"])
+        )
+
+        pacientes = self.client.get(
+            reverse("pacientes-list"), {"search": "lópez"}
+        ).json()
+        self.assertEqual(len(pacientes["results"]), 3)
+
+        especialistas = self.client.get(
+            reverse("admin-user-list"), {"tipo": "ESPECIALISTAS"}
+        ).json()
+        self.assertEqual(
+            [u["telefono"] for u in especialistas["results"]],
+            ["5551110009", "5550000001"],
+        )
+
+
+class FiltroRangoFechasTests(TestCase):
+    """`filtrar_rango_fechas`: días de la clínica (UTC-6) como [inicio, fin)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        especialidad = Especialidad.objects.create(nombre="PODOLOGIA")
+        cls.doctor = crear_usuario("5550000001", role="PODOLOGO", especialidad=especialidad)
+        paciente = crear_usuario("5550000002")
+        cls.citas = {}
+        for etiqueta, local in (
+            ("09 23:59", datetime(2024, 3, 9, 23, 59)),
+            ("10 00:00", datetime(2024, 3, 10, 0, 0)),
+            # 05:30 del día 11 en UTC
+            ("10 23:30", datetime(2024, 3, 10, 23, 30)),
+            ("11 00:00", datetime(2024, 3, 11, 0, 0)),
+        ):
+            cls.citas[etiqueta] = Cita.objects.create(
+                paciente=paciente,
+                doctor=cls.doctor,
+                especialidad=especialidad,
+                fecha_hora=timezone.make_aware(local),
+            ).pk
+
+    def _filtrar(self, desde, hasta):
+        qs = filtrar_rango_fechas(Cita.objects.all(), "fecha_hora", desde, hasta)
+        return {e for e, pk in self.citas.items() if pk in set(qs.values_list("pk", flat=True))}
+
+    def test_limites_del_dia_local(self):
+        self.assertEqual(
+            self._filtrar("2024-03-10", "2024-03-10"), {"10 00:00", "10 23:30"}
+        )
+        self.assertEqual(self._filtrar("2024-03-11", None), {"11 00:00"})
+
+    def test_fecha_hasta_inclusive(self):
+        self.assertEqual(
+            self._filtrar(None, "2024-03-10"), {"09 23:59", "10 00:00", "10 23:30"}
+        )
+
+    def test_columna_desnuda(self):
+        qs = filtrar_rango_fechas(Cita.objects.all(), "fecha_hora", "2024-03-10", "2024-03-10")
+        sql = str(qs.query).lower()
+        self.assertNotIn("cast_date", sql)
+        self.assertNotIn("date(", sql)
+
+    def test_fechas_invalidas_se_ignoran(self):
+        self.assertEqual(self._filtrar("10/03/2024", "2024-02-30"), set(self.citas))
+        self.assertEqual(self._filtrar("", "2024-03-09"), {"09 23:59"})
+
+        client = APIClient()
+        client.force_authenticate(self.doctor)
+        response = client.get(
+            reverse("citas-list-create"),
+            {"fecha_desde": "mañana", "fecha_hasta": "2024-99-99", "paginar": 0},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 4)
+
+    def test_datefield_compara_fechas(self):
+        pago = Pago.objects.create(
+            paciente_id=Cita.objects.get(pk=self.citas["10 00:00"]).paciente_id,
+            cita_id=self.citas["10 00:00"],
+            total=Decimal("900.00"),
+            pagado=Decimal("0.00"),
+            metodo_pago="TRANSFERENCIA",
+        )
+        Pago.objects.filter(pk=pago.pk).update(fecha=datetime(2024, 3, 10).date())
+        for desde, hasta, esperado in (
+            ("2024-03-10", "2024-03-10", True),
+            (None, "2024-03-09", False),
+            ("2024-03-11", None, False),
+        ):
+            with self.subTest(desde=desde, hasta=hasta):
+                qs = filtrar_rango_fechas(Pago.objects.all(), "fecha", desde, hasta)
+                self.assertEqual(qs.filter(pk=pago.pk).exists(), esperado)
+
+
+class DatosCitasMixin:
+    """12 citas de un doctor, cada una con tratamiento, 2 pagos y 2 procedimientos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidad = Especialidad.objects.create(nombre="PODOLOGIA")
+        cls.doctor = crear_usuario(
+            "5550000001", role="PODOLOGO", especialidad=cls.especialidad
+        )
+        cls.paciente = crear_usuario("5550000002")
+        base = proximo_lunes(9)
+        for i in range(12):
+            tratamiento = Tratamiento.objects.create(
+                paciente=crear_usuario(f"55520000{i:02d}"),
+                doctor=cls.doctor,
+            )
+            cita = Cita.objects.create(
+                paciente=cls.paciente,
+                doctor=cls.doctor,
+                especialidad=cls.especialidad,
+                fecha_hora=base + timedelta(hours=i),
+                tratamiento=tratamiento,
+            )
+            for _ in range(2):
+                Pago.objects.create(
+                    paciente=cls.paciente,
+                    cita=cita,
+                    total=Decimal("900.00"),
+                    pagado=Decimal("0.00"),
+                )
+                ProcedimientoConsulta.objects.create(
+                    cita=cita,
+                    paciente=cls.paciente,
+                    doctor=cls.doctor,
+                    nombre="Limpieza",
+                    costo=Decimal("300.00"),
+                )
+        cls.cita = cita
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+
+
+class CitaSerializerQueryCountTests(DatosCitasMixin, TestCase):
+    """El read path de citas debe costar lo mismo con 1 o con N filas."""
+
+    def test_listado_queries_constantes(self):
+        # validador (ETag) + citas + pagos + procedimientos
+        with self.assertNumQueries(4):
+            data = self.client.get(reverse("citas-list-create"), {"paginar": 0}).json()
+        self.assertEqual(len(data), 12)
+        self.assertEqual(len(data[0]["pagos"]), 2)
+        self.assertEqual(data[0]["pagos"][0]["cita"]["doctor"]["id"], self.doctor.id)
+
+    def test_detalle_queries_constantes(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("cita-detail", args=[self.cita.pk]))
+        self.assertEqual(len(response.json()["procedimientos"]), 2)
+
+
+class ProyeccionCitasTests(DatosCitasMixin, TestCase):
+    def test_fields_proyecta_y_omite_prefetch(self):
+        # Sin "pagos" ni "procedimientos" no hay prefetch: validador + citas
+        with self.assertNumQueries(2):
+            data = self.client.get(
+                reverse("citas-list-create"),
+                {"paginar": 0, "fields": "id,fecha_hora,estado"},
+            ).json()
+        self.assertEqual(set(data[0]), {"id", "fecha_hora", "estado"})
+
+    def test_formato_normalizado(self):
+        # 2 del validador de la página + página + 2 prefetch
+        with self.assertNumQueries(5):
+            data = self.client.get(
+                reverse("citas-list-create"), {"formato": "normalizado"}
+            ).json()
+        cita = data["results"][0]
+        self.assertEqual(cita["doctor"], self.doctor.id)
+        self.assertNotIn("doctor_id", cita)
+        self.assertEqual(cita["pagos"][0]["cita"], cita["id"])
+        self.assertEqual(list(data["included"]["doctores"]), [str(self.doctor.id)])
+        self.assertIn(str(self.paciente.id), data["included"]["pacientes"])
+
+    def test_pagos_normalizados(self):
+        data = self.client.get(
+            reverse("pagos-list"), {"formato": "normalizado", "paginar": 0}
+        ).json()
+        pago = data["results"][0]
+        self.assertIsInstance(pago["cita"], int)
+        self.assertEqual(
+            data["included"]["citas"][str(pago["cita"])]["doctor"], self.doctor.id
+        )
+
+    def test_pagos_filtra_verificado_en_el_servidor(self):
+        ids = list(Pago.objects.order_by("id").values_list("id", flat=True)[:3])
+        Pago.objects.filter(pk__in=ids).update(verificado=True)
+        for valor, esperados in (("true", 3), ("false", 21)):
+            with self.subTest(verificado=valor):
+                data = self.client.get(
+                    reverse("pagos-list"), {"verificado": valor, "page_size": 50}
+                ).json()
+                self.assertEqual(len(data["results"]), esperados)
+
+
+class GetCondicionalTests(DatosCitasMixin, TestCase):
+    def test_detalle_304_sin_serializar(self):
+        url = reverse("cita-detail", args=[self.cita.pk])
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+
+        # Solo get_object() con las versiones anotadas; sin prefetch
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Un cambio en una fila relacionada invalida el ETag de la cita
+        pago = self.cita.pagos.first()
+        pago.verificado = True
+        pago.save(update_fields=["verificado"])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_listado_304_solo_sobre_la_pagina(self):
+        url = reverse("citas-list-create")
+        etag = self.client.get(url, {"page_size": 5})["ETag"]
+
+        # Filas de la página (con LIMIT) + agregado de relaciones sobre sus pks
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(
+                url, {"page_size": 5}, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(consultas), 2)
+        self.assertIn("LIMIT 6", consultas[0]["sql"])
+        self.assertNotIn("COUNT", consultas[0]["sql"])
+
+        # Un cambio fuera de la página no invalida su ETag
+        ultima = Cita.objects.filter(doctor=self.doctor).order_by("-fecha_hora").first()
+        ultima.save()
+        response = self.client.get(url, {"page_size": 5}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        etag = self.client.get(url)["ETag"]
+
+        # Otra proyección es otra representación
+        response = self.client.get(url, {"fields": "id"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        ProcedimientoConsulta.objects.filter(cita=self.cita).first().delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(SQL_QUERY_BUDGETS={"citas-list-create": 1})
+class SQLInstrumentationTests(DatosCitasMixin, TestCase):
+    def test_server_timing_y_presupuesto(self):
+        with self.assertLogs("users.sql", level="DEBUG") as logs:
+            response = self.client.get(reverse("citas-list-create"))
+        self.assertIn('desc="5 queries"', response["Server-Timing"])
+        self.assertTrue(
+            any("DEBUG" in l and '"url_name": "citas-list-create"' in l for l in logs.output)
+        )
+        self.assertTrue(
+            any("WARNING" in l and "sql_budget_excedido" in l for l in logs.output)
+        )
+
+    @override_settings(SQL_QUERY_BUDGETS={"citas-list-create": 10})
+    def test_dentro_del_presupuesto_no_loguea_en_info(self):
+        with self.assertNoLogs("users.sql", level="INFO"):
+            self.client.get(reverse("citas-list-create"))
+
+    @override_settings(SQL_QUERY_BUDGETS={"citas-exportar": 1})
+    def test_cuenta_queries_del_stream(self):
+        self.client.force_authenticate(crear_usuario("5550000009", role="ADMIN"))
+        with mock.patch("users.utils.exportacion.EXPORTACION_TAMANO_LOTE", 5):
+            with self.assertNoLogs("users.sql", level="WARNING"):
+                response = self.client.get(reverse("citas-exportar"))
+            self.assertNotIn("Server-Timing", response)
+            # Los lotes de iterar_keyset corren al consumir el cuerpo
+            with self.assertLogs("users.sql", level="WARNING") as logs:
+                cuerpo = b"".join(response.streaming_content)
+                response.close()
+        self.assertEqual(len(cuerpo.decode("utf-8-sig").splitlines()), 13)
+        # 12 filas en lotes de 5: 5 + 5 + 2
+        self.assertIn('"queries": 3', logs.output[0])
+
+
+class CatalogosCacheadosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.especialidad = Especialidad.objects.create(nombre="DERMATOLOGIA")
+        self.doctor = crear_usuario(
+            "5550000301", role="DERMATOLOGO", especialidad=self.especialidad
+        )
+        Horario.objects.create(
+            doctor=self.doctor,
+            especialidad=self.especialidad,
+            dia_semana=1,
+            hora_inicio=time(9),
+            hora_fin=time(10),
+        )
+        self.client = APIClient()
+
+    def test_especialidades_etag_y_invalidacion(self):
+        url = reverse("especialidades-list")
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertEqual(response.json()[0]["nombre"], "DERMATOLOGIA")
+        self.assertIn("max-age", response["Cache-Control"])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Especialidad.objects.create(nombre="TAMIZ")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_disponibilidad_usa_horarios_cacheados(self):
+        lunes = timezone.localtime(proximo_lunes()).date()
+        self.assertEqual(
+            calcular_disponibilidad(self.especialidad.id, lunes, lunes)[lunes],
+            ["09:00"],
+        )
+        with self.assertNumQueries(1):
+            calcular_disponibilidad(self.especialidad.id, lunes, lunes)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Horario.objects.create(
+                doctor=self.doctor,
+                especialidad=self.especialidad,
+                dia_semana=1,
+                hora_inicio=time(10),
+                hora_fin=time(11),
+            )
+        self.assertEqual(
+            calcular_disponibilidad(self.especialidad.id, lunes, lunes)[lunes],
+            ["09:00", "10:00"],
+        )
+
+
+class AgendaDoctorTests(DatosCitasMixin, TestCase):
+    def test_agenda_queries_constantes(self):
+        ReportePaciente.objects.create(
+            cita=self.cita,
+            paciente=self.paciente,
+            doctor=self.doctor,
+            resumen="Consulta",
+        )
+        Receta.objects.create(cita=self.cita, paciente=self.paciente, doctor=self.doctor)
+        Pago.objects.filter(cita=self.cita).update(estado_pago="APROBADO", pagado=900)
+
+        dia = timezone.localtime(self.cita.fecha_hora).date().isoformat()
+        # citas (con anotaciones) + procedimientos
+        with self.assertNumQueries(2):
+            data = self.client.get(reverse("agenda-doctor"), {"desde": dia}).json()
+
+        self.assertEqual(len(data["citas"]), 12)
+        entrada = next(c for c in data["citas"] if c["id"] == self.cita.id)
+        self.assertTrue(entrada["reporte_final"])
+        self.assertTrue(entrada["tiene_receta"])
+        self.assertEqual(entrada["pagos"]["estado"], "APROBADO")
+        self.assertEqual(entrada["pagos"]["aprobado"], "1800.00")
+        self.assertEqual(len(entrada["procedimientos"]), 2)
+        self.assertIsNotNone(entrada["tratamiento"])
+
+        otra = next(c for c in data["citas"] if c["id"] != self.cita.id)
+        self.assertFalse(otra["reporte_final"])
+        self.assertEqual(otra["pagos"]["estado"], "PENDIENTE")
+
+    def test_doctor_no_ve_agenda_ajena(self):
+        response = self.client.get(reverse("agenda-doctor"), {"doctor": self.paciente.id})
+        self.assertEqual(response.status_code, 403)
+
+
+class MiDashboardTests(DatosCitasMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        receta = Receta.objects.create(paciente=self.paciente, doctor=self.doctor)
+        RecetaMedicamento.objects.create(receta=receta, nombre="Terbinafina")
+        self.client = APIClient()
+        self.client.force_authenticate(self.paciente)
+
+    def test_dashboard_queries_fijas_y_cache(self):
+        url = reverse("me-dashboard")
+        # próximas + pasadas + pagos + procedimientos + pagos pendientes
+        # + tratamiento + recetas + medicamentos
+        with self.assertNumQueries(8):
+            data = self.client.get(url).json()
+        self.assertEqual(len(data["citas_proximas"]), 12)
+        self.assertEqual(len(data["pagos_pendientes"]), 24)
+        self.assertIsNone(data["tratamiento"])
+        self.assertEqual(data["recetas"][0]["medicamentos"][0]["nombre"], "Terbinafina")
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.json(), data)
+
+        # Escribir sobre un pago del paciente invalida su dashboard, pero
+        # solo al confirmar la transacción
+        pago = Pago.objects.filter(paciente=self.paciente).first()
+        pago.estado_pago = "APROBADO"
+        with self.captureOnCommitCallbacks() as callbacks:
+            pago.save()
+            self.assertEqual(self.client.get(url).json(), data)
+        for callback in callbacks:
+            callback()
+        data = self.client.get(url).json()
+        self.assertEqual(len(data["pagos_pendientes"]), 23)
+
+    def test_tratamiento_con_proxima_cita(self):
+        tratamiento = Tratamiento.objects.create(
+            paciente=self.paciente, doctor=self.doctor, frecuencia_dias=15
+        )
+        self.cita.tratamiento = tratamiento
+        self.cita.save()
+
+        data = self.client.get(reverse("me-dashboard")).json()
+        esperado = self.cita.fecha_hora + timedelta(days=15)
+        self.assertEqual(data["tratamiento"]["id"], tratamiento.id)
+        self.assertEqual(
+            data["tratamiento"]["proxima_cita"],
+            timezone.localtime(esperado).isoformat(),
+        )
+        self.assertEqual(tratamiento.proxima_cita(), esperado)
+
+    def test_solo_pacientes(self):
+        self.client.force_authenticate(self.doctor)
+        self.assertEqual(self.client.get(reverse("me-dashboard")).status_code, 403)
+
+
+class ResumenIngresosTests(DatosCitasMixin, TestCase):
+    def test_resumen_agrupado_en_la_base(self):
+        pagos = list(Pago.objects.filter(cita__doctor=self.doctor).order_by("id"))
+        pagos[0].estado_pago = "APROBADO"
+        pagos[0].pagado = Decimal("900.00")
+        pagos[0].metodo_pago = "CONSULTORIO"
+        pagos[0].save()
+        pagos[1].revertido = True
+        pagos[1].save()
+
+        # totales + método + estado + especialidad + periodo + procedimientos x2
+        with self.assertNumQueries(7):
+            data = self.client.get(
+                reverse("pagos-resumen"), {"periodo": "mes"}
+            ).json()
+
+        totales = data["totales"]
+        self.assertEqual(totales["num_pagos"], 24)
+        self.assertEqual(totales["monto_total"], "20700.00")
+        self.assertEqual(totales["monto_pagado"], "900.00")
+        self.assertEqual(totales["saldo_pendiente"], "19800.00")
+        self.assertEqual(totales["monto_revertido"], "900.00")
+
+        metodos = {f["metodo_pago"]: f for f in data["por_metodo_pago"]}
+        self.assertEqual(metodos["CONSULTORIO"]["monto_pagado"], "900.00")
+        self.assertEqual(data["por_especialidad"][0]["especialidad"], "PODOLOGIA")
+        self.assertEqual(len(data["por_periodo"]), 1)
+        self.assertTrue(data["por_periodo"][0]["periodo"].endswith("-01"))
+
+        procedimientos = data["procedimientos"]["por_estado_pago"]
+        self.assertEqual(procedimientos[0]["estado_pago"], "PENDIENTE")
+        self.assertEqual(procedimientos[0]["monto_costo"], "7200.00")
+
+    def test_periodos(self):
+        for periodo in ("dia", "semana"):
+            data = self.client.get(reverse("pagos-resumen"), {"periodo": periodo}).json()
+            self.assertEqual(data["por_periodo"][0]["num_pagos"], 24)
+
+    def test_rango_y_periodos_usan_el_mismo_dia(self):
+        # Creado el 10 de marzo (hora local), confirmado -> fecha del 13
+        pago = Pago.objects.filter(cita__doctor=self.doctor).first()
+        creado = timezone.make_aware(datetime(2024, 3, 10, 23, 30))
+        Pago.objects.filter(pk=pago.pk).update(
+            creado_en=creado, fecha=datetime(2024, 3, 13).date()
+        )
+
+        url = reverse("pagos-resumen")
+        data = self.client.get(
+            url, {"fecha_desde": "2024-03-10", "fecha_hasta": "2024-03-10"}
+        ).json()
+        self.assertEqual(data["totales"]["num_pagos"], 1)
+        self.assertEqual(
+            [(f["periodo"], f["num_pagos"]) for f in data["por_periodo"]],
+            [("2024-03-10", 1)],
+        )
+
+        data = self.client.get(
+            url, {"fecha_desde": "2024-03-11", "fecha_hasta": "2024-03-31"}
+        ).json()
+        self.assertEqual(data["totales"]["num_pagos"], 0)
+        self.assertEqual(data["por_periodo"], [])
+
+    def test_periodo_invalido(self):
+        response = self.client.get(reverse("pagos-resumen"), {"periodo": "anio"})
+        self.assertEqual(response.status_code, 400)
+
+
+class AnaliticaOcupacionTests(TestCase):
+    def setUp(self):
+        self.especialidad = Especialidad.objects.create(nombre="PODOLOGIA")
+        self.doctor = crear_usuario(
+            "5550000001", role="PODOLOGO", especialidad=self.especialidad
+        )
+        self.paciente = crear_usuario("5550000002")
+        self.admin = crear_usuario("5550000009", role="ADMIN")
+        # Lunes 09:00-10:00 en dos slots -> 2 lunes en la ventana = 4 slots
+        for inicio, fin in ((time(9), time(9, 30)), (time(9, 30), time(10))):
+            Horario.objects.create(
+                doctor=self.doctor,
+                especialidad=self.especialidad,
+                dia_semana=1,
+                hora_inicio=inicio,
+                hora_fin=fin,
+            )
+        self.desde = datetime(2026, 1, 5).date()  # lunes
+        self.hasta = datetime(2026, 1, 18).date()
+        for dias, hora, estado, atendida, anticipacion in (
+            (0, time(9), "C", True, timedelta(hours=12)),
+            (0, time(9, 30), "X", False, timedelta(days=2)),
+            (7, time(9), "C", False, timedelta(days=10)),
+        ):
+            fecha_hora = timezone.make_aware(
+                datetime.combine(self.desde + timedelta(days=dias), hora)
+            )
+            cita = Cita.objects.create(
+                paciente=self.paciente,
+                doctor=self.doctor,
+                especialidad=self.especialidad,
+                fecha_hora=fecha_hora,
+                estado=estado,
+                atendida=atendida,
+            )
+            Cita.objects.filter(pk=cita.pk).update(creado_en=fecha_hora - anticipacion)
+
+    def test_metricas_por_doctor(self):
+        ahora = timezone.make_aware(datetime(2026, 2, 1))
+        # horarios + citas + nombres
+        with self.assertNumQueries(3):
+            data = calcular_ocupacion(self.desde, self.hasta, ahora=ahora)
+
+        (fila,) = data["doctores"]
+        self.assertEqual(fila["doctor_id"], self.doctor.id)
+        self.assertEqual(fila["slots_ofrecidos"], 4)
+        self.assertEqual(fila["citas"], 3)
+        self.assertEqual(fila["canceladas"], 1)
+        self.assertEqual(fila["atendidas"], 1)
+        self.assertEqual(fila["ocupacion"], 0.5)
+        self.assertEqual(fila["tasa_cancelacion"], 0.3333)
+        self.assertEqual(fila["tasa_atendida"], 0.5)
+        self.assertEqual(fila["anticipacion_dias"]["p50"], 2.0)
+        self.assertEqual(
+            fila["anticipacion_histograma"],
+            {"0-1": 1, "1-3": 1, "3-7": 0, "7-14": 1, "14-30": 0, "30-60": 0, "60+": 0},
+        )
+
+    def test_ventana_sin_datos(self):
+        # martes-miércoles: el doctor sigue apareciendo por tener horario
+        data = calcular_ocupacion(
+            self.desde + timedelta(days=1), self.desde + timedelta(days=2)
+        )
+        self.assertEqual(data["doctores"][0]["slots_ofrecidos"], 0)
+        self.assertEqual(data["doctores"][0]["citas"], 0)
+        self.assertEqual(data["doctores"][0]["ocupacion"], 0.0)
+        self.assertIsNone(data["doctores"][0]["anticipacion_dias"]["media"])
+
+    def test_endpoint_solo_admin(self):
+        client = APIClient()
+        client.force_authenticate(self.doctor)
+        url = reverse("analitica-ocupacion")
+        self.assertEqual(client.get(url).status_code, 403)
+
+        client.force_authenticate(self.admin)
+        response = client.get(
+            url,
+            {"desde": self.desde.isoformat(), "hasta": self.hasta.isoformat()},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["doctores"][0]["citas"], 3)
+        self.assertEqual(
+            client.get(url, {"desde": "2026-02-01", "hasta": "2026-01-01"}).status_code,
+            400,
+        )
+
+
+class ExportacionTests(DatosCitasMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(crear_usuario("5550000009", role="ADMIN"))
+
+    def test_iterar_keyset_por_lotes(self):
+        qs = Pago.objects.all()
+        # 24 pagos en lotes de 5 -> 5 queries acotadas
+        with self.assertNumQueries(5):
+            filas = list(iterar_keyset(qs, ("-fecha", "-id"), ["id"], tamano_lote=5))
+        self.assertEqual(
+            [fila[0] for fila in filas],
+            list(qs.order_by("-fecha", "-id").values_list("id", flat=True)),
+        )
+
+    def test_csv_streaming_con_filtros(self):
+        Cita.objects.filter(pk=self.cita.pk).update(estado="X")
+        response = self.client.get(reverse("citas-exportar"), {"estado": "P"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn("attachment", response["Content-Disposition"])
+
+        contenido = b"".join(response.streaming_content).decode("utf-8-sig")
+        filas = list(csv.reader(io.StringIO(contenido)))
+        self.assertEqual(filas[0][:3], ["ID", "Fecha y hora", "Estado"])
+        self.assertEqual(len(filas) - 1, 11)
+        self.assertNotIn(str(self.cita.pk), [fila[0] for fila in filas[1:]])
+
+    def test_xlsx(self):
+        response = self.client.get(reverse("pagos-exportar"), {"formato": "xlsx"})
+        self.assertEqual(response.status_code, 200)
+        libro = load_workbook(io.BytesIO(b"".join(response.streaming_content)))
+        filas = list(libro.active.values)
+        self.assertEqual(filas[0][0], "ID")
+        self.assertEqual(len(filas) - 1, 24)
+        self.assertEqual(filas[1][9], 900)
+
+    @override_settings(EXPORTACION_MAX_FILAS_XLSX=10)
+    def test_xlsx_limite_de_filas(self):
+        response = self.client.get(reverse("pagos-exportar"), {"formato": "xlsx"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["detail"].code, "exportacion_demasiado_grande")
+
+        response = self.client.get(reverse("pagos-exportar"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_csv_escapa_formulas(self):
+        self.paciente.nombre = "=HYPERLINK(\"http://x\")"
+        self.paciente.apellidos = "@SUM(A1)"
+        self.paciente.save()
+        response = self.client.get(reverse("pacientes-exportar"))
+        contenido = b"".join(response.streaming_content).decode("utf-8-sig")
+        fila = next(
+            f for f in csv.reader(io.StringIO(contenido)) if f[0] == str(self.paciente.pk)
+        )
+        self.assertEqual(fila[1], "'=HYPERLINK(\"http://x\")")
+        self.assertEqual(fila[2], "'@SUM(A1)")
+
+    def test_pacientes_y_validaciones(self):
+        response = self.client.get(reverse("pacientes-exportar"))
+        contenido = b"".join(response.streaming_content).decode("utf-8-sig")
+        self.assertEqual(len(contenido.strip().splitlines()) - 1, 13)
+
+        response = self.client.get(reverse("citas-exportar"), {"formato": "pdf"})
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(self.doctor)
+        response = self.client.get(reverse("citas-exportar"))
+        self.assertEqual(response.status_code, 403)
+
+
+class ConsentimientoPdfCacheTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(CONSENTIMIENTO_PDF_CACHE_DIR=directorio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        especialidad = Especialidad.objects.create(
+            nombre="DERMATOLOGIA", requiere_consentimiento=True
+        )
+        doctor = crear_usuario("5550000001", role="DERMATOLOGO", especialidad=especialidad)
+        self.paciente = crear_usuario("5550000002")
+        self.cita = Cita.objects.create(
+            paciente=self.paciente,
+            doctor=doctor,
+            especialidad=especialidad,
+            fecha_hora=proximo_lunes(9),
+        )
+        self.consentimiento = Consentimiento.objects.create(
+            cita=self.cita,
+            diagnostico_principal="Dermatitis",
+            fecha=timezone.localdate(),
+            hora=time(9),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.paciente)
+        self.url = reverse("cita-consentimiento-descargar", args=[self.cita.pk])
+
+    def _descargar(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def test_hit_cuesta_una_query(self):
+        primero = self._descargar()
+        self.assertTrue(primero.startswith(b"%PDF"))
+
+        with self.assertNumQueries(1):
+            segundo = self._descargar()
+        self.assertEqual(primero, segundo)
+
+    def test_guardar_consentimiento_invalida(self):
+        primero = self._descargar()
+        self.consentimiento.diagnostico_principal = "Psoriasis"
+        self.consentimiento.save()
+        segundo = self._descargar()
+        self.assertNotEqual(primero, segundo)
+
+    def test_version_nueva_borra_la_anterior(self):
+        directorio = Path(settings.CONSENTIMIENTO_PDF_CACHE_DIR) / str(
+            self.consentimiento.pk
+        )
+        self._descargar()
+        anterior = {p.name for p in directorio.iterdir()}
+
+        # Cambiar al paciente cambia la huella sin pasar por la señal
+        User.objects.filter(pk=self.paciente.pk).update(nombre="Otro")
+        self._descargar()
+
+        actuales = {p.name for p in directorio.iterdir()}
+        self.assertEqual(len(actuales), 1)
+        self.assertNotEqual(actuales, anterior)
+
+
+class CitaAtendidaTests(TestCase):
+    def setUp(self):
+        especialidad = Especialidad.objects.create(nombre="PODOLOGIA")
+        self.doctor = crear_usuario("5550000001", role="PODOLOGO", especialidad=especialidad)
+        self.paciente = crear_usuario("5550000002")
+        self.cita = Cita.objects.create(
+            paciente=self.paciente,
+            doctor=self.doctor,
+            especialidad=especialidad,
+            fecha_hora=proximo_lunes(9),
+            estado="C",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+
+    def _post(self, url, datos):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.post(
+                reverse(url),
+                {"paciente": self.paciente.pk, "cita": self.cita.pk, **datos},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201, response.content)
+        return response, [q["sql"] for q in consultas.captured_queries]
+
+    def test_un_solo_recalculo_por_escritura(self):
+        response, sqls = self._post(
+            "recetas-list-create", {"medicamentos": [{"nombre": "Terbinafina"}]}
+        )
+        receta_id = response.data["id"]
+        # La receta recién creada ya es su mitad: solo se consulta el reporte
+        self.assertEqual(
+            sum('FROM "users_reportepaciente"' in sql for sql in sqls), 1
+        )
+        self.cita.refresh_from_db()
+        self.assertFalse(self.cita.atendida)
+
+        response, sqls = self._post(
+            "reportes-list-create", {"resumen": "Onicomicosis", "estado": "FINAL"}
+        )
+        self.assertEqual(
+            sum(
+                'FROM "users_reportepaciente"' in sql and "FINAL" in sql
+                for sql in sqls
+            ),
+            0,
+        )
+        self.cita.refresh_from_db()
+        self.assertTrue(self.cita.atendida)
+        self.assertEqual(self.cita.actualizado_por, self.doctor)
+
+        # Borrar la receta apaga el flag sin consultar nada más
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.delete(reverse("receta-detail", args=[receta_id]))
+        self.assertFalse(
+            any("EXISTS" in q["sql"] or 'AS "a"' in q["sql"] for q in consultas.captured_queries)
+        )
+        self.cita.refresh_from_db()
+        self.assertFalse(self.cita.atendida)
+
+    def test_mitad_conocida_en_falso_no_consulta(self):
+        with self.assertNumQueries(0):
+            self.cita.actualizar_atendida(reporte_final=False)
+        with self.assertNumQueries(1):
+            self.cita.actualizar_atendida(receta=True)
+
+
+class RecetaMedicamentosTests(TestCase):
+    def setUp(self):
+        especialidad = Especialidad.objects.create(nombre="PODOLOGIA")
+        self.doctor = crear_usuario("5550000001", role="PODOLOGO", especialidad=especialidad)
+        self.paciente = crear_usuario("5550000002")
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+
+    def _crear(self, n):
+        response = self.client.post(
+            reverse("recetas-list-create"),
+            {
+                "paciente": self.paciente.pk,
+                "medicamentos": [{"nombre": f"Med {i}", "dosis": "1"} for i in range(n)],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.data
+
+    def _editar(self, receta):
+        # Cambia uno, conserva el resto, quita el último y agrega dos
+        meds = [dict(med) for med in receta["medicamentos"][:-1]]
+        meds[0]["dosis"] = "2"
+        meds += [{"nombre": "Nuevo A"}, {"nombre": "Nuevo B"}]
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.patch(
+                reverse("receta-detail", args=[receta["id"]]),
+                {"medicamentos": meds},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data, len(consultas.captured_queries)
+
+    def test_queries_constantes(self):
+        with CaptureQueriesContext(connection) as pocas:
+            self._crear(3)
+        with CaptureQueriesContext(connection) as muchas:
+            chica = self._crear(30)
+        self.assertEqual(len(pocas.captured_queries), len(muchas.captured_queries))
+
+        _, queries_chica = self._editar(self._crear(3))
+        _, queries_grande = self._editar(chica)
+        self.assertEqual(queries_chica, queries_grande)
+
+    def test_diff_conserva_ids(self):
+        receta = self._crear(4)
+        ids = [med["id"] for med in receta["medicamentos"]]
+
+        editada, _ = self._editar(receta)
+        por_nombre = {med["nombre"]: med for med in editada["medicamentos"]}
+        self.assertEqual(
+            [por_nombre[f"Med {i}"]["id"] for i in range(3)], ids[:3]
+        )
+        self.assertEqual(por_nombre["Med 0"]["dosis"], "2")
+        self.assertNotIn("Med 3", por_nombre)
+        self.assertFalse(RecetaMedicamento.objects.filter(pk=ids[3]).exists())
+        self.assertEqual(
+            RecetaMedicamento.objects.filter(receta_id=receta["id"]).count(), 5
+        )
+
+    def test_sin_cambios_no_escribe_medicamentos(self):
+        receta = self._crear(3)
+        # Cliente que no reenvía ids: se emparejan en orden
+        meds = [
+            {k: v for k, v in med.items() if k != "id"}
+            for med in receta["medicamentos"]
+        ]
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.patch(
+                reverse("receta-detail", args=[receta["id"]]),
+                {"medicamentos": meds},
+                format="json",
+            )
+        escrituras = [
+            q["sql"]
+            for q in consultas.captured_queries
+            if "users_recetamedicamento" in q["sql"]
+            and not q["sql"].startswith("SELECT")
+        ]
+        self.assertEqual(escrituras, [])
+
+    def test_patch_parcial_conserva_campos_omitidos(self):
+        receta = self._crear(1)
+        med = receta["medicamentos"][0]
+        RecetaMedicamento.objects.filter(pk=med["id"]).update(
+            frecuencia="Cada 8 horas", notas="Con alimentos"
+        )
+        response = self.client.patch(
+            reverse("receta-detail", args=[receta["id"]]),
+            {"medicamentos": [{"id": med["id"], "dosis": "3"}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        actual = RecetaMedicamento.objects.get(pk=med["id"])
+        self.assertEqual(
+            (actual.nombre, actual.dosis, actual.frecuencia, actual.notas),
+            ("Med 0", "3", "Cada 8 horas", "Con alimentos"),
+        )
+
+    def test_rechaza_id_ajeno(self):
+        otra = self._crear(1)
+        receta = self._crear(1)
+        response = self.client.patch(
+            reverse("receta-detail", args=[receta["id"]]),
+            {"medicamentos": [otra["medicamentos"][0]]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class HorarioDisponibleRangoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.especialidad = Especialidad.objects.create(nombre="PODOLOGIA")
+        self.doctor = crear_usuario(
+            "5550000001", role="PODOLOGO", especialidad=self.especialidad
+        )
+        for hora in (9, 10):
+            Horario.objects.create(
+                doctor=self.doctor,
+                especialidad=self.especialidad,
+                dia_semana=1,
+                hora_inicio=time(hora),
+                hora_fin=time(hora + 1),
+            )
+        self.paciente = crear_usuario("5550000002")
+        self.client = APIClient()
+        self.client.force_authenticate(self.paciente)
+        self.lunes = proximo_lunes().date()
+
+    def _rango(self, desde, hasta, **extra):
+        params = {"especialidad": self.especialidad.pk, **extra}
+        if desde is not None:
+            params["fecha_desde"] = str(desde)
+        if hasta is not None:
+            params["fecha_hasta"] = str(hasta)
+        return self.client.get(reverse("horarios-disponibles"), params)
+
+    def _cita(self, hora, estado):
+        return Cita.objects.create(
+            paciente=self.paciente,
+            doctor=self.doctor,
+            especialidad=self.especialidad,
+            fecha_hora=proximo_lunes(hora),
+            estado=estado,
+        )
+
+    def test_validaciones(self):
+        casos = {
+            "sin fecha_hasta": self._rango(self.lunes, None),
+            "rango invertido": self._rango(self.lunes, self.lunes - timedelta(days=1)),
+            "rango excedido": self._rango(
+                self.lunes, self.lunes + timedelta(days=MAX_DIAS_RANGO)
+            ),
+            "formato": self._rango("2024-13-01", self.lunes),
+            "sin especialidad": self.client.get(
+                reverse("horarios-disponibles"),
+                {"fecha_desde": str(self.lunes), "fecha_hasta": str(self.lunes)},
+            ),
+        }
+        for caso, response in casos.items():
+            with self.subTest(caso):
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.data)
+
+        response = self._rango(
+            self.lunes, self.lunes + timedelta(days=MAX_DIAS_RANGO - 1)
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_un_arreglo_por_dia(self):
+        domingo = self.lunes + timedelta(days=6)
+        response = self._rango(self.lunes, domingo)
+        self.assertEqual(response.status_code, 200)
+        dias = response.data["dias"]
+        self.assertEqual(
+            list(dias),
+            [str(self.lunes + timedelta(days=i)) for i in range(7)],
+        )
+        self.assertEqual(dias[str(self.lunes)], ["09:00", "10:00"])
+        self.assertEqual(dias[str(domingo)], [])
+
+    def test_canceladas_no_bloquean(self):
+        self._cita(9, "X")
+        self._cita(10, "P")
+        dias = self._rango(self.lunes, self.lunes).data["dias"]
+        self.assertEqual(dias[str(self.lunes)], ["09:00"])
+
+        otro = crear_usuario("5550000003", role="PODOLOGO", especialidad=self.especialidad)
+        dias = self._rango(self.lunes, self.lunes, doctor=otro.pk).data["dias"]
+        self.assertEqual(dias[str(self.lunes)], [])
+
+    def test_queries_fijas_en_31_dias(self):
+        for semana in range(4):
+            Cita.objects.create(
+                paciente=self.paciente,
+                doctor=self.doctor,
+                especialidad=self.especialidad,
+                fecha_hora=proximo_lunes(9) + timedelta(weeks=semana),
+            )
+        # Horarios de la especialidad + fecha_hora ocupadas de la ventana
+        with self.assertNumQueries(2):
+            response = self._rango(self.lunes, self.lunes + timedelta(days=30))
+        dias = response.data["dias"]
+        self.assertEqual(len(dias), 31)
+        self.assertEqual(
+            [dias[str(self.lunes + timedelta(weeks=i))] for i in range(5)],
+            [["10:00"]] * 4 + [["09:00", "10:00"]],
+        )
+        # Con los horarios ya en cache solo queda la de ocupadas
+        with self.assertNumQueries(1):
+            self._rango(self.lunes, self.lunes + timedelta(days=30))
+
+
+class HorarioSemanaTests(TestCase):
+    def setUp(self):
+        self.especialidad = Especialidad.objects.create(nombre="PODOLOGIA")
+        self.doctor = crear_usuario(
+            "5550000001", role="PODOLOGO", especialidad=self.especialidad
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+        self.url = reverse("horarios-semana")
+
+    def _semana(self, bloques):
+        return self.client.put(
+            self.url,
+            {
+                "horarios": [
+                    {"dia_semana": dia, "hora_inicio": inicio, "hora_fin": fin}
+                    for dia, inicio, fin in bloques
+                ]
+            },
+            format="json",
+        )
+
+    def test_reemplaza_semana_con_diff(self):
+        response = self._semana(
+            [(dia, f"{h:02d}:00", f"{h + 1:02d}:00") for dia in range(1, 6) for h in (9, 10, 11)]
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data["creados"], 15)
+        conservado = Horario.objects.get(doctor=self.doctor, dia_semana=1, hora_inicio=time(9))
+
+        # Quita el viernes, alarga lunes 11:00 y agrega sábado
+        bloques = [
+            (dia, f"{h:02d}:00", f"{h + 1:02d}:00") for dia in range(1, 5) for h in (9, 10)
+        ] + [(dia, "11:00", "12:00") for dia in range(2, 5)]
+        bloques += [(1, "11:00", "13:00"), (6, "09:00", "10:00")]
+        # Lock del doctor, lectura, delete (con su select), update, insert,
+        # savepoint x2 y la semana resultante: no crece con los bloques
+        with self.assertNumQueries(9):
+            response = self._semana(bloques)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            (response.data["creados"], response.data["actualizados"], response.data["eliminados"]),
+            (1, 1, 3),
+        )
+        self.assertTrue(Horario.objects.filter(pk=conservado.pk).exists())
+        self.assertEqual(len(response.data["horarios"]), 13)
+
+    def test_rechaza_traslapes(self):
+        response = self._semana(
+            [(1, "09:00", "11:00"), (1, "11:00", "12:00"), (1, "10:30", "10:45"), (2, "10:30", "10:45")]
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.data["horarios"]), 1)
+        self.assertIn("Lunes", response.data["horarios"][0])
+        self.assertFalse(Horario.objects.exists())
+
+    def test_invalida_disponibilidad(self):
+        fecha = proximo_lunes(9).date()
+        self._semana([(1, "09:00", "10:00")])
+        antes = calcular_disponibilidad(self.especialidad.pk, fecha, fecha)
+        with self.captureOnCommitCallbacks(execute=True):
+            self._semana([(1, "09:00", "10:00"), (1, "12:00", "13:00")])
+        despues = calcular_disponibilidad(self.especialidad.pk, fecha, fecha)
+        self.assertNotEqual(antes, despues)
+
+    def test_admin_requiere_doctor(self):
+        self.client.force_authenticate(crear_usuario("5550000009", role="ADMIN"))
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        response = self.client.get(self.url, {"doctor": self.doctor.pk})
+        self.assertEqual(response.status_code, 200)
+
+
+class CitaTransicionTests(TestCase):
+    def setUp(self):
+        self.especialidad = Especialidad.objects.create(nombre="PODOLOGIA")
+        self.doctor = crear_usuario(
+            "5550000001", role="PODOLOGO", especialidad=self.especialidad
+        )
+        self.otro_doctor = crear_usuario(
+            "5550000002", role="PODOLOGO", especialidad=self.especialidad
+        )
+        self.admin = crear_usuario("5550000009", role="ADMIN")
+        self.pacientes = [crear_usuario(f"555000010{i}") for i in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.url = reverse("citas-transicion")
+        self.hora = 8
+
+    def _cita(self, paciente, doctor=None, **extra):
+        self.hora += 1
+        return Cita.objects.create(
+            paciente=paciente,
+            doctor=doctor or self.doctor,
+            especialidad=self.especialidad,
+            fecha_hora=proximo_lunes(self.hora),
+            **extra,
+        )
+
+    def _transicion(self, ids, accion):
+        return self.client.post(
+            self.url, {"ids": ids, "accion": accion}, format="json"
+        )
+
+    def test_confirma_en_lote_con_queries_fijas(self):
+        p1, p2, p3 = self.pacientes
+        existente = Tratamiento.objects.create(paciente=p1, doctor=self.doctor)
+        citas = [
+            self._cita(p1),
+            self._cita(p2),
+            self._cita(p2),
+            self._cita(p3, tipo="S"),
+        ]
+        cancelada = self._cita(p3, estado="X")
+        pago = Pago.objects.create(
+            paciente=p2, cita=citas[1], total=Decimal("500.00"), pagado=Decimal("0.00")
+        )
+        ids = [c.pk for c in citas] + [cancelada.pk, 999999]
+
+        # Citas (for update), pagos, tratamientos activos, insert de
+        # tratamientos, update de citas, update de pagos y el savepoint
+        with self.assertNumQueries(8):
+            response = self._transicion(ids, "confirmar")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((response.data["procesadas"], response.data["omitidas"]), (4, 2))
+        self.assertEqual(response.data["tratamientos_creados"], 1)
+        self.assertEqual([r["id"] for r in response.data["resultados"]], ids)
+        self.assertEqual(
+            [r["ok"] for r in response.data["resultados"]],
+            [True, True, True, True, False, False],
+        )
+        self.assertTrue(response.data["resultados"][1]["pago_asociado"])
+
+        for cita in citas:
+            cita.refresh_from_db()
+            self.assertEqual(cita.estado, "C")
+            self.assertEqual(cita.actualizado_por, self.admin)
+        self.assertEqual(citas[0].tratamiento, existente)
+        self.assertIsNotNone(citas[1].tratamiento)
+        self.assertEqual(citas[1].tratamiento, citas[2].tratamiento)
+        self.assertIsNone(citas[3].tratamiento)
+
+        pago.refresh_from_db()
+        self.assertEqual(pago.estado_pago, "APROBADO")
+        self.assertTrue(pago.verificado)
+        self.assertEqual(pago.pagado, pago.total)
+
+    def test_doctor_solo_procesa_sus_citas(self):
+        propia = self._cita(self.pacientes[0])
+        ajena = self._cita(self.pacientes[1], doctor=self.otro_doctor)
+        self.client.force_authenticate(self.doctor)
+
+        response = self._transicion([propia.pk, ajena.pk], "cancelar")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [r["ok"] for r in response.data["resultados"]], [True, False]
+        )
+        ajena.refresh_from_db()
+        self.assertEqual(ajena.estado, "P")
+
+    def test_cancelar_confirmadas_solo_admin(self):
+        confirmada = self._cita(self.pacientes[0], estado="C")
+        self.client.force_authenticate(self.doctor)
+        response = self._transicion([confirmada.pk], "cancelar")
+        self.assertFalse(response.data["resultados"][0]["ok"])
+
+        self.client.force_authenticate(self.admin)
+        with mock.patch.object(dashboard_paciente, "invalidar") as invalidar:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self._transicion([confirmada.pk], "cancelar")
+        self.assertEqual(response.data["resultados"][0]["estado"], "X")
+        invalidar.assert_called_once_with(self.pacientes[0].pk)
+
+    def test_validacion_y_permisos(self):
+        self.assertEqual(self._transicion([], "confirmar").status_code, 400)
+        self.assertEqual(self._transicion([1], "borrar").status_code, 400)
+        self.client.force_authenticate(self.pacientes[0])
+        self.assertEqual(self._transicion([1], "cancelar").status_code, 403)
+
+
+class CacheCompartidoTests(SimpleTestCase):
+    def _backend_con(self, **env):
+        entorno = {
+            k: v
+            for k, v in os.environ.items()
+            if k not in ("DB_ENGINE", "REDIS_URL")
+        }
+        entorno.update(env)
+        salida = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import backend.settings as s; print(s.CACHES['default']['BACKEND'])",
+            ],
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+            env=entorno,
+            check=True,
+        )
+        return salida.stdout.strip().rsplit(".", 1)[-1]
+
+    def test_settings_elige_cache_compartido(self):
+        self.assertEqual(self._backend_con(), "DatabaseCache")
+        self.assertEqual(
+            self._backend_con(REDIS_URL="redis://localhost:6379/0"), "RedisCache"
+        )
+        self.assertEqual(self._backend_con(DB_ENGINE="sqlite"), "LocMemCache")
+
+    def test_check_avisa_locmem_fuera_de_sqlite(self):
+        locmem = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        db = {"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache"}}
+        for caches, vendor, ids in (
+            (locmem, "mysql", ["users.W001"]),
+            (db, "mysql", []),
+            (locmem, "sqlite", []),
+        ):
+            with self.subTest(cache=caches, vendor=vendor), override_settings(
+                CACHES=caches
+            ), mock.patch.object(connections["default"], "vendor", vendor):
+                self.assertEqual([w.id for w in cache_compartido(None)], ids)
+
+
+class AutenticacionCacheadaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.especialidad = Especialidad.objects.create(nombre="PODOLOGIA")
+        self.doctor = crear_usuario(
+            "5550000001", role="PODOLOGO", especialidad=self.especialidad
+        )
+        self.client = APIClient()
+        response = self.client.post(
+            reverse("login"),
+            {"telefono": "5550000001", "password": "clave12345"},
+            format="json",
+        )
+        self.access = response.data["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access}")
+        self.url = reverse("verify-auth")
+
+    def test_token_lleva_rol(self):
+        self.assertEqual(AccessToken(self.access)["role"], "PODOLOGO")
+
+    def test_usuario_sale_de_cache(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_especialidad_sin_query(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            # Solo la semana de horarios; doctor y especialidad vienen del cache
+            response = self.client.get(reverse("horarios-semana"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_desactivar_invalida(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.doctor.is_active = False
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.doctor.save()
+            # Antes del commit la entrada sigue vigente
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        for callback in callbacks:
+            callback()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data["detail"].code, "user_inactive")
+
+    def test_escrituras_no_usan_cache(self):
+        self.client.get(self.url)
+        # Sin señal: simula un worker cuyo cache aún no ve el cambio
+        User.objects.filter(pk=self.doctor.pk).update(is_active=False)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        response = self.client.post(
+            reverse("citas-transicion"), {"ids": [], "accion": "cancelar"}, format="json"
+        )
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data["detail"].code, "user_inactive")
+
+    def test_cambio_de_rol_rechaza_token(self):
+        self.client.get(self.url)
+        self.doctor.role = "DERMATOLOGO"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data["detail"].code, "role_changed")
+
+
+class FirmaConsentimientoTests(TestCase):
+    def setUp(self):
+        for nombre in ("CONSENTIMIENTO_PDF_CACHE_DIR", "MEDIA_ROOT"):
+            directorio = tempfile.TemporaryDirectory()
+            self.addCleanup(directorio.cleanup)
+            ajustes = override_settings(**{nombre: directorio.name})
+            ajustes.enable()
+            self.addCleanup(ajustes.disable)
+
+        especialidad = Especialidad.objects.create(
+            nombre="DERMATOLOGIA", requiere_consentimiento=True
+        )
+        doctor = crear_usuario("5550000001", role="DERMATOLOGO", especialidad=especialidad)
+        self.paciente = crear_usuario("5550000002")
+        self.cita = Cita.objects.create(
+            paciente=self.paciente,
+            doctor=doctor,
+            especialidad=especialidad,
+            fecha_hora=proximo_lunes(9),
+            estado="C",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.paciente)
+
+    @staticmethod
+    def _lienzo(ancho=2400, alto=1200, grosor=12, trazo=None):
+        # Lo que manda el canvas: RGBA a resolución de pantalla, trazo
+        # negro sobre fondo transparente con mucho margen.
+        lienzo = Image.new("RGBA", (ancho, alto), (0, 0, 0, 0))
+        ImageDraw.Draw(lienzo).line(
+            trazo or [(800, 700), (1100, 500), (1400, 650), (1600, 550)],
+            fill=(0, 0, 0, 255),
+            width=grosor,
+        )
+        archivo = io.BytesIO()
+        lienzo.save(archivo, format="PNG")
+        archivo.name = "firma.png"
+        archivo.seek(0)
+        return archivo
+
+    @staticmethod
+    def _trazo_amplio(ancho, alto):
+        # Firma que ocupa casi todo el lienzo: la reducción es máxima
+        return [
+            (ancho * x // 100, alto * y // 100)
+            for x, y in ((5, 60), (25, 20), (45, 80), (65, 30), (95, 55))
+        ]
+
+    @staticmethod
+    def _pixeles_tinta(contenido):
+        with Image.open(contenido) as imagen:
+            return imagen.convert("L").histogram()[0]
+
+    def _firmar(self, **kwargs):
+        archivo = self._lienzo(**kwargs)
+        return self.client.post(
+            reverse("cita-consentimiento", args=[self.cita.pk]),
+            {"firma_paciente": archivo},
+            format="multipart",
+        )
+
+    def test_firma_se_guarda_normalizada(self):
+        response = self._firmar()
+        self.assertEqual(response.status_code, 201, response.content)
+
+        firma = Consentimiento.objects.get(cita=self.cita).firma_paciente
+        with firma.open("rb") as archivo, Image.open(archivo) as imagen:
+            self.assertEqual(imagen.format, "PNG")
+            self.assertEqual(imagen.mode, "1")
+            self.assertLessEqual(imagen.width, FIRMA_ANCHO_PX)
+            self.assertLessEqual(imagen.height, FIRMA_ALTO_PX)
+            # Recortada al trazo (800x200 + grosor), no al lienzo de 2:1
+            self.assertGreater(imagen.width / imagen.height, 3)
+        self.assertLess(firma.size, 10 * 1024)
+
+    def test_trazo_delgado_en_lienzo_grande_conserva_tinta(self):
+        for ancho, alto in ((1600, 800), (2400, 1200)):
+            for grosor in (1, 2):
+                with self.subTest(ancho=ancho, grosor=grosor):
+                    firma = normalizar_firma(
+                        self._lienzo(
+                            ancho, alto, grosor, self._trazo_amplio(ancho, alto)
+                        )
+                    )
+                    self.assertGreater(self._pixeles_tinta(firma), 0)
+
+        response = self._firmar(grosor=1, trazo=self._trazo_amplio(2400, 1200))
+        self.assertEqual(response.status_code, 201, response.content)
+        firma = Consentimiento.objects.get(cita=self.cita).firma_paciente
+        with firma.open("rb") as archivo:
+            self.assertGreater(self._pixeles_tinta(archivo), 0)
+
+    def test_firma_bomba_de_descompresion_es_error_de_validacion(self):
+        archivo = io.BytesIO()
+        Image.new("L", (200, 100), 255).save(archivo, format="PNG")
+        # 20000 px supera 2x el límite -> DecompressionBombError
+        with mock.patch.object(Image, "MAX_IMAGE_PIXELS", 1000):
+            with self.assertRaises(serializers.ValidationError):
+                normalizar_firma(archivo)
+
+    def test_pdf_lee_firma_por_storage_y_cache(self):
+        self.assertEqual(self._firmar().status_code, 201)
+        consentimiento = Consentimiento.objects.select_related(
+            "cita__paciente", "cita__doctor", "cita__especialidad"
+        ).get(cita=self.cita)
+        storage = consentimiento.firma_paciente.storage
+
+        # Como en Cloudinary: el archivo no expone ruta local
+        sin_ruta = mock.PropertyMock(side_effect=NotImplementedError)
+        with mock.patch.object(FieldFile, "path", sin_ruta), mock.patch.object(storage, "open", wraps=storage.open) as abrir:
+            pdf = build_consentimiento_pdf(consentimiento.cita, consentimiento)
+            build_consentimiento_pdf(consentimiento.cita, consentimiento)
+
+        self.assertIn(b"/Subtype /Image", pdf)
+        self.assertEqual(abrir.call_count, 1)
+
+    def test_firma_vacia_rechazada(self):
+        archivo = io.BytesIO()
+        Image.new("RGBA", (600, 300), (0, 0, 0, 0)).save(archivo, format="PNG")
+        archivo.name = "firma.png"
+        archivo.seek(0)
+        response = self.client.post(
+            reverse("cita-consentimiento", args=[self.cita.pk]),
+            {"firma_paciente": archivo},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Consentimiento.objects.filter(cita=self.cita).exists())
+
+
+class TrabajosDocumentosTests(TestCase):
+    def setUp(self):
+        for nombre in ("CONSENTIMIENTO_PDF_CACHE_DIR", "DOCUMENTOS_TRABAJOS_DIR"):
+            directorio = tempfile.TemporaryDirectory()
+            self.addCleanup(directorio.cleanup)
+            ajustes = override_settings(**{nombre: directorio.name})
+            ajustes.enable()
+            self.addCleanup(ajustes.disable)
+
+        especialidad = Especialidad.objects.create(
+            nombre="DERMATOLOGIA", requiere_consentimiento=True
+        )
+        doctor = crear_usuario("5550000001", role="DERMATOLOGO", especialidad=especialidad)
+        self.paciente = crear_usuario("5550000002")
+        otro = crear_usuario("5550000003")
+        for i, paciente in enumerate([self.paciente, self.paciente, otro]):
+            cita = Cita.objects.create(
+                paciente=paciente,
+                doctor=doctor,
+                especialidad=especialidad,
+                fecha_hora=proximo_lunes(9) + timedelta(hours=i),
+            )
+            Consentimiento.objects.create(
+                cita=cita, fecha=timezone.localdate(), hora=time(9)
+            )
+
+        self.admin = crear_usuario("5550000009", role="ADMIN")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_zip_por_paciente(self):
+        response = self.client.post(
+            reverse("trabajo-consentimientos-zip"),
+            {"paciente": self.paciente.id},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 202)
+        trabajo_id = response.json()["id"]
+        self.assertEqual(response.json()["estado"], "PENDIENTE")
+
+        descarga = reverse("trabajo-descargar", args=[trabajo_id])
+        self.assertEqual(self.client.get(descarga).status_code, 409)
+
+        call_command("procesar_trabajos", procesos=0, una_vez=True, stdout=io.StringIO())
+
+        data = self.client.get(reverse("trabajo-detail", args=[trabajo_id])).json()
+        self.assertEqual(data["estado"], "COMPLETADO")
+        self.assertEqual(data["documentos"], 2)
+        self.assertIsNotNone(data["espera_segundos"])
+        self.assertTrue(data["descarga_url"].endswith(descarga))
+
+        trabajo = TrabajoDocumento.objects.get(pk=trabajo_id)
+        self.assertTrue(trabajo.archivo.name.startswith("trabajos/"))
+        # La descarga pasa por el storage, sin rutas locales (storage remoto)
+        with mock.patch.object(
+            FieldFile, "path", new_callable=mock.PropertyMock, side_effect=NotImplementedError
+        ):
+            response = self.client.get(descarga)
+            self.assertEqual(response.status_code, 200)
+            contenido = b"".join(response.streaming_content)
+        archivo = zipfile.ZipFile(io.BytesIO(contenido))
+        self.assertEqual(len(archivo.namelist()), 2)
+
+        metricas = self.client.get(reverse("trabajo-metricas")).json()
+        self.assertEqual(metricas["completados"], 1)
+        self.assertEqual(metricas["pendientes"], 0)
+
+    def test_worker_reencola_huerfanos_y_cuenta(self):
+        huerfano = TrabajoDocumento.objects.create(
+            tipo="CONSENTIMIENTOS_ZIP",
+            parametros={"paciente": self.paciente.id},
+            estado="EN_PROCESO",
+            intentos=1,
+            iniciado_en=timezone.now() - timedelta(hours=1),
+        )
+        salida = io.StringIO()
+        call_command("procesar_trabajos", procesos=0, una_vez=True, stdout=salida)
+        huerfano.refresh_from_db()
+        self.assertEqual((huerfano.estado, huerfano.intentos), ("COMPLETADO", 2))
+        self.assertIn("Reencolados 1", salida.getvalue())
+        self.assertIn("1 trabajos (2 documentos)", salida.getvalue())
+
+    def test_solo_reencola_sin_latido(self):
+        trabajo = TrabajoDocumento.objects.create(
+            tipo="CONSENTIMIENTOS_ZIP",
+            parametros={"paciente": self.paciente.id},
+            estado="EN_PROCESO",
+            intentos=1,
+            # Lote largo: empezó hace horas pero su worker sigue latiendo
+            iniciado_en=timezone.now() - timedelta(hours=3),
+            latido_en=timezone.now() - timedelta(seconds=20),
+        )
+        self.assertEqual(reencolar_huerfanos(), 0)
+
+        TrabajoDocumento.objects.filter(pk=trabajo.pk).update(
+            latido_en=timezone.now() - LATIDO_VENCIDO - timedelta(seconds=1)
+        )
+        self.assertEqual(reencolar_huerfanos(), 1)
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.latido_en), ("PENDIENTE", None))
+
+    def test_intento_reencolado_no_pisa_al_nuevo(self):
+        trabajo = encolar("CONSENTIMIENTOS_ZIP", {"paciente": self.paciente.id}, self.admin)
+        self.assertEqual(reclamar_siguiente(), trabajo.pk)
+        original = EJECUTORES["CONSENTIMIENTOS_ZIP"]
+
+        def reclamado_a_medias(trabajo):
+            resultado = original(trabajo)
+            # Mientras tanto otro worker lo reencoló y lo volvió a tomar
+            TrabajoDocumento.objects.filter(pk=trabajo.pk).update(
+                intentos=F("intentos") + 1
+            )
+            return resultado
+
+        with mock.patch.dict(EJECUTORES, {"CONSENTIMIENTOS_ZIP": reclamado_a_medias}):
+            resultado = ejecutar_trabajo(trabajo.pk)
+        self.assertEqual(resultado["estado"], "DESCARTADO")
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.archivo.name), ("EN_PROCESO", ""))
+        self.assertEqual(os.listdir(os.path.join(settings.DOCUMENTOS_TRABAJOS_DIR, "trabajos")), [])
+
+    def test_pool_roto_se_reconstruye(self):
+        primero = encolar("CONSENTIMIENTOS_ZIP", {"paciente": self.paciente.id}, self.admin)
+        segundo = encolar("CONSENTIMIENTOS_ZIP", {"paciente": self.paciente.id}, self.admin)
+        _PoolFalso.instancias = []
+        errores = io.StringIO()
+        with mock.patch(
+            "users.management.commands.procesar_trabajos.ProcessPoolExecutor",
+            _PoolFalso,
+        ):
+            call_command(
+                "procesar_trabajos",
+                procesos=1,
+                una_vez=True,
+                stdout=io.StringIO(),
+                stderr=errores,
+            )
+        self.assertEqual(len(_PoolFalso.instancias), 2)
+        primero.refresh_from_db()
+        segundo.refresh_from_db()
+        self.assertEqual(primero.estado, "ERROR")
+        self.assertIn("BrokenProcessPool", primero.error)
+        self.assertEqual(segundo.estado, "COMPLETADO")
+        self.assertIn("Pool de procesos roto", errores.getvalue())
+
+    def test_metricas_sin_nan_ni_inf(self):
+        url = reverse("trabajo-metricas")
+        for horas in ("nan", "inf", "-1", "100000"):
+            self.assertEqual(self.client.get(url, {"horas": horas}).status_code, 400)
+        response = self.client.get(url, {"horas": "1e-12"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()["trabajos_por_minuto"])
+
+    def test_reclamar_es_exclusivo_y_valida_parametros(self):
+        self.assertEqual(
+            self.client.post(reverse("trabajo-consentimientos-zip"), {}).status_code,
+            400,
+        )
+        trabajo = TrabajoDocumento.objects.create(
+            tipo="CONSENTIMIENTOS_ZIP", parametros={"desde": "2000-01-01"}
+        )
+        self.assertEqual(reclamar_siguiente(), trabajo.id)
+        self.assertIsNone(reclamar_siguiente())
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.intentos), ("EN_PROCESO", 1))
+
+        self.client.force_authenticate(self.paciente)
+        response = self.client.get(reverse("trabajo-detail", args=[trabajo.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class _PoolFalso:
+    """ProcessPoolExecutor en proceso: el primero está roto desde el inicio."""
+
+    instancias = []
+
+    def __init__(self, *args, **kwargs):
+        self.roto = not _PoolFalso.instancias
+        _PoolFalso.instancias.append(self)
+
+    def submit(self, funcion, *args):
+        if self.roto:
+            raise BrokenProcessPool("Un proceso hijo terminó abruptamente")
+        futuro = Future()
+        futuro.set_result(funcion(*args))
+        return futuro
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+class _CanvasRegistro(canvas.Canvas):
+    """Canvas real que además anota (página, y) de cada drawString."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.trazos = []
+
+    def drawString(self, x, y, text, *args, **kwargs):
+        self.trazos.append((self.getPageNumber(), y, text))
+        return super().drawString(x, y, text, *args, **kwargs)
+
+
+class PdfLayoutTests(TestCase):
+    def test_lineas_caben_en_el_ancho(self):
+        texto = "Lesión hiperqueratósica WWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWW plantar. " * 30
+        fuente = metricas("Helvetica", 10)
+        lineas = partir_lineas(texto + "\n\nSegundo párrafo.", fuente, 200)
+
+        for linea in lineas:
+            self.assertLessEqual(stringWidth(linea, "Helvetica", 10), 200)
+        self.assertEqual(lineas[-2:], ["", "Segundo párrafo."])
+        # Sin perder palabras al partir
+        self.assertEqual(
+            "".join(" ".join(lineas[:-2]).split()), "".join(texto.split())
+        )
+
+    def test_salto_de_pagina_exacto(self):
+        c = _CanvasRegistro(io.BytesIO())
+        m = Maquetador(c, 50, 700, 100, 400)
+        m.parrafo("\n".join(f"línea {i}" for i in range(100)), interlineado=14)
+
+        # 700..100 con interlineado 14 -> 43 líneas por página
+        paginas = [pagina for pagina, _y, _texto in c.trazos]
+        self.assertEqual(paginas.count(1), 43)
+        self.assertEqual(m.paginas, 3)
+        self.assertTrue(all(y >= 100 for _pagina, y, _texto in c.trazos))
+
+        # El título no se queda solo al pie
+        m.y = 110
+        m.asegurar_espacio(30)
+        self.assertEqual((m.paginas, m.y), (4, 700))
+
+
+def _jpeg(ancho, alto):
+    imagen = Image.new("RGB", (ancho, alto), "white")
+    dibujo = ImageDraw.Draw(imagen)
+    for x in range(0, ancho, 60):
+        dibujo.line([(x, 0), (ancho - x, alto)], fill=(x % 255, 40, 90), width=3)
+    archivo = io.BytesIO()
+    imagen.save(archivo, format="JPEG", quality=90)
+    return archivo.getvalue()
+
+
+class ComprobantePagoTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=directorio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        especialidad = Especialidad.objects.create(nombre="PODOLOGIA")
+        doctor = crear_usuario("5550000001", role="PODOLOGO", especialidad=especialidad)
+        self.paciente = crear_usuario("5550000002")
+        self.cita = Cita.objects.create(
+            paciente=self.paciente,
+            doctor=doctor,
+            especialidad=especialidad,
+            fecha_hora=proximo_lunes(9),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.paciente)
+
+    def _subir(self, contenido, nombre="comprobante.jpg"):
+        archivo = io.BytesIO(contenido)
+        archivo.name = nombre
+        return self.client.post(
+            reverse("pagos-create"),
+            {"cita": self.cita.pk, "comprobante": archivo},
+            format="multipart",
+        )
+
+    def test_recodifica_y_genera_miniatura(self):
+        response = self._subir(_jpeg(3000, 4000))
+        self.assertEqual(response.status_code, 201, response.content)
+
+        pago = Pago.objects.get(cita=self.cita)
+        for campo, lado in (
+            (pago.comprobante, settings.COMPROBANTE_MAX_LADO),
+            (pago.comprobante_miniatura, settings.COMPROBANTE_MINIATURA_LADO),
+        ):
+            with campo.open("rb") as archivo, Image.open(archivo) as imagen:
+                self.assertEqual(imagen.format, "JPEG")
+                self.assertEqual(max(imagen.size), lado)
+                # Proporción conservada
+                self.assertAlmostEqual(imagen.width / imagen.height, 0.75, places=2)
+        self.assertTrue(response.data["comprobante_miniatura"])
+
+    def test_rechaza_tipo_por_contenido(self):
+        response = self._subir(b"%PDF-1.4 no es una imagen" * 100)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("JPG, PNG o WebP", response.data["comprobante"])
+        self.assertFalse(Pago.objects.exists())
+
+    def test_datos_de_imagen_corruptos_son_400(self):
+        # Pillow lanza ValueError ante modo o paleta inválidos al decodificar
+        with mock.patch(
+            "users.utils.comprobantes.ImageOps.exif_transpose",
+            side_effect=ValueError("bad palette"),
+        ):
+            response = self._subir(_jpeg(400, 300))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("no es una imagen válida", response.data["comprobante"])
+        self.assertFalse(Pago.objects.exists())
+
+    @override_settings(COMPROBANTE_MAX_BYTES=200 * 1024)
+    def test_rechaza_por_tamano_al_recibir(self):
+        contenido = _jpeg(400, 300) + b"\0" * (300 * 1024)
+        response = self._subir(contenido)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("tamaño máximo", response.data["comprobante"])
+        self.assertFalse(Pago.objects.exists())
+
+    @override_settings(COMPROBANTE_MAX_MEMORIA=8 * 1024 * 1024)
+    def test_rechaza_resolucion_sin_decodificar(self):
+        # PNG de 2000x2000: 32 MB de bitmap estimado
+        archivo = io.BytesIO()
+        Image.new("RGB", (2000, 2000), "white").save(archivo, format="PNG")
+        response = self._subir(archivo.getvalue(), "captura.png")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("resolución", response.data["comprobante"])
+
+    def test_memoria_pico_acotada(self):
+        # Foto de 48 MP: decodificada completa serían 144 MB de RGB. Se mide
+        # el RSS máximo en un proceso aparte para no arrastrar el del test.
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as foto:
+            foto.write(_jpeg(6000, 8000))
+            foto.flush()
+            script = (
+                "import resource, sys, django\n"
+                "django.setup()\n"
+                "from users.utils.comprobantes import procesar_comprobante\n"
+                "with open(sys.argv[1], 'rb') as archivo:\n"
+                "    antes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+                "    procesar_comprobante(archivo)\n"
+                "    despues = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+                "print((despues - antes) * 1024)\n"
+            )
+            salida = subprocess.run(
+                [sys.executable, "-c", script, foto.name],
+                capture_output=True,
+                text=True,
+                cwd=settings.BASE_DIR,
+                check=True,
+            )
+        pico = int(salida.stdout.strip().splitlines()[-1])
+        estimado = memoria_pico_estimada(6000, 8000, "JPEG")
+        self.assertLess(estimado, 32 * 1024 * 1024)
+        # Bitmaps estimados + búferes del codificador y del intérprete
+        self.assertLess(pico, estimado + 32 * 1024 * 1024)
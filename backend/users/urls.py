@@ -8,25 +8,38 @@ from .views import (
     AdminUserView,
     LoginView,
     DashboardView,
+    MiDashboardAPI,
     LogoutView,
     EspecialidadListAPI,
     HorarioDisponibleAPI,
     CitaListCreateAPI,
     CitaDetailAPI,
+    CitaExportAPI,
+    AgendaDoctorAPI,
     CitaConfirmAPI,
+    CitaTransicionAPI,
     CitaCancelarPacienteAPI,
     TratamientoAPI,
     PagoListAPI,
+    PagoExportAPI,
+    ResumenIngresosAPI,
+    AnaliticaOcupacionAPI,
     CitaSubsecuenteCreateAPI,
     CitaProgramarSubsecuenteAPI,
     CitaReprogramarAPI,
     VerifyAuthView,
     PagoCreateAPI,
     HorarioCreateAPI,
+    HorarioSemanaAPI,
     TamizResultadosAPI,
     CitaConsentimientoAPI,
     CitaConsentimientoDownloadAPI,
+    TrabajoConsentimientosZipAPI,
+    TrabajoDocumentoDetailAPI,
+    TrabajoDocumentoDescargarAPI,
+    TrabajoMetricasAPI,
     PacienteListAPI,
+    PacienteExportAPI,
     PacienteDetailAPI,
     PacienteCitasListAPI,
     UserListAPI,
@@ -59,6 +72,7 @@ urlpatterns = [
     path("auth/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("create-user/", AdminUserView.as_view(), name="admin-create-user"),
     path("dashboard/<str:role>/", DashboardView.as_view(), name="dashboard"),
+    path("me/dashboard/", MiDashboardAPI.as_view(), name="me-dashboard"),
 
     # Catálogos y horarios
     path("especialidades/", EspecialidadListAPI.as_view(), name="especialidades-list"),
@@ -68,15 +82,23 @@ urlpatterns = [
         name="horarios-disponibles",
     ),
     path("horarios/", HorarioCreateAPI.as_view(), name="horarios-create"),
+    path("horarios/semana/", HorarioSemanaAPI.as_view(), name="horarios-semana"),
 
     # Citas
     path("citas/", CitaListCreateAPI.as_view(), name="citas-list-create"),
+    path("citas/exportar/", CitaExportAPI.as_view(), name="citas-exportar"),
+    path(
+        "citas/transicion/",
+        CitaTransicionAPI.as_view(),
+        name="citas-transicion",
+    ),
     path(
         "citas/subsecuente/",
         CitaSubsecuenteCreateAPI.as_view(),
         name="cita-subsecuente",
     ),
     path("citas/<int:pk>/", CitaDetailAPI.as_view(), name="cita-detail"),
+    path("agenda/", AgendaDoctorAPI.as_view(), name="agenda-doctor"),
     path(
         "citas/<int:pk>/confirmar/",
         CitaConfirmAPI.as_view(),
@@ -108,6 +130,20 @@ urlpatterns = [
         name="cita-consentimiento-descargar",
     ),
 
+    # Trabajos de documentos (cola en BD, ver manage.py procesar_trabajos)
+    path(
+        "trabajos/consentimientos-zip/",
+        TrabajoConsentimientosZipAPI.as_view(),
+        name="trabajo-consentimientos-zip",
+    ),
+    path("trabajos/metricas/", TrabajoMetricasAPI.as_view(), name="trabajo-metricas"),
+    path("trabajos/<int:pk>/", TrabajoDocumentoDetailAPI.as_view(), name="trabajo-detail"),
+    path(
+        "trabajos/<int:pk>/descargar/",
+        TrabajoDocumentoDescargarAPI.as_view(),
+        name="trabajo-descargar",
+    ),
+
     # Tratamientos
     path("tratamiento/", TratamientoAPI.as_view(), name="tratamiento-detail"),
     path(
@@ -118,7 +154,14 @@ urlpatterns = [
 
     # Pagos
     path("pagos/", PagoListAPI.as_view(), name="pagos-list"),
+    path("pagos/exportar/", PagoExportAPI.as_view(), name="pagos-exportar"),
     path("pagos/create/", PagoCreateAPI.as_view(), name="pagos-create"),
+    path("pagos/resumen/", ResumenIngresosAPI.as_view(), name="pagos-resumen"),
+    path(
+        "analitica/ocupacion/",
+        AnaliticaOcupacionAPI.as_view(),
+        name="analitica-ocupacion",
+    ),
     path(
         "pagos/consultorio/",
         PagoConsultorioCreateAPI.as_view(),
@@ -132,6 +175,11 @@ urlpatterns = [
 
     # Pacientes y usuarios
     path("pacientes/", PacienteListAPI.as_view(), name="pacientes-list"),
+    path(
+        "pacientes/exportar/",
+        PacienteExportAPI.as_view(),
+        name="pacientes-exportar",
+    ),
     path("pacientes/<int:pk>/", PacienteDetailAPI.as_view(), name="paciente-detail"),
     path(
         "pacientes/<int:pk>/citas/",
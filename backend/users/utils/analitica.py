@@ -0,0 +1,189 @@
+# archivo: backend/users/utils/analitica.py
+
+import numpy as np
+import pandas as pd
+from django.utils import timezone
+
+from ..models import Cita, Horario, User
+from .fechas import rango_aware
+
+# Ventana máxima del endpoint (varios años de histórico caben en memoria)
+MAX_DIAS_ANALITICA = 366 * 5
+
+# Cortes (en días) del histograma de anticipación: fecha_hora - creado_en
+CORTES_ANTICIPACION = [0, 1, 3, 7, 14, 30, 60, np.inf]
+ETIQUETAS_ANTICIPACION = ["0-1", "1-3", "3-7", "7-14", "14-30", "30-60", "60+"]
+
+
+def _conteo_dias_semana(fecha_desde, fecha_hasta):
+    """
+    Cuántas veces cae cada día de la semana en [fecha_desde, fecha_hasta].
+    Índice 0 = lunes ... 6 = domingo (Horario.dia_semana - 1).
+    """
+    dias = np.arange(
+        np.datetime64(fecha_desde, "D"),
+        np.datetime64(fecha_hasta, "D") + 1,
+    )
+    # 1970-01-01 fue jueves: +3 deja el lunes en 0
+    dia_semana = (dias.astype("int64") + 3) % 7
+    return np.bincount(dia_semana, minlength=7)
+
+
+def cargar_horarios(doctor_ids=None):
+    qs = Horario.objects.all()
+    if doctor_ids:
+        qs = qs.filter(doctor_id__in=doctor_ids)
+    filas = list(qs.values_list("doctor_id", "dia_semana"))
+    if not filas:
+        return np.empty(0, dtype="int64"), np.empty(0, dtype="int8")
+    arr = np.array(filas, dtype="int64")
+    return arr[:, 0], arr[:, 1].astype("int8")
+
+
+def cargar_citas(fecha_desde, fecha_hasta, doctor_ids=None):
+    """
+    Citas de la ventana como columnas compactas:
+    doctor_id (int64), fecha_hora / creado_en (datetime64 UTC),
+    cancelada / atendida (bool).
+    """
+    inicio, fin = rango_aware(fecha_desde, fecha_hasta)
+    qs = Cita.objects.filter(fecha_hora__gte=inicio, fecha_hora__lt=fin)
+    if doctor_ids:
+        qs = qs.filter(doctor_id__in=doctor_ids)
+
+    filas = list(
+        qs.order_by().values_list(
+            "doctor_id", "fecha_hora", "creado_en", "estado", "atendida"
+        )
+    )
+    df = pd.DataFrame.from_records(
+        filas,
+        columns=["doctor_id", "fecha_hora", "creado_en", "estado", "atendida"],
+    )
+    return pd.DataFrame(
+        {
+            "doctor_id": df["doctor_id"].astype("int64"),
+            "fecha_hora": pd.to_datetime(df["fecha_hora"], utc=True),
+            "creado_en": pd.to_datetime(df["creado_en"], utc=True),
+            "cancelada": (df["estado"] == "X").to_numpy(dtype=bool),
+            "atendida": df["atendida"].astype(bool),
+        }
+    )
+
+
+def _tasa(numerador, denominador):
+    return np.divide(
+        numerador,
+        denominador,
+        out=np.zeros(len(numerador), dtype="float64"),
+        where=denominador > 0,
+    )
+
+
+def calcular_ocupacion(fecha_desde, fecha_hasta, doctor_ids=None, ahora=None):
+    """
+    Métricas por doctor en [fecha_desde, fecha_hasta] (fechas inclusive):
+
+      - slots_ofrecidos: Horario semanal x veces que cae ese día en la ventana
+      - ocupacion:       citas no canceladas / slots ofrecidos
+      - tasa_cancelacion: citas en estado X / citas
+      - tasa_atendida:   atendidas / citas no canceladas ya pasadas
+      - anticipacion_dias: media y percentiles de fecha_hora - creado_en,
+                           más histograma por tramos
+
+    Dos queries (horarios + citas); todo el cálculo es vectorizado
+    (bincount / groupby), sin recorrer filas en Python.
+    """
+    ahora = ahora or timezone.now()
+
+    h_doctor, h_dia = cargar_horarios(doctor_ids)
+    citas = cargar_citas(fecha_desde, fecha_hasta, doctor_ids)
+
+    conteo_dias = _conteo_dias_semana(fecha_desde, fecha_hasta)
+    slots = (
+        pd.Series(conteo_dias[h_dia - 1], index=h_doctor)
+        .groupby(level=0)
+        .sum()
+    )
+
+    pasada = (citas["fecha_hora"] < pd.Timestamp(ahora)).to_numpy()
+    activa = ~citas["cancelada"].to_numpy()
+    anticipacion = (
+        (citas["fecha_hora"] - citas["creado_en"]).dt.total_seconds() / 86400.0
+    ).clip(lower=0)
+
+    por_doctor = (
+        pd.DataFrame(
+            {
+                "doctor_id": citas["doctor_id"],
+                "citas": 1,
+                "activas": activa,
+                "canceladas": ~activa,
+                "evaluables": activa & pasada,
+                "atendidas": citas["atendida"].to_numpy() & activa & pasada,
+            }
+        )
+        .groupby("doctor_id")
+        .sum()
+    )
+
+    doctores = por_doctor.index.union(slots.index)
+    por_doctor = por_doctor.reindex(doctores, fill_value=0)
+    slots = slots.reindex(doctores, fill_value=0).to_numpy()
+
+    ocupacion = _tasa(por_doctor["activas"].to_numpy(), slots)
+    tasa_cancelacion = _tasa(
+        por_doctor["canceladas"].to_numpy(), por_doctor["citas"].to_numpy()
+    )
+    tasa_atendida = _tasa(
+        por_doctor["atendidas"].to_numpy(), por_doctor["evaluables"].to_numpy()
+    )
+
+    lead = pd.DataFrame(
+        {"doctor_id": citas["doctor_id"], "dias": anticipacion}
+    ).dropna()
+    lead_stats = lead.groupby("doctor_id")["dias"].describe(percentiles=[0.1, 0.5, 0.9])
+    lead_stats = lead_stats.reindex(doctores)
+    # Histograma doctor x tramo de anticipación con un solo np.add.at
+    tramo = np.digitize(lead["dias"].to_numpy(), CORTES_ANTICIPACION[1:-1])
+    histograma = np.zeros((len(doctores), len(ETIQUETAS_ANTICIPACION)), dtype="int64")
+    np.add.at(histograma, (doctores.get_indexer(lead["doctor_id"]), tramo), 1)
+
+    nombres = dict(
+        User.objects.filter(pk__in=list(doctores)).values_list("id", "nombre")
+    )
+
+    resultado = []
+    for i, doctor_id in enumerate(doctores):
+        stats = lead_stats.loc[doctor_id]
+        resultado.append(
+            {
+                "doctor_id": int(doctor_id),
+                "doctor": nombres.get(doctor_id),
+                "slots_ofrecidos": int(slots[i]),
+                "citas": int(por_doctor["citas"].iat[i]),
+                "canceladas": int(por_doctor["canceladas"].iat[i]),
+                "atendidas": int(por_doctor["atendidas"].iat[i]),
+                "ocupacion": round(float(ocupacion[i]), 4),
+                "tasa_cancelacion": round(float(tasa_cancelacion[i]), 4),
+                "tasa_atendida": round(float(tasa_atendida[i]), 4),
+                "anticipacion_dias": {
+                    clave: (None if pd.isna(stats[col]) else round(float(stats[col]), 2))
+                    for clave, col in (
+                        ("media", "mean"),
+                        ("p10", "10%"),
+                        ("p50", "50%"),
+                        ("p90", "90%"),
+                    )
+                },
+                "anticipacion_histograma": dict(
+                    zip(ETIQUETAS_ANTICIPACION, histograma[i].tolist())
+                ),
+            }
+        )
+
+    return {
+        "desde": fecha_desde.isoformat(),
+        "hasta": fecha_hasta.isoformat(),
+        "doctores": resultado,
+    }
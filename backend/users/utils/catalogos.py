@@ -0,0 +1,106 @@
+# archivo: backend/users/utils/catalogos.py
+
+import hashlib
+import json
+import uuid
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+@dataclass(frozen=True)
+class EntradaCatalogo:
+    datos: object
+    etag: str
+
+
+class CatalogoCacheado:
+    """
+    Cache versionada para catálogos que casi nunca cambian.
+
+    - Cada catálogo tiene un token de versión en cache; las entradas se
+      guardan bajo `catalogo:<nombre>:<version>:<args>`.
+    - `invalidar()` cambia el token, con lo que todas las entradas viejas
+      quedan huérfanas (expiran solas por TTL). Se llama desde las señales
+      post_save / post_delete del modelo (ver users/signals.py).
+    - El ETag se calcula del contenido, así que es el mismo en todos los
+      procesos aunque cada uno haya cargado el catálogo por su cuenta.
+
+    Con el cache compartido de CACHES (Redis o la tabla de la base) la
+    invalidación es global. Solo con LocMemCache (dev con SQLite) es por
+    proceso y el TTL acota cuánto puede quedar desfasado otro worker.
+
+    Con `version_por_args=True` cada combinación de args tiene su propio
+    token (p. ej. un dashboard por usuario) y `invalidar(*args)` solo
+    invalida esa entrada. Los kwargs de `obtener()` se pasan al loader pero
+    no forman parte de la clave.
+    """
+
+    def __init__(self, nombre, cargar, ttl=None, version_por_args=False):
+        self.nombre = nombre
+        self.cargar = cargar
+        self.ttl = ttl if ttl is not None else getattr(settings, "CATALOGO_CACHE_TTL", 300)
+        self.version_por_args = version_por_args
+
+    def _clave_version(self, *args):
+        partes = ["catalogo", self.nombre, "version"]
+        if self.version_por_args:
+            partes += [str(a) for a in args]
+        return ":".join(partes)
+
+    def version(self, *args):
+        clave = self._clave_version(*args)
+        version = cache.get(clave)
+        if version is None:
+            version = uuid.uuid4().hex
+            # add() para no pisar una versión que otro proceso acaba de fijar
+            if not cache.add(clave, version, None):
+                version = cache.get(clave, version)
+        return version
+
+    def obtener(self, *args, **kwargs):
+        clave = ":".join(
+            ["catalogo", self.nombre, self.version(*args)] + [str(a) for a in args]
+        )
+        entrada = cache.get(clave)
+        if entrada is None:
+            datos = self.cargar(*args, **kwargs)
+            contenido = json.dumps(datos, cls=DjangoJSONEncoder, sort_keys=True)
+            etag = '"%s"' % hashlib.md5(contenido.encode()).hexdigest()
+            entrada = EntradaCatalogo(datos=datos, etag=etag)
+            cache.set(clave, entrada, self.ttl)
+        return entrada
+
+    def invalidar(self, *args):
+        cache.set(self._clave_version(*args), uuid.uuid4().hex, None)
+
+
+def _cargar_especialidades():
+    from ..serializers import EspecialidadSerializer
+    from ..models import Especialidad
+
+    data = EspecialidadSerializer(Especialidad.objects.order_by("id"), many=True).data
+    return [dict(item) for item in data]
+
+
+def consulta_horarios_semanales(especialidad_id):
+    from ..models import Horario
+
+    return (
+        Horario.objects.filter(especialidad_id=especialidad_id)
+        .order_by("hora_inicio")
+        .values_list("dia_semana", "hora_inicio", "hora_fin", "doctor_id")
+    )
+
+
+def _cargar_horarios_semanales(especialidad_id):
+    return [tuple(fila) for fila in consulta_horarios_semanales(especialidad_id)]
+
+
+# Catálogo público de especialidades (EspecialidadListAPI)
+catalogo_especialidades = CatalogoCacheado("especialidades", _cargar_especialidades)
+
+# Horarios semanales por especialidad: [(dia_semana, hora_inicio, hora_fin, doctor_id)]
+horarios_semanales = CatalogoCacheado("horarios", _cargar_horarios_semanales)
@@ -0,0 +1,178 @@
+# archivo: backend/users/utils/comprobantes.py
+"""
+Subida de comprobantes de pago (PagoCreateAPI).
+
+1. `ComprobanteUploadHandler` revisa el archivo mientras llega, chunk por
+   chunk: el primer chunk debe tener la firma de un JPEG, PNG o WebP, y al
+   pasar de COMPROBANTE_MAX_BYTES se deja de aceptar. Nada se acumula en
+   este handler; los bytes siguen a los handlers de Django (memoria hasta
+   FILE_UPLOAD_MAX_MEMORY_SIZE, disco temporal después).
+2. `procesar_comprobante` re-codifica a JPEG con lado máximo y calidad
+   acotados y genera la miniatura para la lista de revisión del doctor.
+3. La vista guarda ambos archivos en el mismo `save()` del Pago, así que el
+   storage se toca una sola vez por archivo, ya con los bytes finales.
+
+Memoria pico por subida (ver `memoria_pico_estimada`): un chunk de subida,
+más lo que Django retenga en memoria (a lo sumo
+FILE_UPLOAD_MAX_MEMORY_SIZE), más los bitmaps decodificados. Los JPEG se
+decodifican con `draft`, que reduce en el decodificador por factores de 2
+hasta quedar cerca de COMPROBANTE_MAX_LADO; una imagen cuyo bitmap pasaría
+de COMPROBANTE_MAX_MEMORIA se rechaza antes de decodificarla.
+"""
+
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+from rest_framework import serializers
+
+CAMPO_COMPROBANTE = "comprobante"
+
+# Firmas de archivo aceptadas (los primeros bytes del contenido, no el
+# content-type que declare el navegador)
+FIRMAS_IMAGEN = (
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+)
+
+# Lo que Pillow lanza ante un archivo corrupto, truncado o demasiado
+# grande; se reporta como imagen inválida (400) y no como 500. También lo
+# usa `normalizar_firma`.
+ERRORES_IMAGEN = (
+    UnidentifiedImageError,
+    OSError,
+    Image.DecompressionBombError,
+    ValueError,
+)
+
+
+def _formato(cabecera):
+    for firma, formato in FIRMAS_IMAGEN:
+        if cabecera.startswith(firma):
+            return formato
+    if cabecera[:4] == b"RIFF" and cabecera[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+class ComprobanteUploadHandler(FileUploadHandler):
+    """
+    Valida tipo y tamaño del campo `comprobante` durante el parseo del
+    multipart. Si lo rechaza, el archivo se omite (SkipFile) y el motivo
+    queda en `self.error` para que la vista responda 400; el resto del
+    formulario se sigue parseando con normalidad.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.error = None
+        self._activo = False
+        self._recibidos = 0
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self._activo = field_name == CAMPO_COMPROBANTE
+        self._recibidos = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self._activo:
+            return raw_data
+
+        if start == 0 and _formato(raw_data[:12]) is None:
+            self.error = "El comprobante debe ser una imagen JPG, PNG o WebP."
+            raise SkipFile()
+
+        self._recibidos += len(raw_data)
+        limite = settings.COMPROBANTE_MAX_BYTES
+        if self._recibidos > limite:
+            self.error = (
+                f"El comprobante excede el tamaño máximo de "
+                f"{limite // (1024 * 1024)} MB."
+            )
+            raise SkipFile()
+        return raw_data
+
+    def file_complete(self, file_size):
+        # Los handlers de Django que siguen construyen el UploadedFile
+        return None
+
+
+def _escala_draft(ancho, alto, lado):
+    """Factor (1, 2, 4 u 8) con que `Image.draft` reduce un JPEG."""
+    proporcion = lado / max(ancho, alto)
+    objetivo_ancho = max(1, int(ancho * proporcion))
+    objetivo_alto = max(1, int(alto * proporcion))
+    escala = min(ancho // objetivo_ancho, alto // objetivo_alto)
+    for factor in (8, 4, 2, 1):
+        if escala >= factor:
+            return factor
+    return 1
+
+
+def memoria_pico_estimada(ancho, alto, formato):
+    """
+    Bytes de bitmap que `procesar_comprobante` tiene vivos a la vez para
+    una imagen de `ancho` x `alto`: el decodificado y su conversión a RGB,
+    a lo sumo 4 bytes por pixel cada uno, tras la reducción en el
+    decodificador si es JPEG.
+    """
+    if formato == "JPEG":
+        factor = _escala_draft(ancho, alto, settings.COMPROBANTE_MAX_LADO)
+        ancho, alto = -(-ancho // factor), -(-alto // factor)
+    return ancho * alto * (4 + 4)
+
+
+def _a_jpeg(imagen, calidad):
+    salida = BytesIO()
+    imagen.save(salida, format="JPEG", quality=calidad, optimize=True)
+    return salida.getvalue()
+
+
+def procesar_comprobante(archivo):
+    """
+    Devuelve (comprobante, miniatura) como ContentFile JPEG listos para
+    asignarse al Pago. Respeta la orientación EXIF y descarta los metadatos
+    (ubicación, modelo del teléfono).
+    """
+    lado = settings.COMPROBANTE_MAX_LADO
+    archivo.seek(0)
+    try:
+        with Image.open(archivo) as original:
+            # Solo se lee la cabecera; el bitmap aún no existe
+            pico = memoria_pico_estimada(original.width, original.height, original.format)
+            if pico > settings.COMPROBANTE_MAX_MEMORIA:
+                raise serializers.ValidationError(
+                    {CAMPO_COMPROBANTE: "La resolución del comprobante es demasiado grande."}
+                )
+            # JPEG: el decodificador entrega directamente una versión
+            # reducida (1/2, 1/4, 1/8) sin pasar por el bitmap completo.
+            factor = _escala_draft(original.width, original.height, lado)
+            original.draft(
+                "RGB", (original.width // factor, original.height // factor)
+            )
+            imagen = ImageOps.exif_transpose(original)
+            if imagen.mode in ("RGBA", "LA", "PA") or "transparency" in imagen.info:
+                imagen = imagen.convert("RGBA")
+                fondo = Image.new("RGB", imagen.size, (255, 255, 255))
+                fondo.paste(imagen, mask=imagen.getchannel("A"))
+                imagen = fondo
+            else:
+                imagen = imagen.convert("RGB")
+    except ERRORES_IMAGEN:
+        raise serializers.ValidationError(
+            {CAMPO_COMPROBANTE: "El comprobante no es una imagen válida."}
+        )
+
+    imagen.thumbnail((lado, lado), Image.LANCZOS)
+    comprobante = _a_jpeg(imagen, settings.COMPROBANTE_CALIDAD)
+
+    miniatura_lado = settings.COMPROBANTE_MINIATURA_LADO
+    imagen.thumbnail((miniatura_lado, miniatura_lado), Image.LANCZOS)
+    miniatura = _a_jpeg(imagen, settings.COMPROBANTE_MINIATURA_CALIDAD)
+
+    return (
+        ContentFile(comprobante, name="comprobante.jpg"),
+        ContentFile(miniatura, name="comprobante_miniatura.jpg"),
+    )
@@ -0,0 +1,140 @@
+# archivo: backend/users/utils/condicional.py
+
+import calendar
+import hashlib
+from datetime import datetime
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+def _campo_version(model, relacion):
+    """
+    Columna que cambia cuando cambia una fila de `relacion`:
+    actualizado_en si el modelo relacionado es de AuditMixin, si no el pk.
+    Con el pk (p. ej. RecetaMedicamento) solo se detectan altas y bajas; las
+    ediciones en sitio (bulk_update de RecetaSerializer) se reflejan en el
+    actualizado_en de la receta, que RecetaSerializer.update siempre guarda.
+    """
+    related_model = model._meta.get_field(relacion).related_model
+    campos = {f.name for f in related_model._meta.get_fields()}
+    return "actualizado_en" if "actualizado_en" in campos else "pk"
+
+
+def expresiones_version(model, relaciones=()):
+    """
+    Agregados baratos que resumen la "versión" de un conjunto de filas:
+    max(actualizado_en) + conteo, y lo mismo por cada relación indicada
+    (las altas/bajas de filas relacionadas cambian el conteo).
+    """
+    exprs = {
+        "_version": Max("actualizado_en"),
+        "_conteo": Count("pk", distinct=True),
+    }
+    for relacion in relaciones:
+        campo = _campo_version(model, relacion)
+        exprs[f"_version_{relacion}"] = Max(f"{relacion}__{campo}")
+        exprs[f"_conteo_{relacion}"] = Count(relacion, distinct=True)
+    return exprs
+
+
+def anotar_versiones(queryset, relaciones=()):
+    """
+    Anota en el queryset de detalle la versión de las filas relacionadas,
+    para que get_object() traiga todo lo necesario para el ETag en una query.
+    """
+    exprs = expresiones_version(queryset.model, relaciones)
+    exprs.pop("_version")
+    exprs.pop("_conteo")
+    if not exprs:
+        return queryset
+    return queryset.annotate(**exprs)
+
+
+def _etag(*partes):
+    contenido = "|".join(
+        p.isoformat() if isinstance(p, datetime) else str(p) for p in partes
+    )
+    return '"%s"' % hashlib.md5(contenido.encode()).hexdigest()
+
+
+def validadores_objeto(obj, relaciones=(), *extra):
+    """
+    (etag, last_modified) de una instancia de AuditMixin anotada con
+    anotar_versiones(). `extra` se mezcla en el ETag (p. ej. el query string,
+    que cambia la representación con ?fields= / ?formato=).
+    """
+    partes = [obj._meta.label, obj.pk, obj.actualizado_en]
+    fechas = [obj.actualizado_en]
+    for relacion in relaciones:
+        version = getattr(obj, f"_version_{relacion}", None)
+        partes += [version, getattr(obj, f"_conteo_{relacion}", None)]
+        if isinstance(version, datetime):
+            fechas.append(version)
+    partes += list(extra)
+
+    fechas = [f for f in fechas if f is not None]
+    last_modified = max(fechas) if fechas else None
+    return _etag(*partes), last_modified
+
+
+def validador_pagina(pagina, relaciones=(), *extra):
+    """
+    ETag de una página de un listado (`pagina`: queryset ordenado y con
+    LIMIT, ver KeysetPagination.consulta_pagina). Una query acotada por el
+    índice del orden trae pk + actualizado_en de las filas de la página (la
+    lista de pks cubre filas que entran o salen de la página y el `next`);
+    si hay relaciones, un agregado más, solo sobre esos pks.
+    """
+    filas = list(pagina.prefetch_related(None).values_list("pk", "actualizado_en"))
+    partes = [pagina.model._meta.label, filas]
+    if relaciones and filas:
+        exprs = expresiones_version(pagina.model, relaciones)
+        exprs.pop("_version")
+        exprs.pop("_conteo")
+        valores = pagina.model._default_manager.filter(
+            pk__in=[pk for pk, _ in filas]
+        ).aggregate(**exprs)
+        partes += [valores[clave] for clave in sorted(valores)]
+    partes += list(extra)
+    return _etag(*partes)
+
+
+def validador_queryset(queryset, relaciones=(), *extra):
+    """
+    ETag de un listado completo (sin paginar) a partir de un solo agregado
+    (max actualizado_en + conteo, propio y de las relaciones) sobre el
+    queryset ya filtrado. Recorre todas las filas, igual que la respuesta.
+    """
+    valores = queryset.aggregate(**expresiones_version(queryset.model, relaciones))
+    partes = [queryset.model._meta.label]
+    partes += [valores[clave] for clave in sorted(valores)]
+    partes += list(extra)
+    return _etag(*partes)
+
+
+def respuesta_no_modificada(request, etag, last_modified=None):
+    """
+    304 (o 412 si falla un If-Match) cuando las precondiciones del cliente
+    se cumplen; None si hay que generar la respuesta completa.
+    """
+    timestamp = (
+        calendar.timegm(last_modified.utctimetuple()) if last_modified else None
+    )
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def aplicar_validadores(response, etag, last_modified=None):
+    """
+    ETag / Last-Modified en la respuesta. `private, no-cache`: el navegador
+    puede guardar la copia pero debe revalidarla siempre (datos por usuario).
+    """
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(
+            calendar.timegm(last_modified.utctimetuple())
+        )
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ("Authorization",))
+    return response
@@ -0,0 +1,105 @@
+# archivo: backend/users/utils/dashboard.py
+
+from django.conf import settings
+from django.db.models import Max, Q, prefetch_related_objects
+from django.utils import timezone
+
+from .catalogos import CatalogoCacheado
+
+
+# Cuántas citas pasadas / recetas recientes trae el dashboard del paciente
+DASHBOARD_CITAS_PASADAS = 20
+DASHBOARD_RECETAS = 5
+
+
+def _cargar_dashboard_paciente(paciente_id, context=None):
+    """
+    Todo lo que PacienteDashboard necesita al montar, en 8 queries fijas:
+    citas próximas + pasadas (con prefetch compartido de pagos y
+    procedimientos), pagos en revisión, tratamiento activo (con las fechas
+    para proxima_cita anotadas) y últimas recetas con sus medicamentos.
+    """
+    from ..models import Cita, Pago, Receta, Tratamiento
+    from ..serializers import (
+        CitaSerializer,
+        PagoSerializer,
+        RecetaSerializer,
+        TratamientoDashboardSerializer,
+    )
+
+    context = context or {}
+    ahora = timezone.now()
+
+    citas = CitaSerializer.optimizar_queryset(
+        Cita.objects.filter(paciente_id=paciente_id),
+        prefetch=False,
+    )
+    proximas = list(citas.filter(fecha_hora__gte=ahora).order_by("fecha_hora", "id"))
+    pasadas = list(
+        citas.filter(fecha_hora__lt=ahora).order_by("-fecha_hora", "-id")[
+            :DASHBOARD_CITAS_PASADAS
+        ]
+    )
+    # Un solo prefetch para ambas listas
+    prefetch_related_objects(proximas + pasadas, *CitaSerializer.prefetches())
+
+    pagos_pendientes = (
+        Pago.objects.filter(
+            paciente_id=paciente_id,
+            estado_pago="PENDIENTE",
+            revertido=False,
+        )
+        .select_related(
+            "paciente",
+            "cita__paciente",
+            "cita__doctor",
+            "cita__especialidad",
+        )
+        .order_by("-fecha", "-id")
+    )
+
+    tratamiento = (
+        Tratamiento.objects.filter(paciente_id=paciente_id, activo=True)
+        .select_related("doctor")
+        .annotate(
+            ultima_cita_fecha=Max("citas_tratamiento__fecha_hora"),
+            ultima_atendida_fecha=Max(
+                "citas_tratamiento__fecha_hora",
+                filter=Q(citas_tratamiento__atendida=True),
+            ),
+        )
+        .order_by("-fecha_inicio", "-id")
+        .first()
+    )
+
+    recetas = (
+        Receta.objects.filter(paciente_id=paciente_id)
+        .select_related("paciente", "doctor", "cita")
+        .prefetch_related("medicamentos")
+        .order_by("-fecha_emision", "-id")[:DASHBOARD_RECETAS]
+    )
+
+    return {
+        "citas_proximas": list(CitaSerializer(proximas, many=True, context=context).data),
+        "citas_pasadas": list(CitaSerializer(pasadas, many=True, context=context).data),
+        "pagos_pendientes": list(
+            PagoSerializer(pagos_pendientes, many=True, context=context).data
+        ),
+        "tratamiento": (
+            dict(TratamientoDashboardSerializer(tratamiento, context=context).data)
+            if tratamiento
+            else None
+        ),
+        "recetas": list(RecetaSerializer(recetas, many=True, context=context).data),
+    }
+
+
+# Dashboard por paciente; las señales de Cita/Pago/Tratamiento/Receta/...
+# invalidan solo el del paciente afectado (users/signals.py).
+# TTL corto: "próximas" y "puede cancelar" dependen de la hora actual.
+dashboard_paciente = CatalogoCacheado(
+    "dashboard_paciente",
+    _cargar_dashboard_paciente,
+    ttl=getattr(settings, "DASHBOARD_CACHE_TTL", 60),
+    version_por_args=True,
+)
@@ -0,0 +1,72 @@
+# archivo: backend/users/utils/disponibilidad.py
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.utils import timezone
+
+from ..models import Cita
+from .catalogos import horarios_semanales
+from .fechas import rango_aware
+
+
+# Tope de días por consulta para que un rango mal formado no recorra años
+MAX_DIAS_RANGO = 62
+
+
+def consulta_ocupadas(doctor_ids, inicio, fin):
+    """(doctor_id, fecha_hora) de las citas no canceladas en [inicio, fin)."""
+    return (
+        Cita.objects.filter(
+            doctor_id__in=doctor_ids,
+            fecha_hora__gte=inicio,
+            fecha_hora__lt=fin,
+        )
+        .exclude(estado="X")
+        .values_list("doctor_id", "fecha_hora")
+    )
+
+
+def calcular_disponibilidad(especialidad_id, fecha_desde, fecha_hasta, doctor_id=None):
+    """
+    Calcula las horas libres para cada día del rango [fecha_desde, fecha_hasta].
+
+    Hace a lo más dos queries, sin importar el tamaño del rango:
+      1) Los Horario semanales de la especialidad (cacheados en
+         `horarios_semanales`; invalidados por señales de Horario).
+      2) Todas las fecha_hora ocupadas (no canceladas) de esos doctores
+         dentro de la ventana.
+
+    El cruce se hace en memoria. Devuelve un dict ordenado:
+      { date: ["09:00", "09:30", ...], ... }
+    Los domingos (y días sin horario) aparecen con lista vacía.
+    """
+    # dia_semana -> [(hora_inicio, doctor_id), ...] ordenado por hora
+    horarios_por_dia = defaultdict(list)
+    doctor_ids = set()
+    for dia_semana, hora_inicio, _hora_fin, h_doctor_id in horarios_semanales.obtener(
+        especialidad_id
+    ).datos:
+        if doctor_id and str(h_doctor_id) != str(doctor_id):
+            continue
+        horarios_por_dia[dia_semana].append((hora_inicio, h_doctor_id))
+        doctor_ids.add(h_doctor_id)
+
+    ocupadas = set()
+    if doctor_ids:
+        inicio, fin = rango_aware(fecha_desde, fecha_hasta)
+        for c_doctor_id, fecha_hora in consulta_ocupadas(doctor_ids, inicio, fin):
+            local = timezone.localtime(fecha_hora)
+            ocupadas.add((c_doctor_id, local.date(), local.time()))
+
+    resultado = {}
+    fecha = fecha_desde
+    while fecha <= fecha_hasta:
+        horas = []
+        for hora_inicio, h_doctor_id in horarios_por_dia.get(fecha.weekday() + 1, ()):
+            if (h_doctor_id, fecha, hora_inicio) not in ocupadas:
+                horas.append(hora_inicio.strftime("%H:%M"))
+        resultado[fecha] = horas
+        fecha += timedelta(days=1)
+
+    return resultado
@@ -0,0 +1,164 @@
+# archivo: backend/users/utils/exportacion.py
+
+import csv
+import tempfile
+from datetime import datetime
+
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from ..pagination import iterar_keyset
+
+# Filas por query al recorrer el queryset (ver iterar_keyset)
+EXPORTACION_TAMANO_LOTE = 2000
+
+# Prefijos que Excel/LibreOffice interpretan como fórmula al abrir el archivo
+PREFIJOS_FORMULA = ("=", "+", "-", "@", "\t", "\r")
+
+
+class ExportacionDemasiadoGrande(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_code = "exportacion_demasiado_grande"
+
+    def __init__(self, limite):
+        super().__init__(
+            f"El XLSX admite hasta {limite} filas; usa formato=csv o acota los filtros."
+        )
+
+# (encabezado, lookup para values_list)
+COLUMNAS_CITAS = (
+    ("ID", "id"),
+    ("Fecha y hora", "fecha_hora"),
+    ("Estado", "estado"),
+    ("Tipo", "tipo"),
+    ("Especialidad", "especialidad__nombre"),
+    ("Doctor nombre", "doctor__nombre"),
+    ("Doctor apellidos", "doctor__apellidos"),
+    ("Paciente nombre", "paciente__nombre"),
+    ("Paciente apellidos", "paciente__apellidos"),
+    ("Paciente teléfono", "paciente__telefono"),
+    ("Atendida", "atendida"),
+    ("Consentimiento completado", "consentimiento_completado"),
+    ("Método de pago preferido", "metodo_pago_preferido"),
+    ("Tratamiento", "tratamiento_id"),
+)
+
+COLUMNAS_PAGOS = (
+    ("ID", "id"),
+    ("Fecha", "fecha"),
+    ("Cita", "cita_id"),
+    ("Fecha cita", "cita__fecha_hora"),
+    ("Paciente nombre", "paciente__nombre"),
+    ("Paciente apellidos", "paciente__apellidos"),
+    ("Doctor nombre", "cita__doctor__nombre"),
+    ("Doctor apellidos", "cita__doctor__apellidos"),
+    ("Especialidad", "cita__especialidad__nombre"),
+    ("Total", "total"),
+    ("Pagado", "pagado"),
+    ("Método", "metodo_pago"),
+    ("Estado", "estado_pago"),
+    ("Verificado", "verificado"),
+    ("Revertido", "revertido"),
+    ("Fecha reverso", "fecha_reverso"),
+)
+
+COLUMNAS_PACIENTES = (
+    ("ID", "id"),
+    ("Nombre", "nombre"),
+    ("Apellidos", "apellidos"),
+    ("Teléfono", "telefono"),
+    ("Edad", "edad"),
+    ("Sexo", "sexo"),
+    ("Peso", "peso"),
+    ("Activo", "is_active"),
+)
+
+
+def _celda(valor):
+    # openpyxl no acepta datetimes aware; se exporta la hora local de la clínica
+    if isinstance(valor, datetime) and timezone.is_aware(valor):
+        return timezone.localtime(valor).replace(tzinfo=None)
+    # Texto capturado por usuarios (nombres, etc.): un apóstrofo inicial
+    # evita que la hoja de cálculo lo ejecute como fórmula
+    if isinstance(valor, str) and valor.startswith(PREFIJOS_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def _filas(queryset, columnas, ordering):
+    campos = [lookup for _encabezado, lookup in columnas]
+    for fila in iterar_keyset(
+        queryset, ordering, campos, tamano_lote=EXPORTACION_TAMANO_LOTE
+    ):
+        yield [_celda(valor) for valor in fila]
+
+
+class _Eco:
+    """Pseudo-buffer: csv.writer escribe y write() devuelve la línea tal cual."""
+
+    def write(self, valor):
+        return valor
+
+
+def respuesta_csv(queryset, columnas, ordering, nombre):
+    """
+    CSV en streaming: cada fila se escribe y se envía al vuelo, sin armar
+    el archivo en memoria. Lleva BOM para que Excel respete los acentos.
+    """
+    writer = csv.writer(_Eco())
+
+    def contenido():
+        yield "\ufeff"
+        yield writer.writerow([encabezado for encabezado, _lookup in columnas])
+        for fila in _filas(queryset, columnas, ordering):
+            yield writer.writerow(fila)
+
+    response = StreamingHttpResponse(
+        contenido(), content_type="text/csv; charset=utf-8"
+    )
+    response["Content-Disposition"] = f'attachment; filename="{nombre}.csv"'
+    return response
+
+
+def respuesta_xlsx(queryset, columnas, ordering, nombre):
+    """
+    XLSX con openpyxl en modo write-only: las filas se vuelcan a un archivo
+    temporal conforme se agregan (no hay workbook en memoria) y el .xlsx
+    resultante se envía por bloques con FileResponse.
+
+    Un .xlsx es un ZIP y no se puede enviar antes de cerrarlo, así que el
+    archivo completo se arma en disco antes del primer byte. Para acotar ese
+    tiempo y espacio se rechazan exportaciones de más de
+    EXPORTACION_MAX_FILAS_XLSX filas; el CSV no tiene límite.
+    """
+    limite = settings.EXPORTACION_MAX_FILAS_XLSX
+    if queryset.count() > limite:
+        raise ExportacionDemasiadoGrande(limite)
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet(title=nombre[:31])
+    hoja.append([encabezado for encabezado, _lookup in columnas])
+    for fila in _filas(queryset, columnas, ordering):
+        hoja.append(fila)
+
+    archivo = tempfile.TemporaryFile()
+    libro.save(archivo)
+    archivo.seek(0)
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=f"{nombre}.xlsx",
+        content_type=(
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        ),
+    )
+
+
+EXPORTADORES = {
+    "csv": respuesta_csv,
+    "xlsx": respuesta_xlsx,
+}
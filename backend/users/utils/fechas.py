@@ -0,0 +1,69 @@
+# archivo: backend/users/utils/fechas.py
+
+from datetime import datetime, time, timedelta
+
+from django.db import models
+from django.utils import timezone
+
+
+def parse_fecha(valor):
+    """
+    Parsea "YYYY-MM-DD" a date. Devuelve None si viene vacío o inválido
+    (los filtros de listado ignoran fechas mal formadas sin romper la API).
+    """
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def inicio_del_dia(fecha):
+    """
+    00:00 del día `fecha` en la zona horaria de la clínica
+    (settings.TIME_ZONE = America/Mexico_City), como datetime aware.
+    """
+    return timezone.make_aware(
+        datetime.combine(fecha, time.min),
+        timezone.get_default_timezone(),
+    )
+
+
+def rango_aware(fecha_desde, fecha_hasta):
+    """
+    Convierte [fecha_desde, fecha_hasta] (inclusive) al intervalo semiabierto
+    [inicio, fin) de datetimes aware. Cualquiera de los extremos puede ser None.
+    """
+    inicio = inicio_del_dia(fecha_desde) if fecha_desde else None
+    fin = inicio_del_dia(fecha_hasta + timedelta(days=1)) if fecha_hasta else None
+    return inicio, fin
+
+
+def filtrar_rango_fechas(qs, campo, fecha_desde_str, fecha_hasta_str):
+    """
+    Aplica ?fecha_desde / ?fecha_hasta (YYYY-MM-DD, inclusive) sobre `campo`.
+
+    En DateTimeField se compara contra límites aware
+    (`campo >= inicio AND campo < fin`) en lugar de `campo__date__gte/lte`:
+    así la columna queda desnuda y la base puede usar su índice, en vez de
+    evaluar DATE(CONVERT_TZ(...)) fila por fila.
+    En DateField las fechas se comparan directamente.
+    """
+    fecha_desde = parse_fecha(fecha_desde_str)
+    fecha_hasta = parse_fecha(fecha_hasta_str)
+
+    field = qs.model._meta.get_field(campo)
+    if isinstance(field, models.DateTimeField):
+        inicio, fin = rango_aware(fecha_desde, fecha_hasta)
+        if inicio:
+            qs = qs.filter(**{f"{campo}__gte": inicio})
+        if fin:
+            qs = qs.filter(**{f"{campo}__lt": fin})
+        return qs
+
+    if fecha_desde:
+        qs = qs.filter(**{f"{campo}__gte": fecha_desde})
+    if fecha_hasta:
+        qs = qs.filter(**{f"{campo}__lte": fecha_hasta})
+    return qs
@@ -0,0 +1,97 @@
+# archivo: backend/users/utils/firmas.py
+"""
+Normalización de la firma del paciente antes de guardarla.
+
+El canvas del frontend manda PNGs RGBA del tamaño de la pantalla, con mucho
+margen en blanco. El PDF la imprime en una caja de 40 x 20 mm, así que se
+recorta al trazo, se reduce a esa caja a 300 dpi y se guarda como PNG de
+1 bit: unos pocos KB en vez de cientos, tanto en el storage como en cada PDF.
+
+Al reducir, un trazo de 1-2 px se promedia con el blanco de alrededor y
+queda gris claro, por encima del umbral de tinta. Por eso antes de reducir
+se engrosa el trazo en proporción al factor de reducción (MinFilter), y el
+chequeo de firma vacía se repite sobre el bitmap final.
+"""
+
+import math
+
+
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageFilter
+from rest_framework import serializers
+
+from .comprobantes import ERRORES_IMAGEN
+
+# Tamaño de impresión en el PDF (40 x 20 mm) a 300 dpi
+FIRMA_DPI = 300
+FIRMA_ANCHO_PX = round(40 / 25.4 * FIRMA_DPI)
+FIRMA_ALTO_PX = round(20 / 25.4 * FIRMA_DPI)
+
+# Gris por debajo del cual un pixel cuenta como tinta
+UMBRAL_TINTA = 160
+MARGEN_PX = 4
+
+
+def _sobre_blanco(imagen):
+    """Escala de grises con la transparencia aplanada sobre fondo blanco."""
+    if imagen.mode in ("RGBA", "LA", "PA") or "transparency" in imagen.info:
+        imagen = imagen.convert("RGBA")
+        fondo = Image.new("RGBA", imagen.size, (255, 255, 255, 255))
+        fondo.alpha_composite(imagen)
+        imagen = fondo
+    return imagen.convert("L")
+
+
+def _caja_tinta(gris):
+    """Bounding box de los pixeles más oscuros que UMBRAL_TINTA (o None)."""
+    return gris.point(lambda p: 255 if p < UMBRAL_TINTA else 0).getbbox()
+
+
+def _engrosar(gris, factor):
+    """
+    Ensancha el trazo ~`factor` px para que sobreviva a una reducción de ese
+    factor: MinFilter toma el pixel más oscuro de cada vecindad.
+    """
+    tamano = 2 * math.ceil(factor / 2) + 1
+    if tamano < 3:
+        return gris
+    return gris.filter(ImageFilter.MinFilter(tamano))
+
+
+def normalizar_firma(archivo):
+    """
+    Devuelve un ContentFile PNG de 1 bit con la firma recortada al trazo y
+    reducida (nunca ampliada) a FIRMA_ANCHO_PX x FIRMA_ALTO_PX.
+    """
+    archivo.seek(0)
+    try:
+        with Image.open(archivo) as original:
+            gris = _sobre_blanco(original)
+    except ERRORES_IMAGEN:
+        raise serializers.ValidationError("La firma no es una imagen válida.")
+
+    caja = _caja_tinta(gris)
+    if caja is None:
+        raise serializers.ValidationError("La firma está vacía.")
+
+    izquierda, arriba, derecha, abajo = caja
+    gris = gris.crop((
+        max(izquierda - MARGEN_PX, 0),
+        max(arriba - MARGEN_PX, 0),
+        min(derecha + MARGEN_PX, gris.width),
+        min(abajo + MARGEN_PX, gris.height),
+    ))
+    factor = max(gris.width / FIRMA_ANCHO_PX, gris.height / FIRMA_ALTO_PX)
+    if factor > 1:
+        gris = _engrosar(gris, factor)
+    gris.thumbnail((FIRMA_ANCHO_PX, FIRMA_ALTO_PX), Image.LANCZOS)
+
+    if _caja_tinta(gris) is None:
+        raise serializers.ValidationError("La firma es demasiado tenue.")
+
+    bits = gris.point(lambda p: 255 if p >= UMBRAL_TINTA else 0, mode="1")
+    salida = BytesIO()
+    bits.save(salida, format="PNG", optimize=True)
+    return ContentFile(salida.getvalue(), name="firma.png")
@@ -0,0 +1,88 @@
+# archivo: backend/users/utils/horarios.py
+
+from collections import defaultdict
+
+from django.db import transaction
+
+from ..models import Horario, User
+from .catalogos import horarios_semanales
+
+CAMPOS_HORARIO = ("especialidad", "hora_fin")
+
+
+def buscar_traslapes(bloques):
+    """
+    Pares de bloques que se traslapan dentro de un mismo día.
+
+    `bloques` son dicts con dia_semana, hora_inicio y hora_fin. Por día se
+    ordena por hora de inicio y se barre una vez: un bloque choca con el
+    anterior si empieza antes de que termine el que más tarde acaba hasta
+    ahí. Bloques contiguos (uno termina cuando empieza el otro) no chocan.
+    O(n log n) en vez de comparar todos contra todos.
+    """
+    por_dia = defaultdict(list)
+    for bloque in bloques:
+        por_dia[bloque["dia_semana"]].append(bloque)
+
+    traslapes = []
+    for dia in sorted(por_dia):
+        ordenados = sorted(por_dia[dia], key=lambda b: (b["hora_inicio"], b["hora_fin"]))
+        abierto = ordenados[0]
+        for bloque in ordenados[1:]:
+            if bloque["hora_inicio"] < abierto["hora_fin"]:
+                traslapes.append((abierto, bloque))
+            if bloque["hora_fin"] > abierto["hora_fin"]:
+                abierto = bloque
+    return traslapes
+
+
+def reemplazar_semana(doctor, especialidad, bloques):
+    """
+    Deja los horarios de `doctor` exactamente como `bloques`, en una
+    transacción: un delete para los que sobran, un bulk_update para los que
+    cambian de hora de fin o especialidad y un bulk_create para los nuevos.
+    Los bloques se identifican por (dia_semana, hora_inicio), la misma
+    llave única del modelo.
+
+    bulk_create/bulk_update no emiten señales, así que el catálogo de
+    horarios semanales (base de la disponibilidad) se invalida aquí.
+    """
+    with transaction.atomic():
+        # Serializa dos reemplazos simultáneos de la semana del mismo doctor
+        # (bloquea su fila aunque todavía no tenga horarios)
+        list(User.objects.select_for_update().filter(pk=doctor.pk).values_list("pk"))
+        existentes = {
+            (h.dia_semana, h.hora_inicio): h
+            for h in Horario.objects.filter(doctor=doctor)
+        }
+
+        nuevos, cambiados = [], []
+        for bloque in bloques:
+            actual = existentes.pop((bloque["dia_semana"], bloque["hora_inicio"]), None)
+            if actual is None:
+                nuevos.append(
+                    Horario(doctor=doctor, especialidad=especialidad, **bloque)
+                )
+            elif (
+                actual.hora_fin != bloque["hora_fin"]
+                or actual.especialidad_id != especialidad.pk
+            ):
+                actual.hora_fin = bloque["hora_fin"]
+                actual.especialidad = especialidad
+                cambiados.append(actual)
+
+        if existentes:
+            Horario.objects.filter(pk__in=[h.pk for h in existentes.values()]).delete()
+        if cambiados:
+            Horario.objects.bulk_update(cambiados, CAMPOS_HORARIO)
+        if nuevos:
+            Horario.objects.bulk_create(nuevos)
+
+        if existentes or cambiados or nuevos:
+            transaction.on_commit(horarios_semanales.invalidar)
+
+    return {
+        "creados": len(nuevos),
+        "actualizados": len(cambiados),
+        "eliminados": len(existentes),
+    }
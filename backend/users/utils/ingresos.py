@@ -0,0 +1,160 @@
+# archivo: backend/users/utils/ingresos.py
+
+from decimal import Decimal
+
+from django.db.models import (
+    Count,
+    DateField,
+    DecimalField,
+    F,
+    Q,
+    Sum,
+)
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from ..models import Pago
+from .fechas import parse_fecha, rango_aware
+
+PERIODOS = {
+    "dia": None,
+    "semana": TruncWeek,
+    "mes": TruncMonth,
+}
+
+_MONTO = DecimalField(max_digits=14, decimal_places=2)
+_CERO = Decimal("0.00")
+
+
+def pagos_vigentes(cita, metodo_pago):
+    """Pagos no revertidos, pendientes o aprobados, de `cita` con `metodo_pago`."""
+    return Pago.objects.filter(
+        cita=cita,
+        metodo_pago=metodo_pago,
+        estado_pago__in=["PENDIENTE", "APROBADO"],
+        revertido=False,
+    )
+
+
+def _sum(expr, filtro=None):
+    return Coalesce(Sum(expr, filter=filtro, output_field=_MONTO), _CERO, output_field=_MONTO)
+
+
+def _metricas_pagos():
+    """
+    Agregados por grupo (todo en SQL):
+      - monto_total:     suma de `total` de pagos vigentes (no revertidos ni rechazados)
+      - monto_pagado:    suma de `pagado` de pagos APROBADO no revertidos
+      - saldo_pendiente: total - pagado de los pagos vigentes
+      - monto_revertido: suma de `total` de pagos revertidos
+    """
+    vigente = Q(revertido=False) & ~Q(estado_pago="RECHAZADO")
+    return {
+        "num_pagos": Count("pk"),
+        "monto_total": _sum("total", vigente),
+        "monto_pagado": _sum("pagado", Q(revertido=False, estado_pago="APROBADO")),
+        "saldo_pendiente": _sum(F("total") - F("pagado"), vigente),
+        "monto_revertido": _sum("total", Q(revertido=True)),
+        "num_revertidos": Count("pk", filter=Q(revertido=True)),
+    }
+
+
+def _dia_local():
+    """
+    Día del pago en la zona de la clínica: creado_en truncado en
+    America/Mexico_City; `fecha` como respaldo para filas sin creado_en.
+    """
+    return Coalesce(
+        TruncDate("creado_en", tzinfo=timezone.get_default_timezone()),
+        F("fecha"),
+    )
+
+
+def filtrar_pagos_por_dia(pagos, fecha_desde_str, fecha_hasta_str):
+    """
+    Aplica ?fecha_desde / ?fecha_hasta (YYYY-MM-DD, inclusive) sobre el
+    mismo día con que `resumen_ingresos` agrupa (`_dia_local`), para que los
+    totales del rango cuadren con la suma de sus periodos. `fecha` se
+    reescribe al confirmar un pago, así que no sirve como filtro si se
+    agrupa por creado_en.
+
+    Cada rama compara la columna desnuda (creado_en contra límites aware,
+    `fecha` solo para filas sin creado_en), así que puede usar índices.
+    """
+    fecha_desde = parse_fecha(fecha_desde_str)
+    fecha_hasta = parse_fecha(fecha_hasta_str)
+    if not fecha_desde and not fecha_hasta:
+        return pagos
+
+    inicio, fin = rango_aware(fecha_desde, fecha_hasta)
+    por_creado = Q(creado_en__isnull=False)
+    por_fecha = Q(creado_en__isnull=True)
+    if inicio:
+        por_creado &= Q(creado_en__gte=inicio)
+        por_fecha &= Q(fecha__gte=fecha_desde)
+    if fin:
+        por_creado &= Q(creado_en__lt=fin)
+        por_fecha &= Q(fecha__lte=fecha_hasta)
+    return pagos.filter(por_creado | por_fecha)
+
+
+def _formatear(fila):
+    return {
+        clave: (f"{valor:.2f}" if isinstance(valor, Decimal) else valor)
+        for clave, valor in fila.items()
+    }
+
+
+def _agrupar(queryset, campo, expresion=None):
+    if expresion is not None:
+        queryset = queryset.annotate(**{campo: expresion})
+    filas = (
+        queryset.order_by()
+        .values(campo)
+        .annotate(**_metricas_pagos())
+        .order_by(campo)
+    )
+    return [_formatear(fila) for fila in filas]
+
+
+def resumen_ingresos(pagos, procedimientos, periodo="dia"):
+    """
+    Resumen de ingresos sobre querysets ya acotados (rol, doctor, fechas).
+    Una query por agrupación; no se materializa ningún pago en Python.
+    """
+    dia = _dia_local()
+    trunc = PERIODOS[periodo]
+    expresion_periodo = dia if trunc is None else trunc(dia, output_field=DateField())
+
+    totales = pagos.order_by().aggregate(**_metricas_pagos())
+
+    por_periodo = _agrupar(pagos, "periodo", expresion_periodo)
+    for fila in por_periodo:
+        fila["periodo"] = fila["periodo"].isoformat() if fila["periodo"] else None
+
+    procedimientos_por_estado = [
+        _formatear(fila)
+        for fila in procedimientos.order_by()
+        .values("estado_pago")
+        .annotate(num_procedimientos=Count("pk"), monto_costo=_sum("costo"))
+        .order_by("estado_pago")
+    ]
+
+    return {
+        "periodo": periodo,
+        "totales": _formatear(totales),
+        "por_metodo_pago": _agrupar(pagos, "metodo_pago"),
+        "por_estado_pago": _agrupar(pagos, "estado_pago"),
+        "por_especialidad": _agrupar(
+            pagos, "especialidad", F("cita__especialidad__nombre")
+        ),
+        "por_periodo": por_periodo,
+        "procedimientos": {
+            "totales": _formatear(
+                procedimientos.order_by().aggregate(
+                    num_procedimientos=Count("pk"), monto_costo=_sum("costo")
+                )
+            ),
+            "por_estado_pago": procedimientos_por_estado,
+        },
+    }
@@ -1,50 +1,23 @@
 # archivo: backend/tu_app/utils/pdf_consentimiento.py
 
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
 from io import BytesIO
 from datetime import datetime
+from pathlib import Path
 
-import textwrap
+from django.conf import settings
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
 
+from .pdf_layout import Maquetador, metricas, partir_lineas
 
-def _draw_wrapped_text(
-    c: canvas.Canvas,
-    text: str,
-    x: float,
-    y: float,
-    max_width: float,
-    font_name: str = "Helvetica",
-    font_size: int = 10,
-    leading: int = 14,
-):
-    """
-    Dibuja texto multilínea con wrap básico dentro de un ancho máximo.
-    Devuelve la coordenada Y final después de dibujar.
-    """
-    if not text:
-        return y
-
-    c.setFont(font_name, font_size)
-
-    # Aproximación de caracteres por línea según el tamaño del font
-    # (no perfecto, pero suficiente para que no se desborde)
-    chars_per_line = max(40, int(max_width / (font_size * 0.55)))
-
-    # Soporta párrafos separados por saltos de línea
-    paragraphs = text.split("\n")
-
-    for para in paragraphs:
-        if not para.strip():
-            y -= leading
-            continue
-
-        for line in textwrap.wrap(para, width=chars_per_line):
-            c.drawString(x, y, line)
-            y -= leading
-
-    return y
+logger = logging.getLogger(__name__)
 
 
 def build_consentimiento_pdf(cita, consentimiento):
@@ -142,43 +115,32 @@ def build_consentimiento_pdf(cita, consentimiento):
     )
     y -= 24
 
+    # Desde aquí el texto es de longitud variable: el maquetador mide con
+    # las métricas reales de la fuente y abre páginas cuando hace falta.
+    m = Maquetador(c, left_margin, top_margin, bottom_margin, max_width)
+    m.y = y
+
     # =========================
     # TEXTO INTRODUCTORIO
     # =========================
-    c.setFont("Helvetica", 10)
     intro = (
         f"Yo, {paciente.nombre} {paciente.apellidos}, declaro que he sido informado(a) "
         "de manera clara, suficiente y comprensible sobre mi estado de salud, "
         "el procedimiento propuesto y sus implicaciones, y que he tenido oportunidad "
         "de hacer preguntas y obtener respuestas satisfactorias."
     )
-    y = _draw_wrapped_text(c, intro, left_margin, y, max_width)
-    y -= 10
+    m.parrafo(intro)
+    m.espacio(10)
 
     # =========================
     # SECCIONES CLÍNICAS
     # =========================
     def draw_section(title, content):
-        nonlocal y
-        if y < bottom_margin + 80:  # Nueva página si estamos casi al final
-            c.showPage()
-            y = top_margin
-
-        c.setFont("Helvetica-Bold", 11)
-        c.drawString(left_margin, y, title)
-        y -= 16
-        c.setFont("Helvetica", 10)
-        if content:
-            y = _draw_wrapped_text(c, content, left_margin, y, max_width)
-        else:
-            y = _draw_wrapped_text(
-                c,
-                "Sin información registrada.",
-                left_margin,
-                y,
-                max_width,
-            )
-        y -= 8
+        # El título no se queda solo al pie: va con al menos dos líneas
+        m.asegurar_espacio(16 + 14)
+        m.linea(title, "Helvetica-Bold", 11, interlineado=16)
+        m.parrafo(content or "Sin información registrada.")
+        m.espacio(8)
 
     draw_section("Diagnóstico principal", consentimiento.diagnostico_principal)
     draw_section("Procedimiento propuesto", consentimiento.procedimiento_propuesto)
@@ -187,28 +149,17 @@ def build_consentimiento_pdf(cita, consentimiento):
     draw_section("Alternativas disponibles", consentimiento.alternativas)
 
     # =========================
-    # TESTIGOS
+    # TESTIGOS + LUGAR, FECHA Y HORA (bloque sin partir)
     # =========================
-    if y < bottom_margin + 100:
-        c.showPage()
-        y = top_margin
-
-    c.setFont("Helvetica-Bold", 11)
-    c.drawString(left_margin, y, "Testigos")
-    y -= 18
-    c.setFont("Helvetica", 10)
+    m.asegurar_espacio(18 + 16 + 30 + 14 + 14)
 
     testigo1 = consentimiento.testigo1_nombre or "____________________________"
     testigo2 = consentimiento.testigo2_nombre or "____________________________"
 
-    c.drawString(left_margin, y, f"Testigo 1: {testigo1}")
-    y -= 16
-    c.drawString(left_margin, y, f"Testigo 2: {testigo2}")
-    y -= 30
+    m.linea("Testigos", "Helvetica-Bold", 11, interlineado=18)
+    m.linea(f"Testigo 1: {testigo1}", interlineado=16)
+    m.linea(f"Testigo 2: {testigo2}", interlineado=30)
 
-    # =========================
-    # LUGAR, FECHA Y HORA
-    # =========================
     lugar = consentimiento.lugar or "Zihuatanejo, Guerrero"
     fecha = consentimiento.fecha
     hora = consentimiento.hora
@@ -218,41 +169,33 @@ def build_consentimiento_pdf(cita, consentimiento):
     )
     hora_str = hora.strftime("%H:%M")
 
-    c.setFont("Helvetica", 10)
-    c.drawString(left_margin, y, f"Lugar: {lugar}")
-    y -= 14
-    c.drawString(left_margin, y, f"Fecha: {fecha_str}")
-    y -= 14
-    c.drawString(left_margin, y, f"Hora: {hora_str}")
-    y -= 30
+    m.linea(f"Lugar: {lugar}")
+    m.linea(f"Fecha: {fecha_str}")
+    m.linea(f"Hora: {hora_str}", interlineado=30)
 
     # =========================
     # FIRMA DEL PACIENTE (única)
     # =========================
-    if y < bottom_margin + 120:
-        c.showPage()
-        y = top_margin
-
-    c.setFont("Helvetica-Bold", 11)
-    c.drawString(left_margin, y, "Firma del paciente")
-    y -= 18
-
     caja_altura = 30 * mm
     caja_ancho = 80 * mm
-    firma_y = y
+
+    # Título + caja + leyenda, dejando sitio a la nota final al pie
+    m.asegurar_espacio(18 + caja_altura - 2 + 14)
+    m.linea("Firma del paciente", "Helvetica-Bold", 11, interlineado=18)
+    firma_y = m.y
 
     # Marco para la firma
     c.setLineWidth(1)
     c.rect(left_margin, firma_y - caja_altura + 6, caja_ancho, caja_altura, stroke=1, fill=0)
 
     # Imagen de la firma (si existe)
-    if consentimiento.firma_paciente:
+    firma = _leer_firma(consentimiento)
+    if firma is not None:
         try:
-            img_path = consentimiento.firma_paciente.path
             img_height = 20 * mm
             img_width = 40 * mm
             c.drawImage(
-                img_path,
+                ImageReader(BytesIO(firma)),
                 left_margin + (caja_ancho - img_width) / 2,
                 firma_y - img_height + 4,
                 width=img_width,
@@ -261,22 +204,27 @@ def build_consentimiento_pdf(cita, consentimiento):
                 mask="auto",
             )
         except Exception:
-            pass
+            logger.warning(
+                "No se pudo dibujar la firma del consentimiento %s",
+                consentimiento.pk,
+                exc_info=True,
+            )
 
     # Línea guía centrada
     c.line(left_margin + 8, firma_y - caja_altura + 12, left_margin + caja_ancho - 8, firma_y - caja_altura + 12)
     c.setFont("Helvetica", 9)
     c.drawCentredString(left_margin + caja_ancho / 2, firma_y - caja_altura + 2, "Nombre y firma del paciente")
 
-    y = firma_y - caja_altura - 20
-
-    # Nota final
+    # Nota final, al pie de la última página
     c.setFont("Helvetica-Oblique", 8)
     nota = (
         "Este documento de consentimiento informado forma parte del expediente clínico "
         "del paciente y ha sido emitido electrónicamente."
     )
-    _draw_wrapped_text(c, nota, left_margin, bottom_margin, max_width)
+    y = bottom_margin
+    for linea in partir_lineas(nota, metricas("Helvetica-Oblique", 8), max_width):
+        c.drawString(left_margin, y, linea)
+        y -= 10
 
     # Cerrar PDF
     c.showPage()
@@ -285,3 +233,154 @@ def build_consentimiento_pdf(cita, consentimiento):
     pdf = buffer.getvalue()
     buffer.close()
     return pdf
+
+
+# =========================
+# CACHE DE PDFs RENDERIZADOS
+# =========================
+
+def _huella_pdf(cita, consentimiento):
+    """
+    Hash de todo lo que se dibuja en el PDF: el consentimiento (vía
+    actualizado_en), el archivo de firma, la cita y los datos de paciente,
+    doctor y especialidad que aparecen en el encabezado.
+    """
+    paciente = cita.paciente
+    doctor = cita.doctor
+    especialidad = cita.especialidad
+    partes = [
+        consentimiento.pk,
+        consentimiento.actualizado_en,
+        consentimiento.firma_paciente.name if consentimiento.firma_paciente else "",
+        cita.actualizado_en,
+        cita.fecha_hora,
+        cita.tipo,
+        paciente.nombre,
+        paciente.apellidos,
+        paciente.edad,
+        paciente.sexo,
+        paciente.telefono,
+        doctor.nombre,
+        doctor.apellidos,
+        especialidad.nombre if especialidad else "",
+    ]
+    return hashlib.md5("|".join(str(p) for p in partes).encode()).hexdigest()
+
+
+def _directorio_pdf(consentimiento_id):
+    return Path(settings.CONSENTIMIENTO_PDF_CACHE_DIR) / str(consentimiento_id)
+
+
+def _ruta_firma(consentimiento):
+    nombre = hashlib.md5(consentimiento.firma_paciente.name.encode()).hexdigest()
+    return _directorio_pdf(consentimiento.pk) / f"firma_{nombre}"
+
+
+def _podar_versiones(directorio, conservar):
+    """
+    Borra del directorio del consentimiento los renders y firmas de versiones
+    anteriores. Cambios de paciente, doctor o cita cambian la huella sin pasar
+    por invalidar_consentimiento_pdf, así que sin esto los PDFs viejos se
+    acumulan. Los .tmp son escrituras en curso de otra petición y se respetan.
+    """
+    try:
+        archivos = list(directorio.iterdir())
+    except OSError:
+        return
+    for archivo in archivos:
+        if archivo.name in conservar or archivo.suffix == ".tmp":
+            continue
+        try:
+            archivo.unlink(missing_ok=True)
+        except OSError:
+            logger.warning("No se pudo borrar %s del cache de PDFs", archivo)
+
+
+def _escribir_atomico(ruta, datos):
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    fd, temporal = tempfile.mkstemp(dir=ruta.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as archivo:
+            archivo.write(datos)
+        os.replace(temporal, ruta)
+    except BaseException:
+        Path(temporal).unlink(missing_ok=True)
+        raise
+
+
+def _leer_firma(consentimiento):
+    """
+    Bytes de la firma leídos por la API de storage (sirve igual con disco
+    local que con Cloudinary, que no tiene `.path`). La copia local vive en
+    el directorio de cache del consentimiento, así que se borra junto con
+    sus PDFs; el nombre de archivo entra en la clave porque cambia con cada
+    firma nueva.
+    """
+    firma = consentimiento.firma_paciente
+    if not firma:
+        return None
+
+    ruta = _ruta_firma(consentimiento)
+    try:
+        return ruta.read_bytes()
+    except FileNotFoundError:
+        pass
+
+    try:
+        with firma.storage.open(firma.name, "rb") as archivo:
+            datos = archivo.read()
+    except Exception:
+        logger.warning(
+            "No se pudo leer la firma del consentimiento %s",
+            consentimiento.pk,
+            exc_info=True,
+        )
+        return None
+
+    try:
+        _escribir_atomico(ruta, datos)
+    except OSError:
+        logger.warning(
+            "No se pudo guardar la firma del consentimiento %s en cache",
+            consentimiento.pk,
+            exc_info=True,
+        )
+    return datos
+
+
+def abrir_consentimiento_pdf(cita, consentimiento):
+    """
+    Archivo (abierto en modo binario) con el PDF del consentimiento.
+
+    Si ya existe el render de esta versión se lee del disco; si no, se
+    genera con build_consentimiento_pdf y se guarda de forma atómica
+    (archivo temporal + os.replace) para los siguientes downloads, y se
+    borran las versiones anteriores del mismo consentimiento.
+    Si el disco no es escribible se sirve el PDF desde memoria.
+    """
+    ruta = _directorio_pdf(consentimiento.pk) / f"{_huella_pdf(cita, consentimiento)}.pdf"
+    try:
+        return open(ruta, "rb")
+    except FileNotFoundError:
+        pass
+
+    pdf = build_consentimiento_pdf(cita, consentimiento)
+    try:
+        _escribir_atomico(ruta, pdf)
+    except OSError:
+        logger.warning(
+            "No se pudo guardar el PDF del consentimiento %s en cache",
+            consentimiento.pk,
+            exc_info=True,
+        )
+    else:
+        conservar = {ruta.name}
+        if consentimiento.firma_paciente:
+            conservar.add(_ruta_firma(consentimiento).name)
+        _podar_versiones(ruta.parent, conservar)
+    return BytesIO(pdf)
+
+
+def invalidar_consentimiento_pdf(consentimiento_id):
+    """Borra los renders guardados de un consentimiento (todas sus versiones)."""
+    shutil.rmtree(_directorio_pdf(consentimiento_id), ignore_errors=True)
@@ -0,0 +1,160 @@
+# archivo: backend/users/utils/pdf_layout.py
+"""
+Maquetado de texto para PDFs generados con ReportLab.
+
+Mide con las métricas reales de la fuente (`stringWidth`) en lugar de
+estimar caracteres por línea, así que las líneas no se desbordan ni se
+cortan antes de tiempo, y los saltos de página caen donde deben.
+"""
+
+from functools import lru_cache
+
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+
+class MetricasFuente:
+    """
+    Anchos de glifo de una fuente/tamaño, calculados una sola vez por
+    carácter. En las fuentes Type 1 estándar de ReportLab no hay kerning,
+    así que el ancho de un texto es exactamente la suma de sus glifos.
+    """
+
+    def __init__(self, nombre, tamano):
+        self.nombre = nombre
+        self.tamano = tamano
+        self._glifos = {}
+        self.espacio = self.ancho(" ")
+
+    def ancho(self, texto):
+        glifos = self._glifos
+        total = 0.0
+        for caracter in texto:
+            ancho = glifos.get(caracter)
+            if ancho is None:
+                ancho = glifos[caracter] = stringWidth(
+                    caracter, self.nombre, self.tamano
+                )
+            total += ancho
+        return total
+
+
+@lru_cache(maxsize=64)
+def metricas(nombre, tamano):
+    return MetricasFuente(nombre, tamano)
+
+
+def _partir_palabra(palabra, fuente, ancho_max):
+    """Corta una palabra más ancha que la línea en trozos que sí caben."""
+    trozos = []
+    actual = ""
+    ancho_actual = 0.0
+    for caracter in palabra:
+        ancho = fuente.ancho(caracter)
+        if actual and ancho_actual + ancho > ancho_max:
+            trozos.append(actual)
+            actual, ancho_actual = "", 0.0
+        actual += caracter
+        ancho_actual += ancho
+    if actual:
+        trozos.append(actual)
+    return trozos
+
+
+def partir_lineas(texto, fuente, ancho_max):
+    """
+    Reparte `texto` en líneas que caben en `ancho_max` (puntos) con la
+    fuente dada. Respeta los saltos de línea del texto; un párrafo vacío
+    produce una línea vacía.
+    """
+    lineas = []
+    for parrafo in (texto or "").split("\n"):
+        palabras = parrafo.split()
+        if not palabras:
+            lineas.append("")
+            continue
+
+        actual = []
+        ancho_actual = 0.0
+        for palabra in palabras:
+            ancho = fuente.ancho(palabra)
+            if ancho > ancho_max:
+                if actual:
+                    lineas.append(" ".join(actual))
+                *completos, resto = _partir_palabra(palabra, fuente, ancho_max)
+                lineas.extend(completos)
+                actual, ancho_actual = [resto], fuente.ancho(resto)
+                continue
+
+            nuevo = ancho_actual + (fuente.espacio if actual else 0) + ancho
+            if actual and nuevo > ancho_max:
+                lineas.append(" ".join(actual))
+                actual, ancho_actual = [palabra], ancho
+            else:
+                actual.append(palabra)
+                ancho_actual = nuevo
+        lineas.append(" ".join(actual))
+    return lineas
+
+
+class Maquetador:
+    """
+    Cursor vertical sobre un canvas con salto de página automático.
+
+    `y` es la línea base donde se dibujará lo siguiente; cada línea baja
+    `interlineado` puntos y ninguna línea base queda por debajo de
+    `y_inferior`. Antes de un bloque que no debe partirse se llama a
+    `asegurar_espacio` con la distancia entre la primera y la última línea
+    base del bloque; si no cabe, se abre una página nueva.
+    """
+
+    def __init__(self, canvas, x, y_superior, y_inferior, ancho):
+        self.canvas = canvas
+        self.x = x
+        self.y_superior = y_superior
+        self.y_inferior = y_inferior
+        self.ancho = ancho
+        self.y = y_superior
+        self.paginas = 1
+
+    def salto_pagina(self):
+        self.canvas.showPage()
+        self.paginas += 1
+        self.y = self.y_superior
+
+    def asegurar_espacio(self, alto):
+        # En una página recién abierta no se salta otra vez: un bloque más
+        # alto que la página simplemente continúa en la siguiente.
+        if self.y - alto < self.y_inferior and self.y < self.y_superior:
+            self.salto_pagina()
+
+    def espacio(self, alto):
+        self.y -= alto
+
+    def linea(self, texto, fuente="Helvetica", tamano=10, interlineado=14):
+        self.asegurar_espacio(0)
+        self.canvas.setFont(fuente, tamano)
+        self.canvas.drawString(self.x, self.y, texto)
+        self.y -= interlineado
+
+    def parrafo(
+        self,
+        texto,
+        fuente="Helvetica",
+        tamano=10,
+        interlineado=14,
+        lineas_minimas=1,
+    ):
+        """
+        Texto con ajuste de línea y saltos de página entre líneas.
+        `lineas_minimas` evita dejar las primeras líneas huérfanas al pie.
+        """
+        lineas = partir_lineas(texto, metricas(fuente, tamano), self.ancho)
+        self.asegurar_espacio(interlineado * (min(lineas_minimas, len(lineas)) - 1))
+        self.canvas.setFont(fuente, tamano)
+        for linea in lineas:
+            if self.y < self.y_inferior:
+                self.salto_pagina()
+                self.canvas.setFont(fuente, tamano)
+            if linea:
+                self.canvas.drawString(self.x, self.y, linea)
+            self.y -= interlineado
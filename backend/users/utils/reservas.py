@@ -0,0 +1,46 @@
+# archivo: backend/users/utils/reservas.py
+
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from ..models import Cita
+
+# Nombre de la constraint de Cita que garantiza un slot activo por doctor
+CONSTRAINT_SLOT = "unique_cita_doctor_slot_activo"
+
+
+class SlotOcupado(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "El doctor ya tiene una cita en esa fecha y hora."
+    default_code = "slot_ocupado"
+
+
+def subsecuentes_activas(tratamiento):
+    """Citas subsecuentes no canceladas de `tratamiento` (a lo más debe haber una)."""
+    return Cita.objects.filter(tratamiento=tratamiento, tipo="S").exclude(estado="X")
+
+
+@contextmanager
+def reservar_slot():
+    """
+    Único camino para escribir el slot (doctor, fecha_hora) de una cita.
+
+    La exclusividad la garantiza la constraint `unique_cita_doctor_slot_activo`
+    de Cita; aquí solo se aísla la escritura en un savepoint y se traduce la
+    colisión a un 409 limpio. Cualquier otro IntegrityError (FK, NOT NULL,
+    otra unicidad) se propaga tal cual:
+
+        with reservar_slot():
+            Cita.objects.create(...)   # o cita.save(update_fields=[...])
+    """
+    try:
+        with transaction.atomic():
+            yield
+    except IntegrityError as exc:
+        # SQLite, MySQL y PostgreSQL incluyen el nombre de la constraint
+        if CONSTRAINT_SLOT not in str(exc):
+            raise
+        raise SlotOcupado() from exc
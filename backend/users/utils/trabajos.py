@@ -0,0 +1,308 @@
+# archivo: backend/users/utils/trabajos.py
+
+import json
+import logging
+import statistics
+import tempfile
+import time
+import zipfile
+from datetime import timedelta
+
+from django.core.files import File
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import Consentimiento, TrabajoDocumento
+from .fechas import parse_fecha, rango_aware
+from .pdf_consentimiento import abrir_consentimiento_pdf
+
+logger = logging.getLogger("users.trabajos")
+
+# Mientras un trabajo corre, su worker renueva `latido_en` cada
+# LATIDO_INTERVALO. Un EN_PROCESO sin latido en LATIDO_VENCIDO se considera
+# huérfano (worker caído) y se vuelve a encolar, hasta MAX_INTENTOS veces;
+# un lote largo con su worker vivo no se reclama, dure lo que dure.
+LATIDO_INTERVALO = timedelta(seconds=30)
+LATIDO_VENCIDO = timedelta(minutes=5)
+MAX_INTENTOS = 3
+
+# Ventana máxima de /trabajos/metricas/
+MAX_HORAS_METRICAS = 24 * 90
+
+
+# =========================
+#  Tipos de trabajo
+# =========================
+
+def _consentimientos_zip(trabajo):
+    """
+    Todos los consentimientos de un paciente y/o rango de fechas de cita en
+    un ZIP. Cada PDF sale del cache de renders (abrir_consentimiento_pdf), así
+    que re-exportar un consentimiento sin cambios no vuelve a dibujarlo.
+    """
+    parametros = trabajo.parametros
+    qs = Consentimiento.objects.select_related(
+        "cita", "cita__paciente", "cita__doctor", "cita__especialidad"
+    )
+    if parametros.get("paciente"):
+        qs = qs.filter(cita__paciente_id=parametros["paciente"])
+    inicio, fin = rango_aware(
+        parse_fecha(parametros.get("desde")), parse_fecha(parametros.get("hasta"))
+    )
+    if inicio:
+        qs = qs.filter(cita__fecha_hora__gte=inicio)
+    if fin:
+        qs = qs.filter(cita__fecha_hora__lt=fin)
+
+    # El ZIP se arma en un temporal local y se sube completo al storage del
+    # campo, que es el que lee la web (posiblemente en otro host)
+    documentos = 0
+    latido = Latido()
+    with tempfile.TemporaryFile(suffix=".zip") as temporal:
+        with zipfile.ZipFile(temporal, "w", compression=zipfile.ZIP_DEFLATED) as zip_:
+            for consentimiento in qs.order_by("cita__fecha_hora", "pk").iterator(
+                chunk_size=200
+            ):
+                cita = consentimiento.cita
+                with abrir_consentimiento_pdf(cita, consentimiento) as pdf:
+                    zip_.writestr(
+                        f"consentimiento_cita_{cita.pk}.pdf", pdf.read()
+                    )
+                documentos += 1
+                latido([trabajo.pk])
+
+        temporal.seek(0)
+        campo = trabajo.archivo
+        nombre = campo.storage.save(
+            campo.field.generate_filename(trabajo, f"consentimientos_{trabajo.pk}.zip"),
+            File(temporal),
+        )
+
+    return nombre, documentos
+
+
+EJECUTORES = {
+    "CONSENTIMIENTOS_ZIP": _consentimientos_zip,
+}
+
+
+# =========================
+#  Cola
+# =========================
+
+def encolar(tipo, parametros, usuario):
+    return TrabajoDocumento.objects.create(
+        tipo=tipo,
+        parametros=parametros,
+        creado_por=usuario,
+        actualizado_por=usuario,
+    )
+
+
+def latir(trabajo_ids):
+    """Renueva el latido de los trabajos `trabajo_ids` que siguen EN_PROCESO."""
+    trabajo_ids = list(trabajo_ids)
+    if not trabajo_ids:
+        return 0
+    return TrabajoDocumento.objects.filter(
+        pk__in=trabajo_ids, estado="EN_PROCESO"
+    ).update(latido_en=timezone.now())
+
+
+class Latido:
+    """`latir` con throttle: a lo más un UPDATE por LATIDO_INTERVALO."""
+
+    def __init__(self):
+        self._ultimo = time.monotonic()
+
+    def __call__(self, trabajo_ids):
+        ahora = time.monotonic()
+        if ahora - self._ultimo >= LATIDO_INTERVALO.total_seconds():
+            self._ultimo = ahora
+            latir(trabajo_ids)
+
+
+def reencolar_huerfanos():
+    """
+    EN_PROCESO sin latido reciente vuelven a PENDIENTE (o a ERROR si
+    agotaron intentos). Filas sin latido (previas a este campo) se juzgan
+    por iniciado_en.
+    """
+    ahora = timezone.now()
+    limite = ahora - LATIDO_VENCIDO
+    vencidos = TrabajoDocumento.objects.filter(estado="EN_PROCESO").filter(
+        Q(latido_en__lt=limite) | Q(latido_en__isnull=True, iniciado_en__lt=limite)
+    )
+    vencidos.filter(intentos__gte=MAX_INTENTOS).update(
+        estado="ERROR",
+        error="El worker dejó de reportar latido",
+        terminado_en=ahora,
+        actualizado_en=ahora,
+    )
+    return vencidos.filter(intentos__lt=MAX_INTENTOS).update(
+        estado="PENDIENTE",
+        iniciado_en=None,
+        latido_en=None,
+        actualizado_en=ahora,
+    )
+
+
+def reclamar_siguiente():
+    """
+    Toma el PENDIENTE más antiguo con un UPDATE condicional: si otro worker
+    lo tomó primero el UPDATE afecta 0 filas y se prueba con el siguiente.
+    Funciona igual en MySQL y SQLite, sin SELECT ... FOR UPDATE.
+    """
+    candidatos = TrabajoDocumento.objects.filter(estado="PENDIENTE").order_by(
+        "creado_en", "pk"
+    ).values_list("pk", flat=True)
+    for trabajo_id in candidatos[:10]:
+        ahora = timezone.now()
+        tomado = TrabajoDocumento.objects.filter(
+            pk=trabajo_id, estado="PENDIENTE"
+        ).update(
+            estado="EN_PROCESO",
+            iniciado_en=ahora,
+            latido_en=ahora,
+            intentos=F("intentos") + 1,
+            actualizado_en=ahora,
+        )
+        if tomado:
+            return trabajo_id
+    return None
+
+
+def marcar_error(trabajo_id, mensaje, intentos=None):
+    """Pasa a ERROR un trabajo EN_PROCESO (del intento `intentos`, si se da)."""
+    ahora = timezone.now()
+    qs = TrabajoDocumento.objects.filter(pk=trabajo_id, estado="EN_PROCESO")
+    if intentos is not None:
+        qs = qs.filter(intentos=intentos)
+    return qs.update(
+        estado="ERROR",
+        error=mensaje[:2000],
+        terminado_en=ahora,
+        actualizado_en=ahora,
+    )
+
+
+def ejecutar_trabajo(trabajo_id):
+    """
+    Corre un trabajo ya reclamado (EN_PROCESO). Pensado para ejecutarse en
+    un proceso del pool; deja el resultado en la fila y emite una línea de
+    log JSON con espera en cola y duración.
+
+    El resultado solo se guarda si la fila sigue en el mismo intento: si el
+    trabajo se reencoló mientras corría (p. ej. el worker perdió la conexión
+    y dejó de latir), gana el intento nuevo y el archivo de este se borra.
+    """
+    trabajo = TrabajoDocumento.objects.get(pk=trabajo_id)
+    propio = TrabajoDocumento.objects.filter(
+        pk=trabajo_id, estado="EN_PROCESO", intentos=trabajo.intentos
+    )
+    inicio = time.perf_counter()
+    try:
+        archivo, documentos = EJECUTORES[trabajo.tipo](trabajo)
+    except Exception as exc:
+        logger.exception("Trabajo %s falló", trabajo_id)
+        marcar_error(trabajo_id, f"{type(exc).__name__}: {exc}", trabajo.intentos)
+        estado = "ERROR"
+        documentos = 0
+    else:
+        ahora = timezone.now()
+        guardado = propio.update(
+            estado="COMPLETADO",
+            archivo=archivo,
+            documentos=documentos,
+            error="",
+            terminado_en=ahora,
+            actualizado_en=ahora,
+        )
+        if guardado:
+            estado = "COMPLETADO"
+        else:
+            trabajo.archivo.storage.delete(archivo)
+            estado = "DESCARTADO"
+
+    espera = trabajo.espera
+    resultado = {
+        "evento": "trabajo_documento",
+        "trabajo": trabajo_id,
+        "tipo": trabajo.tipo,
+        "estado": estado,
+        "documentos": documentos,
+        "espera_ms": round(espera.total_seconds() * 1000, 2) if espera else None,
+        "duracion_ms": round((time.perf_counter() - inicio) * 1000, 2),
+    }
+    logger.info(json.dumps(resultado, ensure_ascii=False))
+    return resultado
+
+
+# =========================
+#  Métricas
+# =========================
+
+def _percentil(valores, q):
+    if not valores:
+        return None
+    if len(valores) == 1:
+        return round(valores[0], 3)
+    return round(statistics.quantiles(valores, n=100, method="inclusive")[q - 1], 3)
+
+
+def metricas_trabajos(ventana=timedelta(hours=24)):
+    """
+    Estado de la cola y rendimiento de los trabajos terminados en `ventana`:
+    throughput (trabajos y documentos por minuto) y latencia de cola
+    (creado_en -> iniciado_en) en segundos.
+    """
+    ahora = timezone.now()
+    pendientes = TrabajoDocumento.objects.filter(estado="PENDIENTE")
+    mas_antiguo = (
+        pendientes.order_by("creado_en").values_list("creado_en", flat=True).first()
+    )
+
+    terminados = list(
+        TrabajoDocumento.objects.filter(
+            terminado_en__gte=ahora - ventana,
+            iniciado_en__isnull=False,
+        ).values_list("estado", "documentos", "creado_en", "iniciado_en", "terminado_en")
+    )
+    esperas = sorted(
+        (iniciado - creado).total_seconds() for _, _, creado, iniciado, _ in terminados
+    )
+    duraciones = sorted(
+        (terminado - iniciado).total_seconds()
+        for _, _, _, iniciado, terminado in terminados
+    )
+    completados = [fila for fila in terminados if fila[0] == "COMPLETADO"]
+    minutos = ventana.total_seconds() / 60
+
+    def por_minuto(cantidad):
+        # Ventana de duración cero: no hay tasa que reportar (ni nan/inf,
+        # que no se pueden serializar a JSON)
+        return round(cantidad / minutos, 4) if minutos > 0 else None
+
+    return {
+        "ventana_horas": round(ventana.total_seconds() / 3600, 2),
+        "pendientes": pendientes.count(),
+        "en_proceso": TrabajoDocumento.objects.filter(estado="EN_PROCESO").count(),
+        "pendiente_mas_antiguo_segundos": (
+            round((ahora - mas_antiguo).total_seconds(), 3) if mas_antiguo else None
+        ),
+        "terminados": len(terminados),
+        "completados": len(completados),
+        "errores": len(terminados) - len(completados),
+        "trabajos_por_minuto": por_minuto(len(terminados)),
+        "documentos_por_minuto": por_minuto(sum(fila[1] for fila in completados)),
+        "espera_segundos": {
+            "p50": _percentil(esperas, 50),
+            "p95": _percentil(esperas, 95),
+            "max": round(esperas[-1], 3) if esperas else None,
+        },
+        "duracion_segundos": {
+            "p50": _percentil(duraciones, 50),
+            "p95": _percentil(duraciones, 95),
+            "max": round(duraciones[-1], 3) if duraciones else None,
+        },
+    }
@@ -0,0 +1,200 @@
+# archivo: backend/users/utils/transiciones.py
+"""
+Confirmación / cancelación de varias citas en una sola petición.
+
+Mismas reglas que CitaConfirmAPI y CitaCancelarPacienteAPI (caso ADMIN),
+pero con un número fijo de queries sin importar cuántas citas lleguen:
+
+1. Un SELECT ... FOR UPDATE de las citas, ya filtrado por permiso (el
+   doctor solo ve las suyas); las que no aparecen se reportan como no
+   encontradas.
+2. Al confirmar: un SELECT de los pagos de esas citas y otro de los
+   tratamientos activos de los pares (paciente, doctor) de las iniciales;
+   un bulk_create para los tratamientos que falten.
+3. Un bulk_update de las citas y otro de los pagos.
+
+bulk_create/bulk_update no emiten señales ni aplican auto_now, así que
+`actualizado_en` se asigna aquí y el dashboard de cada paciente tocado se
+invalida a mano al confirmar la transacción.
+"""
+
+from functools import partial
+
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import Cita, Pago, Tratamiento
+from .dashboard import dashboard_paciente
+
+ACCIONES = ("confirmar", "cancelar")
+MAX_CITAS_TRANSICION = 200
+
+ROLES_DOCTOR = ("DERMATOLOGO", "PODOLOGO", "TAMIZ")
+
+# Frecuencia con que CitaConfirmAPI abre el tratamiento de una cita inicial
+FRECUENCIA_TRATAMIENTO_INICIAL = 15
+
+CAMPOS_CITA = ("estado", "tratamiento", "actualizado_en", "actualizado_por")
+CAMPOS_PAGO = (
+    "estado_pago",
+    "verificado",
+    "pagado",
+    "fecha",
+    "actualizado_en",
+    "actualizado_por",
+)
+
+
+def _estados_origen(usuario, accion):
+    """Estados desde los que `usuario` puede aplicar `accion`."""
+    if accion == "cancelar" and usuario.role == "ADMIN":
+        return ("P", "C")
+    return ("P",)
+
+
+def _tratamientos_activos(pares):
+    """{(paciente_id, doctor_id): Tratamiento activo más reciente}."""
+    pacientes = {p for p, _ in pares}
+    doctores = {d for _, d in pares}
+    activos = {}
+    qs = Tratamiento.objects.filter(
+        paciente_id__in=pacientes,
+        doctor_id__in=doctores,
+        activo=True,
+    ).order_by("-fecha_inicio", "-id")
+    for tratamiento in qs:
+        par = (tratamiento.paciente_id, tratamiento.doctor_id)
+        if par in pares:
+            activos.setdefault(par, tratamiento)
+    return activos
+
+
+def _vincular_tratamientos(iniciales, usuario):
+    """
+    Liga cada cita inicial al tratamiento activo de su par (paciente,
+    doctor) y crea, en un solo bulk_create, los que no existan.
+    """
+    pares = {(c.paciente_id, c.doctor_id) for c in iniciales}
+    activos = _tratamientos_activos(pares)
+
+    faltantes = pares - activos.keys()
+    if faltantes:
+        nuevos = [
+            Tratamiento(
+                paciente_id=paciente_id,
+                doctor_id=doctor_id,
+                frecuencia_dias=FRECUENCIA_TRATAMIENTO_INICIAL,
+                creado_por=usuario,
+                actualizado_por=usuario,
+            )
+            for paciente_id, doctor_id in sorted(faltantes)
+        ]
+        Tratamiento.objects.bulk_create(nuevos)
+        if all(t.pk for t in nuevos):
+            activos.update(((t.paciente_id, t.doctor_id), t) for t in nuevos)
+        else:
+            # MySQL no devuelve los ids del INSERT múltiple; la constraint
+            # de un solo tratamiento activo por par permite releerlos.
+            activos.update(_tratamientos_activos(faltantes))
+
+    for cita in iniciales:
+        cita.tratamiento = activos[(cita.paciente_id, cita.doctor_id)]
+    return len(faltantes)
+
+
+def transicionar_citas(ids, accion, usuario):
+    """
+    Aplica `accion` ("confirmar" | "cancelar") a las citas `ids`.
+
+    Devuelve (resultados, resumen): un resultado por id, en el orden
+    recibido, con `ok`, el `estado` final y un `detail` cuando se omitió;
+    y los conteos de citas procesadas/omitidas, pagos verificados y
+    tratamientos creados.
+    """
+    ids = list(dict.fromkeys(ids))
+    estados_origen = _estados_origen(usuario, accion)
+    resultados = {}
+    pagos_verificados = []
+    tratamientos_creados = 0
+
+    with transaction.atomic():
+        qs = Cita.objects.select_for_update().filter(pk__in=ids)
+        if usuario.role in ROLES_DOCTOR:
+            qs = qs.filter(doctor=usuario)
+        citas = {
+            cita.pk: cita
+            for cita in qs.only(
+                "id", "estado", "tipo", "paciente_id", "doctor_id", "tratamiento_id"
+            )
+        }
+
+        procesables = []
+        for cita_id in ids:
+            cita = citas.get(cita_id)
+            if cita is None:
+                resultados[cita_id] = {
+                    "ok": False,
+                    "detail": "Cita no encontrada o sin permiso para procesarla.",
+                }
+            elif cita.estado not in estados_origen:
+                resultados[cita_id] = {
+                    "ok": False,
+                    "estado": cita.estado,
+                    "detail": "La cita ya fue procesada o cancelada.",
+                }
+            else:
+                procesables.append(cita)
+
+        ahora = timezone.now()
+        if procesables and accion == "confirmar":
+            # El "primer" pago de cada cita, como cita.pagos.first()
+            pagos = {}
+            for pago in Pago.objects.filter(
+                cita_id__in=[c.pk for c in procesables]
+            ).order_by("pk"):
+                pagos.setdefault(pago.cita_id, pago)
+
+            for pago in pagos.values():
+                pago.estado_pago = "APROBADO"
+                pago.verificado = True
+                pago.pagado = pago.total
+                pago.fecha = timezone.localdate(ahora)
+                pago.actualizado_en = ahora
+                pago.actualizado_por = usuario
+                pagos_verificados.append(pago)
+
+            iniciales = [c for c in procesables if c.tipo == "I"]
+            if iniciales:
+                tratamientos_creados = _vincular_tratamientos(iniciales, usuario)
+
+            for cita in procesables:
+                cita.estado = "C"
+                resultados[cita.pk] = {
+                    "ok": True,
+                    "estado": "C",
+                    "pago_asociado": cita.pk in pagos,
+                }
+        else:
+            for cita in procesables:
+                cita.estado = "X"
+                resultados[cita.pk] = {"ok": True, "estado": "X"}
+
+        for cita in procesables:
+            cita.actualizado_en = ahora
+            cita.actualizado_por = usuario
+
+        if procesables:
+            Cita.objects.bulk_update(procesables, CAMPOS_CITA)
+        if pagos_verificados:
+            Pago.objects.bulk_update(pagos_verificados, CAMPOS_PAGO)
+
+        for paciente_id in {c.paciente_id for c in procesables}:
+            transaction.on_commit(partial(dashboard_paciente.invalidar, paciente_id))
+
+    resumen = {
+        "procesadas": len(procesables),
+        "omitidas": len(ids) - len(procesables),
+        "pagos_verificados": len(pagos_verificados),
+        "tratamientos_creados": tratamientos_creados,
+    }
+    return [{"id": cita_id, **resultados[cita_id]} for cita_id in ids], resumen
@@ -1,13 +1,20 @@
 # backend/users/views.py
 import logging
-from datetime import datetime
+import math
+import os
+from datetime import datetime, timedelta
 from decimal import Decimal, InvalidOperation
 
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from django.shortcuts import get_object_or_404
 from django.core.exceptions import PermissionDenied
-from django.http import HttpResponse, Http404
+from django.http import FileResponse, Http404
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, prefetch_related_objects
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
 
 from rest_framework import generics, status, serializers, viewsets
 from rest_framework.response import Response
@@ -27,6 +34,7 @@ from .models import (
     Receta,
     RecetaMedicamento,
     ProcedimientoConsulta,
+    TrabajoDocumento,
 )
 from .serializers import (
     RegisterSerializer,
@@ -36,7 +44,10 @@ from .serializers import (
     UserSerializer,
     EspecialidadSerializer,
     HorarioSerializer,
+    HorarioSemanaSerializer,
     CitaSerializer,
+    CitaTransicionSerializer,
+    AgendaCitaSerializer,
     TratamientoSerializer,
     PagoSerializer,
     ConsentimientoSerializer,
@@ -44,45 +55,272 @@ from .serializers import (
     ReportePacienteSerializer,
     RecetaSerializer,
     ProcedimientoConsultaSerializer,
+    TrabajoDocumentoSerializer,
+    construir_included,
 )
+from .authentication import RefreshTokenConRol
 from .permissions import IsRoleMatching, IsAdmin, IsAdminRole
-from .utils.pdf_consentimiento import build_consentimiento_pdf
+from .pagination import KeysetPagination
+from .utils.pdf_consentimiento import abrir_consentimiento_pdf
+from .utils.disponibilidad import calcular_disponibilidad, MAX_DIAS_RANGO
+from .utils.reservas import reservar_slot, subsecuentes_activas, SlotOcupado
+from .utils.fechas import filtrar_rango_fechas, parse_fecha, rango_aware
+from .utils.catalogos import catalogo_especialidades
+from .utils.dashboard import dashboard_paciente
+from .utils.ingresos import (
+    PERIODOS,
+    filtrar_pagos_por_dia,
+    pagos_vigentes,
+    resumen_ingresos,
+)
+from .utils.analitica import MAX_DIAS_ANALITICA, calcular_ocupacion
+from .utils.exportacion import (
+    COLUMNAS_CITAS,
+    COLUMNAS_PACIENTES,
+    COLUMNAS_PAGOS,
+    EXPORTADORES,
+)
+from .utils.trabajos import MAX_HORAS_METRICAS, encolar, metricas_trabajos
+from .utils.comprobantes import ComprobanteUploadHandler, procesar_comprobante
+from .utils.horarios import reemplazar_semana
+from .utils.transiciones import transicionar_citas
+from .utils.condicional import (
+    anotar_versiones,
+    aplicar_validadores,
+    respuesta_no_modificada,
+    validador_pagina,
+    validador_queryset,
+    validadores_objeto,
+)
 
 logger = logging.getLogger(__name__)
 
 
+# =========================
+#  Proyección / formato normalizado
+# =========================
+
+
+class ProyeccionMixin:
+    """
+    Para vistas de listado/detalle cuyo serializer usa CamposDinamicosMixin.
+
+    - ?fields=id,fecha_hora,doctor   proyección de campos (sparse fieldset)
+    - ?formato=normalizado           paciente/doctor/especialidad (y la cita
+                                     de cada pago) salen como id y se mandan
+                                     una sola vez en `included`, keyed por id.
+    """
+
+    def campos_solicitados(self):
+        raw = self.request.query_params.get("fields")
+        if not raw:
+            return None
+        return [campo.strip() for campo in raw.split(",") if campo.strip()]
+
+    def es_normalizado(self):
+        return self.request.query_params.get("formato") == "normalizado"
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == "GET":
+            campos = self.campos_solicitados()
+            if campos is not None:
+                kwargs["fields"] = campos
+            if self.es_normalizado():
+                kwargs["normalizado"] = True
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        if not self.es_normalizado():
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        objetos = page if page is not None else list(queryset)
+
+        data = self.get_serializer(objetos, many=True).data
+        included = construir_included(objetos, self.campos_solicitados())
+
+        if page is not None:
+            response = self.get_paginated_response(data)
+            response.data["included"] = included
+            return response
+        return Response({"results": data, "included": included})
+
+
+def respuesta_con_etag(request, datos, etag, max_age=None):
+    """
+    Response con ETag + Cache-Control; devuelve 304 sin cuerpo si el cliente
+    ya tiene esa versión (If-None-Match).
+    """
+    if max_age is None:
+        max_age = getattr(settings, "CATALOGO_CACHE_TTL", 300)
+
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(datos)
+
+    response["ETag"] = etag
+    patch_cache_control(response, public=True, max_age=max_age)
+    return response
+
+
+# =========================
+#  GET condicional (ETag / Last-Modified)
+# =========================
+
+
+class DetalleCondicionalMixin:
+    """
+    GET condicional para vistas de detalle sobre modelos de AuditMixin.
+
+    El ETag sale de actualizado_en de la fila y de la versión (max
+    actualizado_en + conteo) de `relaciones_version`, anotadas en la misma
+    query de get_object(). Si el cliente ya tiene esa versión se responde 304
+    sin serializar ni cargar los prefetch (`get_prefetch_diferido`).
+    """
+
+    relaciones_version = ()
+    prefetch_diferido = ()
+
+    def get_prefetch_diferido(self):
+        return self.prefetch_diferido
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method == "GET":
+            return anotar_versiones(queryset, self.relaciones_version)
+        return queryset.prefetch_related(*self.get_prefetch_diferido())
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified = validadores_objeto(
+            instance,
+            self.relaciones_version,
+            request.META.get("QUERY_STRING", ""),
+        )
+
+        response = respuesta_no_modificada(request, etag, last_modified)
+        if response is None:
+            prefetch = self.get_prefetch_diferido()
+            if prefetch:
+                prefetch_related_objects([instance], *prefetch)
+            response = Response(self.get_serializer(instance).data)
+
+        return aplicar_validadores(response, etag, last_modified)
+
+
+class ListadoCondicionalMixin:
+    """
+    GET condicional para listados, más usuario y query string en el ETag:
+
+    - Paginado (KeysetPagination): versión de las filas de la página pedida
+      (pks + actualizado_en y, con `relaciones_version`, un agregado sobre
+      esos pks). El costo es el de una página, no el del listado completo.
+    - Sin paginar (?paginar=0): agregado sobre el queryset filtrado completo.
+
+    Un dashboard que refresca sin cambios recibe 304 sin serializar nada.
+    """
+
+    relaciones_version = ()
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        extra = (request.user.pk, request.META.get("QUERY_STRING", ""))
+
+        paginador = self.paginator
+        pagina = None
+        if isinstance(paginador, KeysetPagination):
+            pagina = paginador.consulta_pagina(queryset, request, view=self)
+        if pagina is not None:
+            etag = validador_pagina(pagina, self.relaciones_version, *extra)
+        else:
+            etag = validador_queryset(queryset, self.relaciones_version, *extra)
+
+        response = respuesta_no_modificada(request, etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+
+        return aplicar_validadores(response, etag)
+
+
+class ExportacionMixin:
+    """
+    Exportación (solo ADMIN) de un listado existente, con sus mismos filtros:
+    ?formato=csv|xlsx (csv por defecto). Las filas se leen por lotes keyset
+    sobre `keyset_ordering` y se escriben al vuelo (ver utils/exportacion.py),
+    así que ni el queryset ni el archivo se materializan en memoria.
+    """
+
+    permission_classes = [IsAuthenticated, IsAdmin]
+    http_method_names = ["get", "head", "options"]
+    pagination_class = None
+    columnas_exportacion = ()
+    nombre_exportacion = "exportacion"
+
+    def list(self, request, *args, **kwargs):
+        formato = request.query_params.get("formato", "csv")
+        exportar = EXPORTADORES.get(formato)
+        if exportar is None:
+            return Response(
+                {"error": "formato debe ser csv o xlsx"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        nombre = f"{self.nombre_exportacion}_{timezone.localdate():%Y%m%d}"
+        return exportar(
+            self.filter_queryset(self.get_queryset()),
+            self.columnas_exportacion,
+            self.keyset_ordering,
+            nombre,
+        )
+
+
 # =========================
 #  Admin Users CRUD
 # =========================
 
 
+def buscar_usuarios(qs, texto):
+    """
+    Filtra usuarios por `?search=`: cada palabra debe aparecer en nombre,
+    apellidos o teléfono (o ser la edad exacta).
+    """
+    for palabra in (texto or "").split():
+        condicion = (
+            Q(nombre__icontains=palabra)
+            | Q(apellidos__icontains=palabra)
+            | Q(telefono__icontains=palabra)
+        )
+        if palabra.isdigit() and len(palabra) <= 3:
+            condicion |= Q(edad=int(palabra))
+        qs = qs.filter(condicion)
+    return qs
+
+
 class UserAdminViewSet(viewsets.ModelViewSet):
 
 
     queryset = User.objects.all().order_by("-id")
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated, IsAdminRole]
+    pagination_class = KeysetPagination
+    keyset_ordering = ("-id",)
 
-def actualizar_estado_cita_atendida(cita, usuario=None):
-
-    if cita is None:
-        return
+    def get_queryset(self):
+        qs = super().get_queryset()
 
-    tiene_reporte_final = ReportePaciente.objects.filter(
-        cita=cita,
-        estado="FINAL",
-    ).exists()
-    tiene_receta = Receta.objects.filter(cita=cita).exists()
+        # Filtros del panel: con el listado paginado ya no se pueden aplicar
+        # en el cliente sobre la lista completa.
+        tipo = (self.request.query_params.get("tipo") or "").upper()
+        search = self.request.query_params.get("search")
 
-    nuevo_valor = bool(tiene_reporte_final and tiene_receta)
+        if tipo == "PACIENTES":
+            qs = qs.filter(role="PACIENTE")
+        elif tipo == "ESPECIALISTAS":
+            qs = qs.filter(role__in=["DERMATOLOGO", "PODOLOGO", "TAMIZ"])
 
-    if cita.atendida != nuevo_valor:
-        cita.atendida = nuevo_valor
-        if usuario is not None:
-            cita.actualizado_por = usuario
-            cita.save(update_fields=["atendida", "actualizado_por"])
-        else:
-            cita.save(update_fields=["atendida"])
+        return buscar_usuarios(qs, search)
 
 
 def obtener_motivo_tratamiento_desde_cita(cita):
@@ -190,7 +428,7 @@ class LoginView(APIView):
         )
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data["user"]
-        refresh = RefreshToken.for_user(user)
+        refresh = RefreshTokenConRol.for_user(user)
         access_token = str(refresh.access_token)
         return Response(
             {
@@ -224,6 +462,35 @@ class DashboardView(APIView):
         )
 
 
+class MiDashboardAPI(APIView):
+    """
+    GET /me/dashboard/  (solo PACIENTE)
+
+    Bootstrap del dashboard del paciente en una sola petición: citas
+    próximas y pasadas, pagos en revisión, tratamiento activo con
+    `proxima_cita` y últimas recetas (ver utils/dashboard.py).
+    Cacheado por paciente; cualquier escritura sobre sus citas, pagos,
+    tratamientos, procedimientos o recetas lo invalida (users/signals.py).
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        if user.role != "PACIENTE":
+            return Response(
+                {"error": "Este endpoint es solo para pacientes."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        entrada = dashboard_paciente.obtener(user.id, context={"request": request})
+
+        response = respuesta_no_modificada(request, entrada.etag)
+        if response is None:
+            response = Response(entrada.datos, status=status.HTTP_200_OK)
+        return aplicar_validadores(response, entrada.etag)
+
+
 class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -239,19 +506,51 @@ class LogoutView(APIView):
 # =========================
 
 class EspecialidadListAPI(generics.ListAPIView):
+    """
+    Catálogo público de especialidades servido desde cache versionada
+    (se invalida con post_save/post_delete de Especialidad).
+    Soporta If-None-Match -> 304.
+    """
+
     serializer_class = EspecialidadSerializer
     permission_classes = [AllowAny]
 
     def get_queryset(self):
         return Especialidad.objects.all()
 
+    def list(self, request, *args, **kwargs):
+        entrada = catalogo_especialidades.obtener()
+        return respuesta_con_etag(request, entrada.datos, entrada.etag)
+
 
 class HorarioDisponibleAPI(APIView):
+    """
+    Horas libres por especialidad.
+
+    - Modo día:   ?especialidad=<id>&fecha=YYYY-MM-DD
+      -> { "horas_disponibles": ["09:00", ...] }
+    - Modo rango: ?especialidad=<id>&fecha_desde=YYYY-MM-DD&fecha_hasta=YYYY-MM-DD[&doctor=<id>]
+      -> { "dias": { "YYYY-MM-DD": ["09:00", ...], ... } }
+
+    Ambos modos resuelven la disponibilidad con un número fijo de queries.
+    """
+
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         especialidad_id = request.query_params.get("especialidad")
         fecha_str = request.query_params.get("fecha")
+        fecha_desde_str = request.query_params.get("fecha_desde")
+        fecha_hasta_str = request.query_params.get("fecha_hasta")
+        doctor_id = request.query_params.get("doctor")
+
+        if fecha_desde_str or fecha_hasta_str:
+            return self._get_rango(
+                especialidad_id,
+                fecha_desde_str,
+                fecha_hasta_str,
+                doctor_id,
+            )
 
         if not especialidad_id or not fecha_str:
             return Response(
@@ -267,29 +566,52 @@ class HorarioDisponibleAPI(APIView):
                 status=400,
             )
 
-        dia_semana = fecha_date.weekday() + 1
-        if dia_semana == 7:
-            return Response({"horas_disponibles": []}, status=200)
+        dias = calcular_disponibilidad(
+            especialidad_id,
+            fecha_date,
+            fecha_date,
+            doctor_id=doctor_id,
+        )
+        return Response({"horas_disponibles": dias[fecha_date]}, status=200)
 
-        horarios = (
-            Horario.objects.filter(
-                especialidad_id=especialidad_id,
-                dia_semana=dia_semana,
+    def _get_rango(self, especialidad_id, fecha_desde_str, fecha_hasta_str, doctor_id):
+        if not especialidad_id or not fecha_desde_str or not fecha_hasta_str:
+            return Response(
+                {"error": "Especialidad, fecha_desde y fecha_hasta requeridas"},
+                status=400,
             )
-            .select_related("doctor")
-            .order_by("hora_inicio")
-        )
 
-        horas_disponibles = []
-        for h in horarios:
-            fecha_hora = datetime.combine(fecha_date, h.hora_inicio)
-            if not Cita.objects.filter(
-                doctor=h.doctor,
-                fecha_hora=fecha_hora,
-            ).exists():
-                horas_disponibles.append(h.hora_inicio.strftime("%H:%M"))
+        try:
+            fecha_desde = datetime.strptime(fecha_desde_str, "%Y-%m-%d").date()
+            fecha_hasta = datetime.strptime(fecha_hasta_str, "%Y-%m-%d").date()
+        except ValueError:
+            return Response(
+                {"error": "Formato de fecha inválido (YYYY-MM-DD)"},
+                status=400,
+            )
 
-        return Response({"horas_disponibles": horas_disponibles}, status=200)
+        if fecha_hasta < fecha_desde:
+            return Response(
+                {"error": "fecha_hasta no puede ser anterior a fecha_desde"},
+                status=400,
+            )
+
+        if (fecha_hasta - fecha_desde).days >= MAX_DIAS_RANGO:
+            return Response(
+                {"error": f"El rango no puede exceder {MAX_DIAS_RANGO} días"},
+                status=400,
+            )
+
+        dias = calcular_disponibilidad(
+            especialidad_id,
+            fecha_desde,
+            fecha_hasta,
+            doctor_id=doctor_id,
+        )
+        return Response(
+            {"dias": {fecha.isoformat(): horas for fecha, horas in dias.items()}},
+            status=200,
+        )
 
 
 class HorarioCreateAPI(generics.CreateAPIView):
@@ -303,21 +625,87 @@ class HorarioCreateAPI(generics.CreateAPIView):
         serializer.save(doctor=self.request.user)
 
 
+class HorarioSemanaAPI(APIView):
+    """
+    Semana de horarios de un doctor.
+
+    - GET: bloques actuales, ordenados por día y hora.
+    - PUT {"horarios": [{dia_semana, hora_inicio, hora_fin}, ...]}: reemplaza
+      la semana completa de una vez, rechazando bloques traslapados.
+
+    Los doctores editan la suya; ADMIN indica el doctor con ?doctor=<id>
+    (GET) o "doctor" en el body (PUT).
+    """
+
+    permission_classes = [IsAuthenticated]
+    roles_doctor = ["DERMATOLOGO", "PODOLOGO"]
+
+    def _get_doctor(self, request, doctor_id):
+        user = request.user
+        if user.role == "ADMIN":
+            if not doctor_id:
+                raise serializers.ValidationError({"doctor": "Este campo es obligatorio."})
+            return get_object_or_404(
+                User.objects.select_related("especialidad"),
+                pk=doctor_id,
+                role__in=["DERMATOLOGO", "PODOLOGO", "TAMIZ"],
+            )
+        if user.role in self.roles_doctor:
+            return user
+        raise PermissionDenied("No tienes permiso para modificar horarios")
+
+    def _respuesta(self, doctor, **extra):
+        horarios = Horario.objects.filter(doctor=doctor).order_by(
+            "dia_semana", "hora_inicio"
+        )
+        return Response(
+            {
+                "doctor": doctor.pk,
+                **extra,
+                "horarios": HorarioSerializer(horarios, many=True).data,
+            }
+        )
+
+    def get(self, request):
+        doctor = self._get_doctor(request, request.query_params.get("doctor"))
+        return self._respuesta(doctor)
+
+    def put(self, request):
+        doctor = self._get_doctor(request, request.data.get("doctor"))
+        if doctor.especialidad is None:
+            return Response(
+                {"error": "El doctor no tiene especialidad asignada."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        serializer = HorarioSemanaSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        resumen = reemplazar_semana(
+            doctor, doctor.especialidad, serializer.validated_data["horarios"]
+        )
+        return self._respuesta(doctor, **resumen)
+
+
 # =========================
 #  Citas
 # =========================
 
-class CitaListCreateAPI(generics.ListCreateAPIView):
+class CitaListCreateAPI(
+    ListadoCondicionalMixin,
+    ProyeccionMixin,
+    generics.ListCreateAPIView,
+):
     queryset = Cita.objects.all()
     serializer_class = CitaSerializer
     permission_classes = [IsAuthenticated]
+    relaciones_version = ("tratamiento", "pagos", "procedimientos")
+    pagination_class = KeysetPagination
+    keyset_ordering = ("fecha_hora", "id")
 
     def get_queryset(self):
-        qs = (
-            super()
-            .get_queryset()
-            .select_related("paciente", "doctor", "especialidad")
-            .prefetch_related("pagos", "procedimientos")
+        qs = CitaSerializer.optimizar_queryset(
+            super().get_queryset(),
+            campos=self.campos_solicitados(),
         )
 
         user = self.request.user
@@ -346,21 +734,8 @@ class CitaListCreateAPI(generics.ListCreateAPIView):
         if especialidad_id:
             qs = qs.filter(especialidad_id=especialidad_id)
 
-        # Filtros por rango de fechas (YYYY-MM-DD)
-        if fecha_desde_str:
-            try:
-                fecha_desde = datetime.strptime(fecha_desde_str, "%Y-%m-%d").date()
-                qs = qs.filter(fecha_hora__date__gte=fecha_desde)
-            except ValueError:
-                # Si el formato es inválido, ignoramos el filtro sin romper la API
-                pass
-
-        if fecha_hasta_str:
-            try:
-                fecha_hasta = datetime.strptime(fecha_hasta_str, "%Y-%m-%d").date()
-                qs = qs.filter(fecha_hora__date__lte=fecha_hasta)
-            except ValueError:
-                pass
+        # Filtros por rango de fechas (YYYY-MM-DD, formato inválido se ignora)
+        qs = filtrar_rango_fechas(qs, "fecha_hora", fecha_desde_str, fecha_hasta_str)
 
         return qs.order_by("fecha_hora")
 
@@ -406,16 +781,18 @@ class CitaListCreateAPI(generics.ListCreateAPIView):
             .order_by("hora_inicio")
         )
 
-        horario_disponible = None
-        for h in horarios:
-            if h.hora_inicio <= hora < h.hora_fin:
-                if not Cita.objects.filter(
-                    doctor=h.doctor, fecha_hora=fecha_hora
-                ).exists():
-                    horario_disponible = h
-                    break
+        candidatos = [h for h in horarios if h.hora_inicio <= hora < h.hora_fin]
+        ocupados = set(
+            Cita.objects.filter(
+                doctor_id__in=[h.doctor_id for h in candidatos],
+                fecha_hora=fecha_hora,
+            )
+            .exclude(estado="X")
+            .values_list("doctor_id", flat=True)
+        )
+        horarios_libres = [h for h in candidatos if h.doctor_id not in ocupados]
 
-        if not horario_disponible:
+        if not horarios_libres:
             raise serializers.ValidationError(
                 {"horario": "No hay horarios disponibles para esa fecha y hora."}
             )
@@ -433,27 +810,49 @@ class CitaListCreateAPI(generics.ListCreateAPIView):
         else:
             metodo_pago_preferido = None
 
-        serializer.save(
-            paciente=self.request.user,
-            doctor=horario_disponible.doctor,
-            especialidad=especialidad,
-            fecha_hora=fecha_hora,
-            metodo_pago_preferido=metodo_pago_preferido,
-            creado_por=self.request.user,
-            actualizado_por=self.request.user,
-        )
+        # Si otro paciente gana el slot entre la lectura y el INSERT, la
+        # constraint lo rechaza y probamos con el siguiente doctor libre.
+        for horario in horarios_libres:
+            try:
+                with reservar_slot():
+                    serializer.save(
+                        paciente=self.request.user,
+                        doctor=horario.doctor,
+                        especialidad=especialidad,
+                        fecha_hora=fecha_hora,
+                        metodo_pago_preferido=metodo_pago_preferido,
+                        creado_por=self.request.user,
+                        actualizado_por=self.request.user,
+                    )
+                return
+            except SlotOcupado:
+                continue
+
+        raise SlotOcupado()
+
 
+class CitaExportAPI(ExportacionMixin, CitaListCreateAPI):
+    """GET /citas/exportar/?formato=csv|xlsx  (filtros de GET /citas/)"""
 
-class CitaDetailAPI(generics.RetrieveAPIView):
+    columnas_exportacion = COLUMNAS_CITAS
+    nombre_exportacion = "citas"
+
+
+class CitaDetailAPI(DetalleCondicionalMixin, ProyeccionMixin, generics.RetrieveAPIView):
     serializer_class = CitaSerializer
     permission_classes = [IsAuthenticated]
+    relaciones_version = ("tratamiento", "pagos", "procedimientos")
 
     def get_queryset(self):
-        return (
-            Cita.objects.select_related("paciente", "doctor", "especialidad")
-            .prefetch_related("pagos", "procedimientos")
+        return CitaSerializer.optimizar_queryset(
+            Cita.objects.all(),
+            campos=self.campos_solicitados(),
+            prefetch=False,
         )
 
+    def get_prefetch_diferido(self):
+        return CitaSerializer.prefetches(self.campos_solicitados())
+
     def get_object(self):
         cita = super().get_object()
         user = self.request.user
@@ -464,6 +863,91 @@ class CitaDetailAPI(generics.RetrieveAPIView):
         return cita
 
 
+# =========================
+#  Agenda del doctor
+# =========================
+
+MAX_DIAS_AGENDA = 31
+
+
+class AgendaDoctorAPI(APIView):
+    """
+    GET /agenda/?doctor=&desde=&hasta=   (fechas YYYY-MM-DD, inclusive)
+
+    Citas del doctor en la ventana, cada una con resumen de pagos,
+    procedimientos, consentimiento, reporte FINAL, receta y tratamiento,
+    en un número fijo de queries (ver AgendaCitaSerializer.optimizar_queryset).
+
+    - Doctor: siempre su propia agenda (`doctor` distinto -> 403).
+    - Admin: `doctor` opcional; sin él, la agenda de todos los doctores.
+    - Sin `desde` se usa hoy; sin `hasta`, el mismo día que `desde`.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        doctor_id = request.query_params.get("doctor")
+
+        if user.role in ["DERMATOLOGO", "PODOLOGO", "TAMIZ"]:
+            if doctor_id and str(doctor_id) != str(user.id):
+                return Response(
+                    {"error": "Solo puedes consultar tu propia agenda."},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+            doctor_id = user.id
+        elif user.role != "ADMIN":
+            return Response(
+                {"error": "No tienes permiso para consultar la agenda."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        elif doctor_id and not str(doctor_id).isdigit():
+            return Response(
+                {"error": "doctor inválido"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        desde_str = request.query_params.get("desde")
+        hasta_str = request.query_params.get("hasta")
+        desde = parse_fecha(desde_str) if desde_str else timezone.localdate()
+        hasta = parse_fecha(hasta_str) if hasta_str else desde
+        if desde is None or hasta is None:
+            return Response(
+                {"error": "Formato de fecha inválido (YYYY-MM-DD)"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if hasta < desde:
+            return Response(
+                {"error": "hasta no puede ser anterior a desde"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if (hasta - desde).days >= MAX_DIAS_AGENDA:
+            return Response(
+                {"error": f"El rango no puede exceder {MAX_DIAS_AGENDA} días"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        inicio, fin = rango_aware(desde, hasta)
+        citas = Cita.objects.filter(fecha_hora__gte=inicio, fecha_hora__lt=fin)
+        if doctor_id:
+            citas = citas.filter(doctor_id=doctor_id)
+        citas = AgendaCitaSerializer.optimizar_queryset(citas).order_by(
+            "fecha_hora", "id"
+        )
+
+        return Response(
+            {
+                "doctor": int(doctor_id) if doctor_id else None,
+                "desde": desde.isoformat(),
+                "hasta": hasta.isoformat(),
+                "citas": AgendaCitaSerializer(citas, many=True).data,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
 class CitaSubsecuenteCreateAPI(APIView):
 
     permission_classes = [IsAuthenticated]
@@ -487,10 +971,7 @@ class CitaSubsecuenteCreateAPI(APIView):
             )
 
         # Evitar múltiples subsecuentes activos para el mismo tratamiento
-        subsecuente_existente = Cita.objects.filter(
-            tratamiento=tratamiento,
-            tipo="S",
-        ).exclude(estado="X").exists()
+        subsecuente_existente = subsecuentes_activas(tratamiento).exists()
         if subsecuente_existente:
             return Response(
                 {"error": "Ya existe una cita subsecuente activa para este tratamiento."},
@@ -525,31 +1006,28 @@ class CitaSubsecuenteCreateAPI(APIView):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            if Cita.objects.filter(
-                doctor=tratamiento.doctor,
-                fecha_hora=fecha_cita,
-            ).exists():
-                return Response(
-                    {"error": "La hora calculada ya está ocupada."},
-                    status=status.HTTP_400_BAD_REQUEST,
+            with reservar_slot():
+                Cita.objects.create(
+                    paciente=request.user,
+                    doctor=tratamiento.doctor,
+                    tipo="S",
+                    tratamiento=tratamiento,
+                    estado="P",
+                    fecha_hora=fecha_cita,
+                    especialidad=tratamiento.doctor.especialidad,
+                    metodo_pago_preferido=cita_inicial.metodo_pago_preferido,
+                    creado_por=request.user,
+                    actualizado_por=request.user,
                 )
-
-            Cita.objects.create(
-                paciente=request.user,
-                doctor=tratamiento.doctor,
-                tipo="S",
-                tratamiento=tratamiento,
-                estado="P",
-                fecha_hora=fecha_cita,
-                especialidad=tratamiento.doctor.especialidad,
-                metodo_pago_preferido=cita_inicial.metodo_pago_preferido,
-                creado_por=request.user,
-                actualizado_por=request.user,
-            )
             return Response(
                 {"message": "Cita subsecuente agendada correctamente."},
                 status=status.HTTP_201_CREATED,
             )
+        except SlotOcupado:
+            return Response(
+                {"error": "La hora calculada ya está ocupada."},
+                status=status.HTTP_409_CONFLICT,
+            )
         except Exception as e:
             return Response(
                 {"error": f"Error al agendar la cita: {str(e)}"},
@@ -569,10 +1047,15 @@ class CitaProgramarSubsecuenteAPI(APIView):
       validando horario disponible y evitando colisiones.
     - Si no existe Tratamiento activo para la pareja paciente-doctor, se crea uno
       y se vinculan tanto la cita inicial como la subsecuente.
+
+    Todo corre en una transacción: si el slot ya está tomado (409), el
+    tratamiento creado, su nombre y la vinculación de la cita inicial se
+    revierten.
     """
 
     permission_classes = [IsAuthenticated]
 
+    @transaction.atomic
     def post(self, request, pk):
         user = request.user
         cita_inicial = get_object_or_404(
@@ -640,18 +1123,6 @@ class CitaProgramarSubsecuenteAPI(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Validar que no haya otra cita (no cancelada) en ese mismo slot
-        conflicto = Cita.objects.filter(
-            doctor=cita_inicial.doctor,
-            fecha_hora=fecha_hora,
-        ).exclude(estado="X").exists()
-
-        if conflicto:
-            return Response(
-                {"detail": "El doctor ya tiene una cita en esa fecha y hora."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
         # Resolver tratamiento activo
         tratamiento = cita_inicial.tratamiento
         if not tratamiento:
@@ -689,10 +1160,7 @@ class CitaProgramarSubsecuenteAPI(APIView):
             )
 
         # Evitar múltiples subsecuentes activas para el mismo tratamiento
-        subsecuente_existente = Cita.objects.filter(
-            tratamiento=tratamiento,
-            tipo="S",
-        ).exclude(estado="X").exists()
+        subsecuente_existente = subsecuentes_activas(tratamiento).exists()
         if subsecuente_existente:
             return Response(
                 {"detail": "Ya existe una cita subsecuente activa para este tratamiento."},
@@ -715,18 +1183,20 @@ class CitaProgramarSubsecuenteAPI(APIView):
             cita_inicial.actualizado_por = user
             cita_inicial.save(update_fields=["tratamiento", "actualizado_por"])
 
-        nueva_cita = Cita.objects.create(
-            paciente=cita_inicial.paciente,
-            doctor=cita_inicial.doctor,
-            especialidad=cita_inicial.especialidad,
-            fecha_hora=fecha_hora,
-            tipo="S",
-            estado="P",
-            tratamiento=tratamiento,
-            metodo_pago_preferido=cita_inicial.metodo_pago_preferido,
-            creado_por=user,
-            actualizado_por=user,
-        )
+        # El slot (no cancelado) lo garantiza la constraint de Cita -> 409
+        with reservar_slot():
+            nueva_cita = Cita.objects.create(
+                paciente=cita_inicial.paciente,
+                doctor=cita_inicial.doctor,
+                especialidad=cita_inicial.especialidad,
+                fecha_hora=fecha_hora,
+                tipo="S",
+                estado="P",
+                tratamiento=tratamiento,
+                metodo_pago_preferido=cita_inicial.metodo_pago_preferido,
+                creado_por=user,
+                actualizado_por=user,
+            )
 
         serializer = CitaSerializer(nueva_cita, context={"request": request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -956,22 +1426,12 @@ class CitaReprogramarAPI(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Validar que no se empalme con otra cita del mismo doctor
-        conflicto = Cita.objects.filter(
-            doctor=cita.doctor,
-            fecha_hora=nueva_fecha,
-        ).exclude(pk=cita.pk).exclude(estado="X").exists()
-
-        if conflicto:
-            return Response(
-                {"detail": "El doctor ya tiene una cita en esa nueva fecha y hora."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
         cita.fecha_hora = nueva_fecha
         cita.actualizado_por = user
-        # Mantenemos el estado (P o C) tal como está; no lo forzamos a P
-        cita.save(update_fields=["fecha_hora", "actualizado_por"])
+        # Mantenemos el estado (P o C) tal como está; no lo forzamos a P.
+        # Si se empalma con otra cita activa del doctor, la constraint -> 409.
+        with reservar_slot():
+            cita.save(update_fields=["fecha_hora", "actualizado_por"])
 
         serializer = CitaSerializer(cita, context={"request": request})
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -1053,6 +1513,39 @@ class CitaCancelarPacienteAPI(APIView):
             status=status.HTTP_200_OK,
         )
 
+
+class CitaTransicionAPI(APIView):
+    """
+    Confirma o cancela varias citas en una petición (panel de citas).
+
+    POST {"ids": [...], "accion": "confirmar" | "cancelar"}
+
+    Mismas reglas que CitaConfirmAPI: el doctor solo procesa sus citas
+    pendientes y ADMIN cualquiera (al cancelar, también las confirmadas).
+    Las citas que no se pueden procesar no detienen a las demás: la
+    respuesta trae un resultado por id.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        user = request.user
+        if user.role not in ["ADMIN", "DERMATOLOGO", "PODOLOGO", "TAMIZ"]:
+            raise PermissionDenied("No tienes permiso para procesar citas.")
+
+        serializer = CitaTransicionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        resultados, resumen = transicionar_citas(
+            serializer.validated_data["ids"],
+            serializer.validated_data["accion"],
+            user,
+        )
+        return Response(
+            {**resumen, "resultados": resultados},
+            status=status.HTTP_200_OK,
+        )
+
+
 class TratamientoAPI(generics.RetrieveUpdateAPIView):
 
     serializer_class = TratamientoSerializer
@@ -1116,9 +1609,14 @@ class TratamientoFinalizarAPI(APIView):
 #  Procedimientos en consulta
 # =========================
 
-class ProcedimientoConsultaListCreateAPI(generics.ListCreateAPIView):
+class ProcedimientoConsultaListCreateAPI(
+    ListadoCondicionalMixin,
+    generics.ListCreateAPIView,
+):
     serializer_class = ProcedimientoConsultaSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ("-creado_en", "-id")
 
     def get_queryset(self):
         user = self.request.user
@@ -1184,7 +1682,10 @@ class ProcedimientoConsultaListCreateAPI(generics.ListCreateAPIView):
         )
 
 
-class ProcedimientoConsultaDetailAPI(generics.RetrieveUpdateDestroyAPIView):
+class ProcedimientoConsultaDetailAPI(
+    DetalleCondicionalMixin,
+    generics.RetrieveUpdateDestroyAPIView,
+):
     queryset = ProcedimientoConsulta.objects.select_related(
         "cita", "paciente", "doctor"
     )
@@ -1220,6 +1721,13 @@ class PagoCreateAPI(generics.CreateAPIView):
     serializer_class = PagoSerializer
     permission_classes = [IsAuthenticated]
 
+    def initial(self, request, *args, **kwargs):
+        # Antes de que DRF parsee el multipart: el comprobante se valida
+        # (tipo y tamaño) mientras llega, no después de recibirlo completo.
+        self.comprobante_handler = ComprobanteUploadHandler(request._request)
+        request.upload_handlers.insert(0, self.comprobante_handler)
+        super().initial(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         paciente = self.request.user
 
@@ -1237,12 +1745,7 @@ class PagoCreateAPI(generics.CreateAPIView):
                 {"cita": "Solo puedes registrar pagos para citas en estado pendiente."}
             )
 
-        if Pago.objects.filter(
-            cita=cita,
-            metodo_pago="TRANSFERENCIA",
-            estado_pago__in=["PENDIENTE", "APROBADO"],
-            revertido=False,
-        ).exists():
+        if pagos_vigentes(cita, "TRANSFERENCIA").exists():
             raise serializers.ValidationError(
                 {
                     "non_field_errors": [
@@ -1251,6 +1754,10 @@ class PagoCreateAPI(generics.CreateAPIView):
                 }
             )
 
+        if self.comprobante_handler.error:
+            raise serializers.ValidationError(
+                {"comprobante": self.comprobante_handler.error}
+            )
         comprobante = self.request.FILES.get("comprobante")
         if not comprobante:
             raise serializers.ValidationError(
@@ -1268,6 +1775,10 @@ class PagoCreateAPI(generics.CreateAPIView):
                     {"total": "El total debe ser un número válido."}
                 )
 
+        # Re-codificado y miniatura en memoria; el save() del Pago escribe
+        # ambos archivos al storage de una vez.
+        comprobante, miniatura = procesar_comprobante(comprobante)
+
         serializer.save(
             paciente=paciente,
             cita=cita,
@@ -1277,6 +1788,7 @@ class PagoCreateAPI(generics.CreateAPIView):
             metodo_pago="TRANSFERENCIA",
             estado_pago="PENDIENTE",
             comprobante=comprobante,
+            comprobante_miniatura=miniatura,
             creado_por=paciente,
             actualizado_por=paciente,
         )
@@ -1314,12 +1826,7 @@ class PagoConsultorioCreateAPI(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        if Pago.objects.filter(
-            cita=cita,
-            metodo_pago="CONSULTORIO",
-            estado_pago__in=["PENDIENTE", "APROBADO"],
-            revertido=False,
-        ).exists():
+        if pagos_vigentes(cita, "CONSULTORIO").exists():
             return Response(
                 {
                     "detail": "Ya existe un pago en consultorio registrado para esta cita."
@@ -1403,15 +1910,19 @@ class PagoRevertAPI(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class PagoListAPI(generics.ListAPIView):
+class PagoListAPI(ListadoCondicionalMixin, ProyeccionMixin, generics.ListAPIView):
     serializer_class = PagoSerializer
     permission_classes = [IsAuthenticated]
+    relaciones_version = ("cita",)
+    pagination_class = KeysetPagination
+    keyset_ordering = ("-fecha", "-id")
 
     def get_queryset(self):
         user = self.request.user
         paciente_id = self.request.query_params.get("paciente")
         metodo = self.request.query_params.get("metodo_pago")
         estado_pago = self.request.query_params.get("estado_pago")
+        verificado = self.request.query_params.get("verificado")
 
         if user.role == "PACIENTE":
             qs = Pago.objects.filter(paciente=user)
@@ -1426,6 +1937,15 @@ class PagoListAPI(generics.ListAPIView):
             qs = qs.filter(metodo_pago=metodo)
         if estado_pago:
             qs = qs.filter(estado_pago=estado_pago)
+        if verificado:
+            qs = qs.filter(verificado=verificado.lower() in ("1", "true", "si", "sí"))
+
+        qs = filtrar_rango_fechas(
+            qs,
+            "fecha",
+            self.request.query_params.get("fecha_desde"),
+            self.request.query_params.get("fecha_hasta"),
+        )
 
         qs = qs.select_related(
             "paciente",
@@ -1438,6 +1958,133 @@ class PagoListAPI(generics.ListAPIView):
         return qs.order_by("-fecha", "-id")
 
 
+class PagoExportAPI(ExportacionMixin, PagoListAPI):
+    """GET /pagos/exportar/?formato=csv|xlsx  (filtros de GET /pagos/)"""
+
+    columnas_exportacion = COLUMNAS_PAGOS
+    nombre_exportacion = "pagos"
+
+
+class ResumenIngresosAPI(APIView):
+    """
+    GET /pagos/resumen/?fecha_desde=&fecha_hasta=&periodo=dia|semana|mes
+                       &doctor=<id>&especialidad=<id>
+
+    Totales, pagado, saldo pendiente y revertido agrupados por método,
+    estado, especialidad y periodo (días en la zona de la clínica), más el
+    costo de procedimientos por estado de pago. Todo con Sum/Count en la
+    base (ver utils/ingresos.py); reemplaza sumar el listado completo de
+    pagos en el frontend.
+
+    - Doctor: solo sus pagos/procedimientos.
+    - Admin: todos; `doctor` opcional.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        params = request.query_params
+
+        periodo = params.get("periodo", "dia")
+        if periodo not in PERIODOS:
+            return Response(
+                {"error": "periodo debe ser dia, semana o mes"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if user.role in ["DERMATOLOGO", "PODOLOGO", "TAMIZ"]:
+            pagos = Pago.objects.filter(cita__doctor=user)
+            procedimientos = ProcedimientoConsulta.objects.filter(doctor=user)
+        elif user.role == "ADMIN":
+            pagos = Pago.objects.all()
+            procedimientos = ProcedimientoConsulta.objects.all()
+            doctor_id = params.get("doctor")
+            if doctor_id:
+                pagos = pagos.filter(cita__doctor_id=doctor_id)
+                procedimientos = procedimientos.filter(doctor_id=doctor_id)
+        else:
+            return Response(
+                {"error": "No tienes permiso para consultar este resumen."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        especialidad_id = params.get("especialidad")
+        if especialidad_id:
+            pagos = pagos.filter(cita__especialidad_id=especialidad_id)
+            procedimientos = procedimientos.filter(
+                cita__especialidad_id=especialidad_id
+            )
+
+        fecha_desde = params.get("fecha_desde")
+        fecha_hasta = params.get("fecha_hasta")
+        pagos = filtrar_pagos_por_dia(pagos, fecha_desde, fecha_hasta)
+        procedimientos = filtrar_rango_fechas(
+            procedimientos, "creado_en", fecha_desde, fecha_hasta
+        )
+
+        return Response(
+            resumen_ingresos(pagos, procedimientos, periodo=periodo),
+            status=status.HTTP_200_OK,
+        )
+
+
+class AnaliticaOcupacionAPI(APIView):
+    """
+    GET /analitica/ocupacion/?desde=&hasta=&doctor=<id>   (solo ADMIN)
+
+    Ocupación de slots, tasa de cancelación, tasa de atendidas y
+    distribución de anticipación (fecha_hora - creado_en) por doctor.
+    Carga horarios y citas como arreglos y calcula todo vectorizado
+    (ver utils/analitica.py).
+
+    Sin `hasta` se usa hoy; sin `desde`, los 90 días anteriores a `hasta`.
+    """
+
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    def get(self, request):
+        params = request.query_params
+
+        doctor_id = params.get("doctor")
+        if doctor_id and not str(doctor_id).isdigit():
+            return Response(
+                {"error": "doctor inválido"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        desde_str = params.get("desde")
+        hasta_str = params.get("hasta")
+        hasta = parse_fecha(hasta_str) if hasta_str else timezone.localdate()
+        desde = parse_fecha(desde_str) if desde_str else None
+        if desde is None and not desde_str and hasta is not None:
+            desde = hasta - timedelta(days=89)
+        if desde is None or hasta is None:
+            return Response(
+                {"error": "Formato de fecha inválido (YYYY-MM-DD)"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if hasta < desde:
+            return Response(
+                {"error": "hasta no puede ser anterior a desde"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if (hasta - desde).days >= MAX_DIAS_ANALITICA:
+            return Response(
+                {"error": f"El rango no puede exceder {MAX_DIAS_ANALITICA} días"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(
+            calcular_ocupacion(
+                desde, hasta, doctor_ids=[int(doctor_id)] if doctor_id else None
+            ),
+            status=status.HTTP_200_OK,
+        )
+
+
 class TamizResultadosAPI(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -1488,11 +2135,19 @@ class CitaConsentimientoAPI(APIView):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        serializer = ConsentimientoSerializer(
-            consentimiento,
-            context={"request": request},
+        # La representación lee datos de la cita (tipo, especialidad), así que
+        # su versión también entra al ETag.
+        etag, last_modified = validadores_objeto(
+            consentimiento, (), cita.actualizado_en
         )
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        response = respuesta_no_modificada(request, etag, last_modified)
+        if response is None:
+            serializer = ConsentimientoSerializer(
+                consentimiento,
+                context={"request": request},
+            )
+            response = Response(serializer.data, status=status.HTTP_200_OK)
+        return aplicar_validadores(response, etag, last_modified)
 
     def post(self, request, pk):
         cita = self._get_cita(pk)
@@ -1655,8 +2310,11 @@ class CitaConsentimientoDownloadAPI(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, pk):
+        # Una sola query: el PDF cacheado se sirve sin volver a la base
         cita = get_object_or_404(
-            Cita.objects.select_related("paciente", "doctor", "especialidad"),
+            Cita.objects.select_related(
+                "paciente", "doctor", "especialidad", "consentimiento"
+            ),
             pk=pk,
         )
         user = request.user
@@ -1686,12 +2344,145 @@ class CitaConsentimientoDownloadAPI(APIView):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        pdf_bytes = build_consentimiento_pdf(cita, consentimiento)
+        return FileResponse(
+            abrir_consentimiento_pdf(cita, consentimiento),
+            as_attachment=True,
+            filename=f"consentimiento_cita_{cita.pk}.pdf",
+            content_type="application/pdf",
+        )
+
 
-        filename = f"consentimiento_cita_{cita.pk}.pdf"
-        response = HttpResponse(pdf_bytes, content_type="application/pdf")
-        response["Content-Disposition"] = f'attachment; filename="{filename}"'
-        return response
+# =========================
+#  Trabajos de documentos (cola en BD)
+# =========================
+
+class TrabajoConsentimientosZipAPI(APIView):
+    """
+    POST /trabajos/consentimientos-zip/  {paciente?, desde?, hasta?}  (ADMIN)
+
+    Encola un ZIP con todos los consentimientos del paciente y/o de las
+    citas en el rango (YYYY-MM-DD, inclusive) y responde 202 con el trabajo.
+    Lo ejecuta `manage.py procesar_trabajos`; el cliente consulta
+    GET /trabajos/<id>/ y descarga en `descarga_url` al completarse.
+    """
+
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    def post(self, request):
+        paciente_id = request.data.get("paciente")
+        desde_str = request.data.get("desde")
+        hasta_str = request.data.get("hasta")
+
+        if not (paciente_id or desde_str or hasta_str):
+            return Response(
+                {"error": "Indica paciente y/o rango de fechas (desde, hasta)"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if paciente_id and not str(paciente_id).isdigit():
+            return Response(
+                {"error": "paciente inválido"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        desde = parse_fecha(desde_str) if desde_str else None
+        hasta = parse_fecha(hasta_str) if hasta_str else None
+        if (desde_str and desde is None) or (hasta_str and hasta is None):
+            return Response(
+                {"error": "Formato de fecha inválido (YYYY-MM-DD)"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if desde and hasta and hasta < desde:
+            return Response(
+                {"error": "hasta no puede ser anterior a desde"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        parametros = {}
+        if paciente_id:
+            parametros["paciente"] = int(paciente_id)
+        if desde:
+            parametros["desde"] = desde.isoformat()
+        if hasta:
+            parametros["hasta"] = hasta.isoformat()
+
+        trabajo = encolar("CONSENTIMIENTOS_ZIP", parametros, request.user)
+        return Response(
+            TrabajoDocumentoSerializer(trabajo, context={"request": request}).data,
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class TrabajoDocumentoDetailAPI(generics.RetrieveAPIView):
+    """GET /trabajos/<id>/  estado del trabajo (quien lo pidió o ADMIN)."""
+
+    serializer_class = TrabajoDocumentoSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        qs = TrabajoDocumento.objects.all()
+        if user.role != "ADMIN":
+            qs = qs.filter(creado_por=user)
+        return qs
+
+
+class TrabajoDocumentoDescargarAPI(TrabajoDocumentoDetailAPI):
+    """GET /trabajos/<id>/descargar/  archivo generado (409 si no ha terminado)."""
+
+    def retrieve(self, request, *args, **kwargs):
+        trabajo = self.get_object()
+        if trabajo.estado != "COMPLETADO":
+            return Response(
+                {"error": "El trabajo aún no está completado.", "estado": trabajo.estado},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        # Se lee a través del storage: el worker que lo generó puede estar
+        # en otro host
+        try:
+            archivo = trabajo.archivo.open("rb")
+        except (FileNotFoundError, ValueError):
+            raise Http404("El archivo del trabajo ya no existe.")
+
+        return FileResponse(
+            archivo,
+            as_attachment=True,
+            filename=os.path.basename(trabajo.archivo.name),
+            content_type="application/zip",
+        )
+
+
+class TrabajoMetricasAPI(APIView):
+    """
+    GET /trabajos/metricas/?horas=24  (ADMIN)
+
+    Profundidad de la cola, throughput y latencia de cola / duración
+    (p50, p95, max) de los trabajos terminados en la ventana.
+    """
+
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    def get(self, request):
+        try:
+            horas = float(request.query_params.get("horas", 24))
+        except ValueError:
+            horas = 0
+        # float() acepta "nan" e "inf"; timedelta no
+        if not math.isfinite(horas) or horas <= 0:
+            return Response(
+                {"error": "horas debe ser un número positivo"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if horas > MAX_HORAS_METRICAS:
+            return Response(
+                {"error": f"horas no puede ser mayor a {MAX_HORAS_METRICAS}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(
+            metricas_trabajos(timedelta(hours=horas)),
+            status=status.HTTP_200_OK,
+        )
 
 
 # =========================
@@ -1701,6 +2492,8 @@ class CitaConsentimientoDownloadAPI(APIView):
 class PacienteListAPI(generics.ListAPIView):
     serializer_class = PacienteSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ("apellidos", "nombre", "id")
 
     def get_queryset(self):
         user = self.request.user
@@ -1715,9 +2508,18 @@ class PacienteListAPI(generics.ListAPIView):
         else:
             return User.objects.none()
 
+        qs = buscar_usuarios(qs, self.request.query_params.get("search"))
+
         return qs.order_by("apellidos", "nombre")
 
 
+class PacienteExportAPI(ExportacionMixin, PacienteListAPI):
+    """GET /pacientes/exportar/?formato=csv|xlsx"""
+
+    columnas_exportacion = COLUMNAS_PACIENTES
+    nombre_exportacion = "pacientes"
+
+
 class PacienteDetailAPI(generics.RetrieveUpdateDestroyAPIView):
     queryset = User.objects.filter(role="PACIENTE")
     serializer_class = PacienteSerializer
@@ -1733,9 +2535,14 @@ class PacienteDetailAPI(generics.RetrieveUpdateDestroyAPIView):
             )
 
 
-class PacienteCitasListAPI(generics.ListAPIView):
+class PacienteCitasListAPI(
+    ListadoCondicionalMixin,
+    ProyeccionMixin,
+    generics.ListAPIView,
+):
     serializer_class = CitaSerializer
     permission_classes = [IsAuthenticated]
+    relaciones_version = ("tratamiento", "pagos", "procedimientos")
 
     def get_queryset(self):
         user = self.request.user
@@ -1743,12 +2550,10 @@ class PacienteCitasListAPI(generics.ListAPIView):
 
         paciente = get_object_or_404(User, pk=paciente_id, role="PACIENTE")
 
-        base_qs = (
-            Cita.objects.select_related("paciente", "doctor", "especialidad")
-            .prefetch_related("pagos", "procedimientos")
-            .filter(paciente=paciente)
-            .order_by("fecha_hora")
-        )
+        base_qs = CitaSerializer.optimizar_queryset(
+            Cita.objects.filter(paciente=paciente),
+            campos=self.campos_solicitados(),
+        ).order_by("fecha_hora")
 
         if user.role == "PACIENTE":
             if user != paciente:
@@ -1769,6 +2574,8 @@ class PacienteCitasListAPI(generics.ListAPIView):
 class UserListAPI(generics.ListAPIView):
     serializer_class = BaseUserSerializer
     permission_classes = [IsAuthenticated, IsAdmin]
+    pagination_class = KeysetPagination
+    keyset_ordering = ("role", "apellidos", "nombre", "id")
 
     def get_queryset(self):
         return User.objects.all().order_by("role", "apellidos", "nombre")
@@ -1784,19 +2591,27 @@ class UserDetailAPI(generics.RetrieveUpdateDestroyAPIView):
 #  Reportes clínicos
 # =========================
 
-class ReportePacienteListCreateAPI(generics.ListCreateAPIView):
+class ReportePacienteListCreateAPI(ListadoCondicionalMixin, generics.ListCreateAPIView):
     serializer_class = ReportePacienteSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ("-creado_en", "-id")
 
     def get_queryset(self):
         user = self.request.user
         paciente_id = self.request.query_params.get("paciente")
         doctor_id = self.request.query_params.get("doctor")
         cita_id = self.request.query_params.get("cita")
+        estado = self.request.query_params.get("estado")
 
-        base_qs = ReportePaciente.objects.select_related(
-            "paciente", "doctor", "cita"
+        base_qs = filtrar_rango_fechas(
+            ReportePaciente.objects.select_related("paciente", "doctor", "cita"),
+            "creado_en",
+            self.request.query_params.get("fecha_desde"),
+            self.request.query_params.get("fecha_hasta"),
         )
+        if estado:
+            base_qs = base_qs.filter(estado=estado.upper())
 
         if user.role == "PACIENTE":
             qs = base_qs.filter(paciente=user)
@@ -1875,8 +2690,6 @@ class ReportePacienteListCreateAPI(generics.ListCreateAPIView):
         )
 
         if cita is not None:
-            actualizar_estado_cita_atendida(cita, user)
-
             tratamiento = cita.tratamiento
             if tratamiento and tratamiento.activo and not tratamiento.nombre:
                 motivo = (reporte.resumen or "").strip()
@@ -1888,7 +2701,10 @@ class ReportePacienteListCreateAPI(generics.ListCreateAPIView):
                     )
 
 
-class ReportePacienteDetailAPI(generics.RetrieveUpdateDestroyAPIView):
+class ReportePacienteDetailAPI(
+    DetalleCondicionalMixin,
+    generics.RetrieveUpdateDestroyAPIView,
+):
     queryset = ReportePaciente.objects.select_related(
         "paciente", "doctor", "cita"
     )
@@ -1909,8 +2725,6 @@ class ReportePacienteDetailAPI(generics.RetrieveUpdateDestroyAPIView):
         user = self.request.user
         reporte = serializer.save(actualizado_por=user)
         if reporte.cita:
-            actualizar_estado_cita_atendida(reporte.cita, user)
-
             tratamiento = reporte.cita.tratamiento
             if tratamiento and tratamiento.activo and not tratamiento.nombre:
                 motivo = (reporte.resumen or "").strip()
@@ -1925,18 +2739,22 @@ class ReportePacienteDetailAPI(generics.RetrieveUpdateDestroyAPIView):
         if instance.estado == "FINAL":
             raise PermissionDenied("No puedes eliminar un reporte en estado FINAL.")
         cita = instance.cita
-        super().perform_destroy(instance)
-        if cita:
-            actualizar_estado_cita_atendida(cita, self.request.user)
+        with transaction.atomic():
+            super().perform_destroy(instance)
+            if cita:
+                cita.actualizar_atendida(self.request.user, reporte_final=False)
 
 
 # =========================
 #  Recetas
 # =========================
 
-class RecetaListCreateAPI(generics.ListCreateAPIView):
+class RecetaListCreateAPI(ListadoCondicionalMixin, generics.ListCreateAPIView):
     serializer_class = RecetaSerializer
     permission_classes = [IsAuthenticated]
+    relaciones_version = ("medicamentos",)
+    pagination_class = KeysetPagination
+    keyset_ordering = ("-fecha_emision", "-id")
 
     def get_queryset(self):
         user = self.request.user
@@ -1944,22 +2762,22 @@ class RecetaListCreateAPI(generics.ListCreateAPIView):
         doctor_id = self.request.query_params.get("doctor")
         cita_id = self.request.query_params.get("cita")
 
+        base_qs = filtrar_rango_fechas(
+            Receta.objects.select_related("paciente", "doctor", "cita")
+            .prefetch_related("medicamentos"),
+            "creado_en",
+            self.request.query_params.get("fecha_desde"),
+            self.request.query_params.get("fecha_hasta"),
+        )
+
         if user.role == "PACIENTE":
-            qs = (
-                Receta.objects.filter(paciente=user)
-                .select_related("paciente", "doctor", "cita")
-                .prefetch_related("medicamentos")
-            )
+            qs = base_qs.filter(paciente=user)
             if cita_id:
                 qs = qs.filter(cita_id=cita_id)
             return qs
 
         elif user.role in ["DERMATOLOGO", "PODOLOGO", "TAMIZ"]:
-            qs = (
-                Receta.objects.filter(doctor=user)
-                .select_related("paciente", "doctor", "cita")
-                .prefetch_related("medicamentos")
-            )
+            qs = base_qs.filter(doctor=user)
             if paciente_id:
                 qs = qs.filter(paciente_id=paciente_id)
             if cita_id:
@@ -1967,10 +2785,7 @@ class RecetaListCreateAPI(generics.ListCreateAPIView):
             return qs
 
         elif user.role == "ADMIN":
-            qs = (
-                Receta.objects.select_related("paciente", "doctor", "cita")
-                .prefetch_related("medicamentos")
-            )
+            qs = base_qs
             if paciente_id:
                 qs = qs.filter(paciente_id=paciente_id)
             if doctor_id:
@@ -2022,7 +2837,7 @@ class RecetaListCreateAPI(generics.ListCreateAPIView):
                 role__in=["DERMATOLOGO", "PODOLOGO", "TAMIZ"],
             )
 
-        receta = serializer.save(
+        serializer.save(
             paciente=paciente,
             doctor=doctor,
             cita=cita,
@@ -2030,16 +2845,13 @@ class RecetaListCreateAPI(generics.ListCreateAPIView):
             actualizado_por=user,
         )
 
-        if cita is not None:
-            actualizar_estado_cita_atendida(cita, user)
 
-
-class RecetaDetailAPI(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Receta.objects.select_related(
-        "paciente", "doctor", "cita"
-    ).prefetch_related("medicamentos")
+class RecetaDetailAPI(DetalleCondicionalMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Receta.objects.select_related("paciente", "doctor", "cita")
     serializer_class = RecetaSerializer
     permission_classes = [IsAuthenticated]
+    relaciones_version = ("medicamentos",)
+    prefetch_diferido = ("medicamentos",)
 
     def check_object_permissions(self, request, obj):
         user = request.user
@@ -2052,12 +2864,11 @@ class RecetaDetailAPI(generics.RetrieveUpdateDestroyAPIView):
         raise PermissionDenied("No tienes permiso para esta receta.")
 
     def perform_update(self, serializer):
-        receta = serializer.save(actualizado_por=self.request.user)
-        if receta.cita:
-            actualizar_estado_cita_atendida(receta.cita, self.request.user)
+        serializer.save(actualizado_por=self.request.user)
 
     def perform_destroy(self, instance):
         cita = instance.cita
-        super().perform_destroy(instance)
-        if cita:
-            actualizar_estado_cita_atendida(cita, self.request.user)
+        with transaction.atomic():
+            super().perform_destroy(instance)
+            if cita:
+                cita.actualizar_atendida(self.request.user, receta=False)